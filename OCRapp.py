@@ -1,9 +1,126 @@
-import pytesseract
-import platform
-import ui_setup
+import time
 
-if platform.system() == "Windows":
-    pytesseract.pytesseract.tesseract_cmd = 'Z:\\dev\\vcpkg\\installed\\x64-windows-static\\tools\\tesseract\\tesseract.exe'
+# Taken before any other import so that the startup measurement covers them
+start_time = time.time()
+
+import argparse
+
+def region_arg(value):
+    """Parses X1,Y1,X2,Y2 into a list of four integers with X1 < X2 and Y1 < Y2."""
+    try:
+        region = [int(v) for v in value.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected four integers X1,Y1,X2,Y2, got {value}")
+    if len(region) != 4:
+        raise argparse.ArgumentTypeError(f"expected four integers X1,Y1,X2,Y2, got {value}")
+    if region[0] >= region[2] or region[1] >= region[3]:
+        raise argparse.ArgumentTypeError(f"expected X1 < X2 and Y1 < Y2, got {value}")
+    return region
 
 if __name__ == '__main__':
-    ui_setup.setup()
+    parser = argparse.ArgumentParser(description="Tess-a-shot - OCR for batched screenshot text extraction")
+    parser.add_argument("--benchmark-startup", action="store_true",
+                        help="Print startup timings and exit once the last session is restored")
+    parser.add_argument("--serve", action="store_true",
+                        help="Run the headless OCR server instead of the GUI")
+    parser.add_argument("--port", type=int, default=8765,
+                        help="Localhost port of the OCR server (default: 8765)")
+    parser.add_argument("--socket", metavar="PATH",
+                        help="Listen on a Unix socket instead of a localhost port")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of parallel OCR workers (default: CPU count)")
+    parser.add_argument("--sweep", metavar="DIR",
+                        help="OCR the same --region in every image of DIR and write the results to --output")
+    parser.add_argument("--region", metavar="X1,Y1,X2,Y2", type=region_arg,
+                        help="Region in original image coordinates")
+    parser.add_argument("--named-region", metavar="NAME=X1,Y1,X2,Y2", action="append",
+                        help="Named region for --sweep, written to its own CSV column (can be repeated)")
+    parser.add_argument("--output", metavar="FILE",
+                        help="Output file")
+    parser.add_argument("--recursive", action="store_true",
+                        help="Include subdirectories")
+    parser.add_argument("--batch", metavar="DB",
+                        help="Process the resumable batch job queue stored in the SQLite file DB")
+    parser.add_argument("--add", metavar="DIR", action="append",
+                        help="Queue the images of DIR in the --batch queue (can be repeated)")
+    parser.add_argument("--retries", type=int, default=3,
+                        help="Attempts per batch job before it is marked as failed (default: 3)")
+    parser.add_argument("--words", action="store_true",
+                        help="Keep the word boxes and confidences of every --batch job for --export")
+    parser.add_argument("--export", metavar="FILE",
+                        help="Export the results of --batch to FILE instead of processing the queue")
+    parser.add_argument("--format", choices=["jsonl", "hocr", "alto", "tsv", "parquet"],
+                        help="Format of --export (default: guessed from the file extension)")
+    parser.add_argument("--stream", metavar="FILE", nargs="?", const="-",
+                        help="OCR images read from stdin (default) or a FIFO and print one JSON line per image")
+    parser.add_argument("--raw", action="store_true",
+                        help="--stream input is concatenated PNG files (or one image) instead of length-prefixed frames")
+    parser.add_argument("--index", metavar="DIR",
+                        help="OCR the new or changed images of DIR into the search index, at low priority")
+    parser.add_argument("--search", metavar="QUERY",
+                        help="Print the indexed files containing all words of QUERY")
+    parser.add_argument("--autotune", metavar="DIR", nargs="?", const="",
+                        help="Find the fastest OCR configuration for DIR (default: the last directory) and store it")
+    parser.add_argument("--samples", type=int, default=None,
+                        help="Images benchmarked by --autotune or --benchmark-backends (default: the \"autotune\" setting)")
+    parser.add_argument("--benchmark-backends", metavar="DIR",
+                        help="Compare the speed and text agreement of the available OCR backends on sample images of DIR")
+    parser.add_argument("--backends", metavar="NAME,NAME",
+                        help="Backends compared by --benchmark-backends (default: all available)")
+    args = parser.parse_args()
+
+    if args.serve or args.sweep or args.batch or args.stream or args.autotune is not None or args.benchmark_backends \
+            or args.index or args.search:
+        # Headless modes use the tuned OCR configurations of the settings file
+        import settings
+        settings.load(settings.settings)
+        import source_ops
+        source_ops.set_pixel_limit(settings.settings.get("max_image_megapixels", 1000))
+
+    if args.serve:
+        import server_ops
+        server_ops.serve(port=args.port, socket_path=args.socket, workers=args.workers)
+    elif args.sweep:
+        if not (args.region or args.named_region) or not args.output:
+            parser.error("--sweep requires --region or --named-region, and --output")
+        import sweep_ops
+        if args.named_region:
+            import region_ops
+            try:
+                region = [region_ops.parse_region(value) for value in args.named_region]
+            except ValueError as e:
+                parser.error(f"--named-region: {e}")
+        else:
+            region = args.region
+        sweep_ops.run_cli(args.sweep, region, args.output, recursive=args.recursive, workers=args.workers)
+    elif args.batch and args.export:
+        import batch_ops
+        batch_ops.export(args.batch, args.export, format=args.format)
+    elif args.batch:
+        import batch_ops
+        batch_ops.run_cli(args.batch, add_roots=args.add, recursive=args.recursive, region=args.region,
+                          workers=args.workers, retries=args.retries, keep_words=args.words)
+    elif args.stream:
+        import stream_ops
+        stream_ops.run_cli(args.stream, framed=not args.raw, region=args.region, workers=args.workers)
+    elif args.index:
+        import index_ops
+        index_ops.run_cli(args.index)
+    elif args.search:
+        import index_ops
+        index_ops.search_cli(args.search)
+    elif args.autotune is not None:
+        import tune_ops
+        directory = args.autotune or settings.settings.get("last_directory")
+        if not directory:
+            parser.error("--autotune needs a directory")
+        tune_ops.run_cli(directory, samples=args.samples)
+    elif args.benchmark_backends:
+        import backend_ops
+        names = args.backends.split(",") if args.backends else None
+        if names and any(name not in backend_ops.BACKENDS for name in names):
+            parser.error(f"--backends: known backends are {', '.join(backend_ops.BACKENDS)}")
+        backend_ops.run_cli(args.benchmark_backends, samples=args.samples, names=names)
+    else:
+        import ui_setup
+        ui_setup.setup(start_time, exit_after_restore=args.benchmark_startup)
@@ -0,0 +1,340 @@
+import difflib
+import platform
+import subprocess
+import threading
+import time
+
+import settings
+
+# Tesseract binary used on Windows, where it is usually not on the PATH
+WINDOWS_TESSERACT_CMD = 'Z:\\dev\\vcpkg\\installed\\x64-windows-static\\tools\\tesseract\\tesseract.exe'
+
+DEFAULT_BACKEND = "pytesseract"
+
+# Keys of the word data returned by Backend.image_to_data, as in pytesseract's Output.DICT
+DATA_KEYS = ("block_num", "par_num", "line_num", "word_num", "left", "top", "width", "height", "conf", "text")
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+# Threads whose engine processes run at the lowest CPU priority, see lower_engine_priority
+_engine_priority = threading.local()
+LOW_PRIORITY_NICE = 19
+
+def lower_engine_priority():
+    """
+    Engine processes started from the calling thread from now on run at the lowest
+    CPU priority. Processes do not inherit the priority of the starting thread on
+    Windows, so it is set when each one is created.
+    """
+    _engine_priority.low = True
+
+def engine_priority_low():
+    return getattr(_engine_priority, "low", False)
+
+class Backend:
+    """
+    An OCR engine. Configurations are the dicts of ocr_ops.config_for
+    (psm, oem, whitelist; the other keys are handled by ocr_ops).
+    """
+
+    name = None
+
+    @classmethod
+    def available(cls):
+        """Returns True if the engine can be used on this host."""
+        return True
+
+    def warm(self):
+        """Loads the engine, e.g. in a freshly started worker process."""
+
+    def image_to_string(self, image, config=None):
+        raise NotImplementedError
+
+    def image_to_data(self, image, config=None):
+        """Returns the recognised words as a dict of lists keyed by DATA_KEYS."""
+        raise NotImplementedError
+
+# pytesseract splits the options with shlex, in POSIX mode except on Windows, so no
+# quoting survives on both; whitelists with these characters are refused instead
+UNSAFE_WHITELIST_CHARACTERS = frozenset(" \t\r\n'\"\\")
+
+def tesseract_args(config):
+    """Formats the Tesseract command line options of a configuration."""
+    args = []
+    if config:
+        if config.get("psm") is not None:
+            args.append(f"--psm {int(config['psm'])}")
+        if config.get("oem") is not None:
+            args.append(f"--oem {int(config['oem'])}")
+        whitelist = config.get("whitelist")
+        if whitelist:
+            if UNSAFE_WHITELIST_CHARACTERS.intersection(whitelist):
+                raise ValueError("OCR whitelist must not contain whitespace, quotes or backslashes")
+            args.append(f"-c tessedit_char_whitelist={whitelist}")
+    return " ".join(args)
+
+class PytesseractBackend(Backend):
+    """The tesseract command line program, started through pytesseract for every call."""
+
+    name = "pytesseract"
+
+    def __init__(self):
+        self.module = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def available(cls):
+        try:
+            import pytesseract  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def tesseract(self):
+        """
+        Returns the pytesseract module, importing and configuring it on first use.
+        Importing pytesseract is deferred so that it does not slow down startup.
+        """
+        if self.module is None:
+            with self.lock:
+                if self.module is None:
+                    import pytesseract
+                    command = settings.settings.get("tesseract_cmd")
+                    if not command and platform.system() == "Windows":
+                        command = WINDOWS_TESSERACT_CMD
+                    if command:
+                        pytesseract.pytesseract.tesseract_cmd = command
+                    if platform.system() == "Windows" and hasattr(pytesseract.pytesseract, "subprocess_args"):
+                        pytesseract.pytesseract.subprocess_args = self.low_priority_args(
+                            pytesseract.pytesseract.subprocess_args)
+                    self.module = pytesseract
+        return self.module
+
+    @staticmethod
+    def low_priority_args(subprocess_args):
+        """
+        Wraps pytesseract's arguments of subprocess.Popen so that threads of
+        lower_engine_priority start tesseract in the idle priority class (Windows).
+        """
+        def wrapper(*args, **kwargs):
+            popen_args = subprocess_args(*args, **kwargs)
+            if engine_priority_low():
+                popen_args["creationflags"] = popen_args.get("creationflags", 0) | subprocess.IDLE_PRIORITY_CLASS
+            return popen_args
+        return wrapper
+
+    @staticmethod
+    def nice():
+        """Niceness of the tesseract process, applied by pytesseract outside Windows."""
+        return LOW_PRIORITY_NICE if engine_priority_low() else 0
+
+    def warm(self):
+        self.tesseract()
+
+    def image_to_string(self, image, config=None):
+        return self.tesseract().image_to_string(image, config=tesseract_args(config), nice=self.nice())
+
+    def image_to_data(self, image, config=None):
+        pytesseract = self.tesseract()
+        return pytesseract.image_to_data(image, config=tesseract_args(config), nice=self.nice(),
+                                         output_type=pytesseract.Output.DICT)
+
+class TesserocrBackend(Backend):
+    """
+    The Tesseract library called in-process through tesserocr, without starting
+    a program per image. The API object is not thread-safe, so every thread
+    keeps its own, reused for all its calls with the same modes.
+    """
+
+    name = "tesserocr"
+
+    def __init__(self):
+        self.local = threading.local()
+
+    @classmethod
+    def available(cls):
+        try:
+            import tesserocr  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def api(self, config):
+        import tesserocr
+        config = config or {}
+        key = (config.get("psm"), config.get("oem"))
+        apis = getattr(self.local, "apis", None)
+        if apis is None:
+            apis = self.local.apis = {}
+        api = apis.get(key)
+        if api is None:
+            options = {}
+            if config.get("psm") is not None:
+                options["psm"] = config["psm"]
+            if config.get("oem") is not None:
+                options["oem"] = config["oem"]
+            api = apis[key] = tesserocr.PyTessBaseAPI(**options)
+        api.SetVariable("tessedit_char_whitelist", config.get("whitelist") or "")
+        return api
+
+    def warm(self):
+        self.api(None)
+
+    def image_to_string(self, image, config=None):
+        api = self.api(config)
+        api.SetImage(image)
+        return api.GetUTF8Text()
+
+    def image_to_data(self, image, config=None):
+        api = self.api(config)
+        api.SetImage(image)
+        return parse_tsv(api.GetTSVText(0))
+
+def parse_tsv(tsv):
+    """Converts Tesseract's TSV output (without header line) into the dict of image_to_data."""
+    data = {key: [] for key in DATA_KEYS}
+    for line in tsv.splitlines():
+        fields = line.split("\t")
+        if len(fields) < 12:
+            continue
+        _, _, block, par, line_number, word, left, top, width, height, conf = fields[:11]
+        for key, value in zip(DATA_KEYS[:-2], (block, par, line_number, word, left, top, width, height)):
+            data[key].append(int(value))
+        data["conf"].append(float(conf))
+        data["text"].append("\t".join(fields[11:]))
+    return data
+
+class FakeBackend(Backend):
+    """
+    Deterministic stand-in for tests and benchmarks of the surrounding pipeline:
+    reports the image size as a single word spanning the image, after an optional
+    delay simulating the engine.
+    """
+
+    name = "fake"
+    delay = 0.0  # Seconds per call
+
+    def image_to_string(self, image, config=None):
+        if self.delay:
+            time.sleep(self.delay)
+        width, height = image.size
+        return f"{width}x{height}\n"
+
+    def image_to_data(self, image, config=None):
+        text = self.image_to_string(image, config).strip()
+        width, height = image.size
+        values = (1, 1, 1, 1, 0, 0, width, height, 100.0, text)
+        return {key: [value] for key, value in zip(DATA_KEYS, values)}
+
+BACKENDS = {backend.name: backend for backend in (PytesseractBackend, TesserocrBackend, FakeBackend)}
+
+def get_backend(name=None):
+    """
+    Returns the backend named name (default: the "ocr_backend" setting).
+    An unknown or unavailable backend falls back to pytesseract with a warning.
+    """
+    name = name or settings.settings.get("ocr_backend") or DEFAULT_BACKEND
+    backend = _backends.get(name)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(name)
+            if backend is None:
+                backend_class = BACKENDS.get(name)
+                if backend_class is None or not backend_class.available():
+                    print(f"OCR backend {name} is not available, using {DEFAULT_BACKEND}")
+                    backend = _backends.get(DEFAULT_BACKEND) or PytesseractBackend()
+                    _backends[DEFAULT_BACKEND] = backend
+                else:
+                    backend = backend_class()
+                _backends[name] = backend
+    return backend
+
+def worker_settings():
+    """The settings a worker process needs to start the same OCR engine."""
+    return {key: settings.settings.get(key) for key in ("ocr_backend", "tesseract_cmd", "max_image_megapixels",
+                                                          "ocr_configs", "target_x_height")}
+
+def available_backends(include_fake=False):
+    """Returns the names of the backends usable on this host."""
+    return [name for name, backend in BACKENDS.items()
+            if backend.available() and (include_fake or backend is not FakeBackend)]
+
+def percentile(values, fraction):
+    """Returns the value below which fraction of the sorted values lie (nearest rank)."""
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, round(fraction * len(values)) - 1))]
+
+def normalize(text):
+    return " ".join(text.split())
+
+def benchmark(images, names, configs=None, progress=None):
+    """
+    Runs every image through the OCR pipeline (ocr_ops.ocr_image) with each backend of names.
+
+    Args:
+        images: list of PIL images, already loaded
+        names: backend names; the first one is the reference for text agreement
+        configs: optional OCR configuration per image
+        progress: called as progress(message) after each backend
+
+    Returns:
+        list of dicts with "backend", "images_per_second", "p50_ms", "p90_ms", "p99_ms"
+        and "agreement" (mean similarity of the texts to the reference, 0 to 1)
+    """
+    import ocr_ops
+    configs = configs or [None] * len(images)
+    reference = None
+    results = []
+    for name in names:
+        backend_configs = [dict(config or {}, backend=name) for config in configs]
+        get_backend(name).warm()
+        ocr_ops.ocr_image(images[0], config=backend_configs[0])  # The first call loads language data and is not counted
+        latencies = []
+        texts = []
+        for image, config in zip(images, backend_configs):
+            start_time = time.perf_counter()
+            texts.append(normalize(ocr_ops.ocr_image(image, config=config)))
+            latencies.append((time.perf_counter() - start_time) * 1000)
+        if reference is None:
+            reference = texts
+        agreement = sum(difflib.SequenceMatcher(None, a, b, autojunk=False).ratio() if a or b else 1.0
+                        for a, b in zip(reference, texts)) / len(texts)
+        result = {"backend": name, "images_per_second": len(images) / (sum(latencies) / 1000 or 1e-9),
+                  "p50_ms": percentile(latencies, 0.5), "p90_ms": percentile(latencies, 0.9),
+                  "p99_ms": percentile(latencies, 0.99), "agreement": agreement}
+        results.append(result)
+        if progress:
+            progress(format_result(result))
+    return results
+
+def format_result(result):
+    return (f"{result['backend']:<12} {result['images_per_second']:7.2f} images/s  "
+            f"p50 {result['p50_ms']:7.1f} ms  p90 {result['p90_ms']:7.1f} ms  p99 {result['p99_ms']:7.1f} ms  "
+            f"agreement {result['agreement']:.1%}")
+
+def run_cli(directory, samples=None, names=None):
+    """Command line entry point: benchmarks the available backends on sample images of a directory."""
+    import ocr_ops
+    import source_ops
+    import tune_ops
+    names = names or available_backends()
+    if not names:
+        print("No OCR backend is available")
+        return
+    paths = tune_ops.sample_paths(directory, samples or settings.settings.get("autotune", {}).get("samples", 8))
+    if not paths:
+        print(f"No images found in {directory}")
+        return
+    images = []
+    for path in paths:
+        image = source_ops.open_image(path)
+        image.load()
+        images.append(image)
+    print(f"Benchmarking {', '.join(names)} on {len(images)} images of {directory} "
+          f"(agreement relative to {names[0]})")
+    results = benchmark(images, names, [ocr_ops.config_for(path) for path in paths], progress=print)
+    fastest = max(results, key=lambda result: result["images_per_second"])
+    print(f"Fastest: {fastest['backend']} (set \"ocr_backend\" in {settings.CONFIG_FILE} to use it)")
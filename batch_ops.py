@@ -0,0 +1,327 @@
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+import export_ops
+import ocr_ops
+import source_ops
+
+LEASE_SECONDS = 600  # A running job whose lease expired is handed out again
+LEASE_RENEW_SECONDS = LEASE_SECONDS / 4  # Workers extend the leases of their jobs this often while they run
+DEFAULT_RETRIES = 3
+PROGRESS_INTERVAL = 2.0  # Seconds between progress lines
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    path TEXT PRIMARY KEY,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    text TEXT,
+    error TEXT,
+    finished REAL,
+    duration REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def connect(db_path):
+    """
+    Opens the job database. WAL mode lets several worker processes
+    read and write concurrently; every change is committed before it is acknowledged.
+    """
+    conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+    if "words" not in columns:
+        # Word boxes (export_ops.encode_words) and page size as JSON, added after the first release
+        conn.execute("ALTER TABLE jobs ADD COLUMN words TEXT")
+    return conn
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def add_jobs(conn, paths):
+    """Queues paths that are not in the database yet. Returns the number of new jobs."""
+    before = conn.total_changes
+    conn.execute("BEGIN")
+    conn.executemany("INSERT OR IGNORE INTO jobs (path) VALUES (?)", ((path,) for path in paths))
+    conn.execute("COMMIT")
+    return conn.total_changes - before
+
+def set_region(conn, region):
+    """Stores the region applied to every job, so that a resumed run uses the same one."""
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('region', ?)", (json.dumps(region),))
+
+def get_region(conn):
+    row = conn.execute("SELECT value FROM meta WHERE key = 'region'").fetchone()
+    return json.loads(row[0]) if row else None
+
+def set_keep_words(conn, keep_words):
+    """Stores whether the word boxes of every job are kept for export along with its text."""
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('words', ?)", (json.dumps(bool(keep_words)),))
+
+def get_keep_words(conn):
+    row = conn.execute("SELECT value FROM meta WHERE key = 'words'").fetchone()
+    return json.loads(row[0]) if row else False
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+def recover(conn, retries=DEFAULT_RETRIES):
+    """
+    Returns jobs left 'running' by workers of this host that no longer exist
+    (crash, reboot, Ctrl-C) to the queue. A job that has been attempted retries
+    times fails instead, so that a file killing its worker (e.g. out of memory)
+    is not started again on every run. Returns the number of recovered jobs.
+    """
+    host = socket.gethostname()
+    recovered = 0
+    conn.execute("BEGIN IMMEDIATE")
+    for path, worker in conn.execute("SELECT path, worker FROM jobs WHERE state = 'running'").fetchall():
+        worker_host, _, pid = (worker or "").rpartition(":")
+        if worker_host == host and pid.isdigit() and _process_alive(int(pid)):
+            continue
+        if worker_host and worker_host != host:
+            continue  # Other hosts are recovered through the lease
+        conn.execute("UPDATE jobs SET state = 'pending', worker = NULL, lease_until = NULL WHERE path = ?", (path,))
+        recovered += 1
+    fail_exhausted(conn, retries)
+    conn.execute("COMMIT")
+    return recovered
+
+def fail_exhausted(conn, retries, now=None):
+    """
+    Marks the claimable jobs (pending, or running with an expired lease) that have
+    been attempted retries times as failed. Runs within the caller's transaction.
+    """
+    conn.execute("UPDATE jobs SET state = 'failed', error = COALESCE(error, ?), worker = NULL, lease_until = NULL "
+                 "WHERE attempts >= ? AND (state = 'pending' OR (state = 'running' AND lease_until < ?))",
+                 (f"Abandoned after {retries} attempts: the worker ended or its lease expired", retries,
+                  time.time() if now is None else now))
+
+def claim(conn, worker, retries=DEFAULT_RETRIES):
+    """
+    Atomically takes the next pending (or abandoned) job that has been attempted
+    fewer than retries times. Returns its path or None.
+    """
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        fail_exhausted(conn, retries, now)
+        row = conn.execute(
+            "SELECT path FROM jobs WHERE state = 'pending' OR (state = 'running' AND lease_until < ?) "
+            "ORDER BY rowid LIMIT 1", (now,)).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute("UPDATE jobs SET state = 'running', worker = ?, lease_until = ?, attempts = attempts + 1 "
+                     "WHERE path = ?", (worker, now + LEASE_SECONDS, row[0]))
+        conn.execute("COMMIT")
+        return row[0]
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def complete(conn, worker, path, text, duration, words=None):
+    conn.execute("UPDATE jobs SET state = 'done', text = ?, words = ?, error = NULL, finished = ?, duration = ?, "
+                 "lease_until = NULL WHERE path = ? AND worker = ?", (text, words, time.time(), duration, path, worker))
+
+def fail(conn, worker, path, error, retries):
+    """Records an error; the job is retried until it has been attempted retries times."""
+    conn.execute("UPDATE jobs SET state = CASE WHEN attempts < ? THEN 'pending' ELSE 'failed' END, "
+                 "error = ?, worker = NULL, lease_until = NULL WHERE path = ? AND worker = ?",
+                 (retries, error, path, worker))
+
+def renew_leases(db_path, worker, stop):
+    """
+    Extends the leases of the worker's running jobs every LEASE_RENEW_SECONDS until
+    stop is set, so that a job running longer than LEASE_SECONDS is not handed to
+    a second worker. Runs on its own thread with its own connection.
+    """
+    conn = connect(db_path)
+    try:
+        while not stop.wait(LEASE_RENEW_SECONDS):
+            conn.execute("UPDATE jobs SET lease_until = ? WHERE worker = ? AND state = 'running'",
+                         (time.time() + LEASE_SECONDS, worker))
+    finally:
+        conn.close()
+
+def release(conn, worker, path):
+    """Puts an interrupted job back without counting the attempt."""
+    conn.execute("UPDATE jobs SET state = 'pending', attempts = attempts - 1, worker = NULL, lease_until = NULL "
+                 "WHERE path = ? AND worker = ? AND state = 'running'", (path, worker))
+
+def counts(conn):
+    """Returns {state: number of jobs}."""
+    result = {"pending": 0, "running": 0, "done": 0, "failed": 0}
+    for state, count in conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state"):
+        result[state] = count
+    return result
+
+def worker_main(db_path, retries):
+    """Worker process: claims and processes jobs until the queue is empty."""
+    conn = connect(db_path)
+    worker = worker_id()
+    region = get_region(conn)
+    keep_words = get_keep_words(conn)
+    stop = threading.Event()
+    threading.Thread(target=renew_leases, args=(db_path, worker, stop), daemon=True).start()
+    path = None
+    try:
+        while True:
+            path = claim(conn, worker, retries)
+            if path is None:
+                return
+            start_time = time.time()
+            words = None
+            try:
+                image = source_ops.open_image(path)
+                size = image.size  # Only the header is read
+                if region:
+                    image = source_ops.open_region(path, region, image)
+                if keep_words:
+                    words, text = ocr_words(path, image, region, size)
+                else:
+                    text = ocr_ops.ocr_image(image, config=ocr_ops.config_for(path))
+            except Exception as e:
+                fail(conn, worker, path, str(e), retries)
+            else:
+                complete(conn, worker, path, text, time.time() - start_time, words)
+            path = None
+    except KeyboardInterrupt:
+        if path is not None:
+            release(conn, worker, path)
+    finally:
+        stop.set()
+        conn.close()
+
+def ocr_words(path, image, region=None, size=None):
+    """
+    OCRs an image (the crop of region, if given) keeping its word boxes, in the
+    coordinates of the whole image of size (default: the size of image).
+
+    Returns:
+        (JSON of the page size and encoded words, text)
+    """
+    words = ocr_ops.image_to_words(image, config=ocr_ops.config_for(path))
+    size = size or image.size
+    if region:
+        for word in words:
+            word["left"] += region[0]
+            word["top"] += region[1]
+    record = {"size": list(size), "words": export_ops.encode_words(words)}
+    return json.dumps(record, separators=(",", ":")), ocr_ops.words_to_text(words)
+
+def iter_results(conn, include_failed=False):
+    """
+    Yields the finished jobs as export records (see export_ops), in queue order.
+    Rows are fetched from the database as they are consumed.
+    """
+    states = ("done", "failed") if include_failed else ("done",)
+    query = (f"SELECT path, state, text, words, error FROM jobs WHERE state IN ({','.join('?' * len(states))}) "
+             "ORDER BY rowid")
+    for path, state, text, words, error in conn.execute(query, states):
+        record = {"path": path, "text": text or ""}
+        if words:
+            stored = json.loads(words)
+            record["size"] = stored["size"]
+            record["words"] = export_ops.decode_words(stored["words"])
+        if state == "failed":
+            record["error"] = error
+        yield record
+
+def export(db_path, output_path, format=None, include_failed=False):
+    """Command line export of the results of a batch queue."""
+    conn = connect(db_path)
+    try:
+        def progress(count):
+            if count % 10000 == 0:
+                print(f"Exported {count} results")
+        count = export_ops.export(iter_results(conn, include_failed), output_path, format, progress)
+    finally:
+        conn.close()
+    print(f"Wrote {count} results to {export_ops.destination(output_path, format, count)}")
+
+def format_progress(state_counts, rate):
+    """Formats a progress line with throughput and ETA."""
+    total = sum(state_counts.values())
+    finished = state_counts["done"] + state_counts["failed"]
+    remaining = state_counts["pending"] + state_counts["running"]
+    line = (f"{finished}/{total} finished ({state_counts['done']} done, {state_counts['failed']} failed, "
+            f"{state_counts['running']} running)")
+    if rate > 0:
+        eta = remaining / rate
+        line += f", {rate:.1f} files/s, ETA {int(eta // 3600)}:{int(eta % 3600 // 60):02d}:{int(eta % 60):02d}"
+    return line
+
+def run(db_path, workers=None, retries=DEFAULT_RETRIES):
+    """
+    Processes the queue with several worker processes, printing progress and ETA.
+    Safe to interrupt; the next run continues with the unfinished jobs only.
+    """
+    workers = workers or os.cpu_count() or 1
+    conn = connect(db_path)
+    recovered = recover(conn, retries)
+    if recovered:
+        print(f"Recovered {recovered} interrupted jobs")
+
+    processes = [multiprocessing.Process(target=worker_main, args=(db_path, retries), daemon=True)
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+
+    start_time = time.time()
+    start_finished = None
+    try:
+        while any(process.is_alive() for process in processes):
+            time.sleep(PROGRESS_INTERVAL)
+            # The job of a worker that died (e.g. killed for memory) is retried by the others
+            recover(conn, retries)
+            state_counts = counts(conn)
+            finished = state_counts["done"] + state_counts["failed"]
+            if start_finished is None:
+                start_finished = finished
+            elapsed = time.time() - start_time
+            rate = (finished - start_finished) / elapsed if elapsed > 0 else 0
+            print(format_progress(state_counts, rate))
+    except KeyboardInterrupt:
+        print("Interrupted, waiting for workers to put back their jobs...")
+        for process in processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        recover(conn, retries)
+    print(format_progress(counts(conn), 0))
+    conn.close()
+
+def run_cli(db_path, add_roots=None, recursive=False, region=None, workers=None, retries=DEFAULT_RETRIES,
+            keep_words=False):
+    """Command line entry point: optionally queues images, then processes the queue."""
+    conn = connect(db_path)
+    if region is not None:
+        set_region(conn, region)
+    if keep_words:
+        set_keep_words(conn, True)
+    for root in add_roots or []:
+        paths = (path for path, _, _ in source_ops.list_images([root], recursive=recursive))
+        print(f"Queued {add_jobs(conn, paths)} new files from {root}")
+    conn.close()
+    run(db_path, workers=workers, retries=retries)
@@ -10,17 +10,29 @@ copy_on_select_var = None
 copy_on_region_select_var = None
 reformat_lines_var = None
 remember_region_var = None
+recursive_scan_var = None
+show_word_boxes_var = None
+change_aware_var = None
+detect_text_blocks_var = None
+show_text_blocks_var = None
+named_regions_var = None
+two_pass_var = None
+live_ocr_var = None
+index_var = None
 
 image_preview_frame = None
 directory_entry = None
 refresh_file_list = None
 file_tree = None  # For Treeview file list
+file_menu = None  # Bulk operations on the selected files
 status_label = None
+activity_label = None  # OCR queue state and memory usage in the status bar
 image_canvas = None
+frame_slider = None  # Shown for multi-frame files only
 main_paned_window = None
 set_sash_job = None
 
 # Context menu and interaction mode
 context_menu = None
-interaction_mode = None  # Values: "area_selection", "drag", "zoom_in", "zoom_out"
+interaction_mode = None  # Values: "area_selection", "drag", "zoom_in", "zoom_out", "word_select"
 context_menu_active = False  # Track if context menu is currently open
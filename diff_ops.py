@@ -0,0 +1,179 @@
+import math
+import threading
+
+import ocr_ops
+import source_ops
+import tile_ops
+
+CELL_SIZE = 16  # Images are compared in cells of this many pixels
+DIFF_THRESHOLD = 24  # Gray level difference below which a pixel counts as unchanged
+PADDING = 8  # Pixels added around changed areas so that glyphs at their edges are read whole
+FULL_OCR_FRACTION = 0.6  # Above this changed fraction the whole image is OCR'd instead
+
+# The last image OCR'd in change-aware mode, so that the next one can be compared without decoding it again
+_last_frame = None  # (path, PIL image)
+_last_frame_lock = threading.Lock()
+
+def numpy_available():
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def remember_frame(path, image):
+    global _last_frame
+    with _last_frame_lock:
+        _last_frame = (path, image)
+
+def previous_frame(path):
+    """Returns the image of path, reusing the last OCR'd image when it is the same file."""
+    with _last_frame_lock:
+        if _last_frame is not None and _last_frame[0] == path:
+            return _last_frame[1]
+    image = source_ops.open_image(path)
+    if tile_ops.needs_tiling(image):
+        return None  # Too large to compare in memory
+    image.load()
+    return image
+
+def changed_cells(previous, current, cell_size=CELL_SIZE, threshold=DIFF_THRESHOLD):
+    """
+    Compares two images and returns a boolean numpy array with one entry per cell,
+    True where any pixel of the cell changed. Returns None if the sizes differ.
+    """
+    import numpy as np
+    if previous.size != current.size:
+        return None
+    width, height = current.size
+    a = np.asarray(previous.convert("L"), dtype=np.int16)
+    b = np.asarray(current.convert("L"), dtype=np.int16)
+    changed = np.abs(a - b) > threshold
+    rows, columns = math.ceil(height / cell_size), math.ceil(width / cell_size)
+    padded = np.zeros((rows * cell_size, columns * cell_size), dtype=bool)
+    padded[:height, :width] = changed
+    return padded.reshape(rows, cell_size, columns, cell_size).any(axis=(1, 3))
+
+def changed_rectangles(cells, size, cell_size=CELL_SIZE, padding=PADDING):
+    """Groups changed cells into padded bounding rectangles (x1, y1, x2, y2) in pixels."""
+    width, height = size
+    rows, columns = cells.shape
+    seen = set()
+    rectangles = []
+    for row, column in zip(*cells.nonzero()):
+        row, column = int(row), int(column)
+        if (row, column) in seen:
+            continue
+        # Flood fill over the 8-connected changed cells
+        seen.add((row, column))
+        stack = [(row, column)]
+        min_row = max_row = row
+        min_column = max_column = column
+        while stack:
+            r, c = stack.pop()
+            min_row, max_row = min(min_row, r), max(max_row, r)
+            min_column, max_column = min(min_column, c), max(max_column, c)
+            for nr in (r - 1, r, r + 1):
+                for nc in (c - 1, c, c + 1):
+                    if 0 <= nr < rows and 0 <= nc < columns and cells[nr, nc] and (nr, nc) not in seen:
+                        seen.add((nr, nc))
+                        stack.append((nr, nc))
+        rectangles.append((max(0, min_column * cell_size - padding), max(0, min_row * cell_size - padding),
+                           min(width, (max_column + 1) * cell_size + padding), min(height, (max_row + 1) * cell_size + padding)))
+    return merge_rectangles(rectangles)
+
+def _intersects(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+def _word_box(word):
+    return (word["left"], word["top"], word["left"] + word["width"], word["top"] + word["height"])
+
+def merge_rectangles(rectangles):
+    """Merges overlapping rectangles until none overlap."""
+    rectangles = list(rectangles)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rectangles)):
+            for j in range(i + 1, len(rectangles)):
+                a, b = rectangles[i], rectangles[j]
+                if _intersects(a, b):
+                    rectangles[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    del rectangles[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return rectangles
+
+def grow_to_words(rectangles, words):
+    """Grows the rectangles to cover the previous words they touch, so that no word is read in part."""
+    while True:
+        grown = []
+        for rectangle in rectangles:
+            x1, y1, x2, y2 = rectangle
+            for word in words:
+                box = _word_box(word)
+                if _intersects(rectangle, box):
+                    x1, y1 = min(x1, box[0]), min(y1, box[1])
+                    x2, y2 = max(x2, box[2]), max(y2, box[3])
+            grown.append((x1, y1, x2, y2))
+        grown = merge_rectangles(grown)
+        if grown == rectangles:
+            return grown
+        rectangles = grown
+
+def layout_words(words):
+    """
+    Renumbers words from several OCR runs by position: words whose vertical
+    centre falls within a line join it, and a gap taller than a line starts a new block.
+    Returns copies of the words, ordered for ocr_ops.words_to_text.
+    """
+    lines = []
+    for word in sorted(words, key=lambda w: w["top"] + w["height"] / 2):
+        center = word["top"] + word["height"] / 2
+        if lines and lines[-1]["top"] <= center <= lines[-1]["bottom"]:
+            line = lines[-1]
+            line["words"].append(word)
+            line["bottom"] = max(line["bottom"], word["top"] + word["height"])
+        else:
+            lines.append({"top": word["top"], "bottom": word["top"] + word["height"], "words": [word]})
+    result = []
+    block = 1
+    previous = None
+    for line_number, line in enumerate(lines, 1):
+        if previous is not None and line["top"] - previous["bottom"] > previous["bottom"] - previous["top"]:
+            block += 1
+        for word_number, word in enumerate(sorted(line["words"], key=lambda w: w["left"]), 1):
+            result.append(dict(word, block=block, par=1, line=line_number, word=word_number))
+        previous = line
+    return result
+
+def ocr_changes(image, previous_image, previous_words, config=None):
+    """
+    OCRs only the parts of image that differ from previous_image and
+    reuses previous_words for the rest.
+
+    Returns:
+        (words, changed fraction of the image area); the fraction is 1.0 if the whole image was OCR'd
+    """
+    # Tiled images are too large to compare in memory
+    comparable = (previous_image is not None and previous_words is not None
+                  and not isinstance(image, tile_ops.TiledImage) and not isinstance(previous_image, tile_ops.TiledImage))
+    cells = changed_cells(previous_image, image) if comparable else None
+    if cells is None:
+        return ocr_ops.image_to_words(image, config=config), 1.0
+    if not cells.any():
+        return list(previous_words), 0.0
+
+    rectangles = grow_to_words(changed_rectangles(cells, image.size), previous_words)
+    width, height = image.size
+    fraction = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in rectangles) / (width * height)
+    if fraction > FULL_OCR_FRACTION:
+        return ocr_ops.image_to_words(image, config=config), 1.0
+
+    words = [word for word in previous_words
+             if not any(_intersects(_word_box(word), rectangle) for rectangle in rectangles)]
+    for rectangle in rectangles:
+        words.extend(ocr_ops.image_to_words(image, rectangle, config))
+    return layout_words(words), fraction
@@ -0,0 +1,371 @@
+import abc
+import json
+import os
+from xml.sax.saxutils import escape, quoteattr
+
+import ocr_ops
+import region_ops
+import scheduler_ops
+import source_ops
+
+# Order of the word fields in compact word lists (stored results) and in columnar exports
+WORD_FIELDS = ("text", "conf", "left", "top", "width", "height", "block", "par", "line", "word")
+
+FORMATS = ("jsonl", "hocr", "alto", "tsv", "parquet")
+EXTENSIONS = {".jsonl": "jsonl", ".json": "jsonl", ".hocr": "hocr", ".html": "hocr", ".xml": "alto",
+              ".alto": "alto", ".tsv": "tsv", ".parquet": "parquet"}
+
+PARQUET_ROW_GROUP = 65536  # Words buffered before a Parquet row group is written
+
+# Records passed to the writers are dicts with "path", "text", optionally "words"
+# (see ocr_ops.image_to_words), "size" ((width, height) of the page), "region" (the
+# name of a named region, when each region of a file is its own record) and "error".
+
+def hocr_string(value):
+    """Quotes a string property of an hOCR title."""
+    return json.dumps(value, ensure_ascii=False)
+
+def encode_words(words):
+    """Packs word dicts into compact lists of WORD_FIELDS, for storage."""
+    return [[word[field] for field in WORD_FIELDS] for word in words]
+
+def decode_words(rows):
+    """Unpacks lists of WORD_FIELDS into word dicts."""
+    return [dict(zip(WORD_FIELDS, row)) for row in rows]
+
+def format_for(path, format=None):
+    """Returns the export format named by format, or guessed from the extension of path."""
+    if format:
+        if format not in FORMATS:
+            raise ValueError(f"unknown export format {format}, expected one of {', '.join(FORMATS)}")
+        return format
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXTENSIONS:
+        raise ValueError(f"cannot tell the export format from {path}, use one of {', '.join(FORMATS)}")
+    return EXTENSIONS[extension]
+
+def page_size(record):
+    """Returns the page size of a record, or the extent of its words if unknown."""
+    if record.get("size"):
+        return tuple(record["size"])
+    words = record.get("words") or []
+    return (max((w["left"] + w["width"] for w in words), default=0),
+            max((w["top"] + w["height"] for w in words), default=0))
+
+def group_lines(words):
+    """Groups words into blocks of paragraphs of lines, in reading order."""
+    blocks = {}
+    for word in sorted(words, key=lambda w: (w["block"], w["par"], w["line"], w["word"])):
+        blocks.setdefault(word["block"], {}).setdefault(word["par"], {}).setdefault(word["line"], []).append(word)
+    return blocks
+
+def bounding_box(words):
+    return (min(w["left"] for w in words), min(w["top"] for w in words),
+            max(w["left"] + w["width"] for w in words), max(w["top"] + w["height"] for w in words))
+
+def all_words(paragraphs):
+    """Flattens {par: {line: words}} or {line: words} into one word list."""
+    result = []
+    for value in paragraphs.values():
+        result.extend(all_words(value) if isinstance(value, dict) else value)
+    return result
+
+class Writer(abc.ABC):
+    """
+    Base class of the export writers. Records are written one at a time as they
+    arrive and nothing but the current record is kept, so exports of any size run
+    in constant memory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+
+    def write(self, record):
+        self.write_record(record)
+        self.count += 1
+
+    @abc.abstractmethod
+    def write_record(self, record):
+        """Writes one record."""
+
+    def close(self):
+        pass
+
+    @classmethod
+    def destination(cls, path, count):
+        """Describes the files an export of count records to path was written to, for messages."""
+        return path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class JsonlWriter(Writer):
+    """One JSON object per image and line."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.file = open(path, "w", encoding="utf-8")
+
+    def write_record(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self.file.close()
+
+class TsvWriter(Writer):
+    """
+    One row per word with the path, region name, WORD_FIELDS and error; a word
+    table without dependencies. A failed record, or one without words, is one row
+    with empty word fields.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.file = open(path, "w", encoding="utf-8", newline="")
+        self.file.write("\t".join(("path", "region") + WORD_FIELDS + ("error",)) + "\n")
+
+    def write_record(self, record):
+        rows = [[word[field] for field in WORD_FIELDS] for word in record.get("words") or []]
+        if record.get("error") or not rows:
+            rows = [[""] * len(WORD_FIELDS)]
+        for row in rows:
+            values = [record["path"], record.get("region") or ""] + row + [record.get("error") or ""]
+            self.file.write("\t".join(" ".join(str(value).split()) if isinstance(value, str) else str(value)
+                                       for value in values) + "\n")
+
+    def close(self):
+        self.file.close()
+
+class HocrWriter(Writer):
+    """A single hOCR document with one ocr_page per image."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.file = open(path, "w", encoding="utf-8")
+        self.file.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                        '<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN" '
+                        '"http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">\n'
+                        '<html xmlns="http://www.w3.org/1999/xhtml">\n<head>\n<title></title>\n'
+                        '<meta http-equiv="Content-Type" content="text/html;charset=utf-8"/>\n'
+                        '<meta name="ocr-system" content="Tess-a-shot"/>\n'
+                        '<meta name="ocr-capabilities" content="ocr_page ocr_carea ocr_par ocr_line ocrx_word"/>\n'
+                        '</head>\n<body>\n')
+
+    def write_record(self, record):
+        page = self.count + 1
+        width, height = page_size(record)
+        title = f'image {hocr_string(record["path"])}; bbox 0 0 {width} {height}; ppageno {self.count}'
+        # Engine-specific properties carry the region name and the error of a failed record
+        if record.get("region"):
+            title += f'; x_region {hocr_string(record["region"])}'
+        if record.get("error"):
+            title += f'; x_error {hocr_string(record["error"])}'
+        title = quoteattr(title)
+        out = [f'<div class="ocr_page" id="page_{page}" title={title}>\n']
+        for block_number, (block, paragraphs) in enumerate(group_lines(record.get("words") or []).items(), 1):
+            out.append(f'<div class="ocr_carea" id="block_{page}_{block_number}" title="bbox {self.bbox(all_words(paragraphs))}">\n')
+            for par_number, lines in enumerate(paragraphs.values(), 1):
+                out.append(f'<p class="ocr_par" id="par_{page}_{block_number}_{par_number}" title="bbox {self.bbox(all_words(lines))}">\n')
+                for line_number, words in enumerate(lines.values(), 1):
+                    line_id = f"{page}_{block_number}_{par_number}_{line_number}"
+                    out.append(f'<span class="ocr_line" id="line_{line_id}" title="bbox {self.bbox(words)}">')
+                    for word_number, word in enumerate(words, 1):
+                        out.append(f'<span class="ocrx_word" id="word_{line_id}_{word_number}" '
+                                   f'title="bbox {self.bbox([word])}; x_wconf {round(word["conf"])}">'
+                                   f'{escape(word["text"])}</span> ')
+                    out.append('</span>\n')
+                out.append('</p>\n')
+            out.append('</div>\n')
+        out.append('</div>\n')
+        self.file.write("".join(out))
+
+    @staticmethod
+    def bbox(words):
+        return " ".join(str(v) for v in bounding_box(words))
+
+    def close(self):
+        self.file.write("</body>\n</html>\n")
+        self.file.close()
+
+class AltoWriter(Writer):
+    """
+    One ALTO v4 document per image, since ALTO names the source image only once,
+    in Description/sourceImageInformation. The documents are numbered after the
+    export path, e.g. results.xml becomes results_00001.xml, results_00002.xml...
+    The region name of a record goes in the processing step settings and its
+    error in the processing step description.
+    """
+
+    @staticmethod
+    def numbered_path(path, number):
+        base, extension = os.path.splitext(path)
+        return f"{base}_{number:05d}{extension}"
+
+    @classmethod
+    def destination(cls, path, count):
+        if count <= 1:
+            return cls.numbered_path(path, 1)
+        return f"{cls.numbered_path(path, 1)} ... {cls.numbered_path(path, count)}"
+
+    def write_record(self, record):
+        width, height = page_size(record)
+        step = ""
+        if record.get("error"):
+            step += f'<processingStepDescription>{escape(record["error"])}</processingStepDescription>'
+        if record.get("region"):
+            step += f'<processingStepSettings>region {escape(record["region"])}</processingStepSettings>'
+        out = ['<?xml version="1.0" encoding="UTF-8"?>\n'
+               '<alto xmlns="http://www.loc.gov/standards/alto/ns-v4#">\n'
+               '<Description><MeasurementUnit>pixel</MeasurementUnit>'
+               f'<sourceImageInformation><fileName>{escape(record["path"])}</fileName></sourceImageInformation>'
+               f'<OCRProcessing ID="OCR_0"><ocrProcessingStep>{step}<processingSoftware>'
+               '<softwareName>Tess-a-shot</softwareName></processingSoftware>'
+               '</ocrProcessingStep></OCRProcessing></Description>\n<Layout>\n'
+               f'<Page ID="page_1" PHYSICAL_IMG_NR="1" WIDTH="{width}" HEIGHT="{height}">\n'
+               f'<PrintSpace HPOS="0" VPOS="0" WIDTH="{width}" HEIGHT="{height}">\n']
+        for block_number, (block, paragraphs) in enumerate(group_lines(record.get("words") or []).items(), 1):
+            block_id = f"block_{block_number}"
+            out.append(f'<TextBlock ID="{block_id}" {self.geometry(all_words(paragraphs))}>\n')
+            line_number = 0
+            for lines in paragraphs.values():
+                for words in lines.values():
+                    line_number += 1
+                    line_id = f"line_{block_number}_{line_number}"
+                    out.append(f'<TextLine ID="{line_id}" {self.geometry(words)}>')
+                    for word_number, word in enumerate(words, 1):
+                        if word_number > 1:
+                            out.append('<SP/>')
+                        out.append(f'<String ID="string_{block_number}_{line_number}_{word_number}" '
+                                   f'{self.geometry([word])} WC="{max(0.0, word["conf"]) / 100:.2f}" '
+                                   f'CONTENT={quoteattr(word["text"])}/>')
+                    out.append('</TextLine>\n')
+            out.append('</TextBlock>\n')
+        out.append('</PrintSpace>\n</Page>\n</Layout>\n</alto>\n')
+        with open(self.numbered_path(self.path, self.count + 1), "w", encoding="utf-8") as f:
+            f.write("".join(out))
+
+    @staticmethod
+    def geometry(words):
+        x1, y1, x2, y2 = bounding_box(words)
+        return f'HPOS="{x1}" VPOS="{y1}" WIDTH="{x2 - x1}" HEIGHT="{y2 - y1}"'
+
+class ParquetWriter(Writer):
+    """
+    Columnar word table (path, region name, WORD_FIELDS and error per word) written
+    with the optional pyarrow package. A failed record, or one without words, is one
+    row whose word fields are null. Words are buffered up to PARQUET_ROW_GROUP and then written as one row group.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow), "
+                               "use the tsv format for a word table without it") from None
+        self.pa = pa
+        self.schema = pa.schema([("path", pa.string()), ("region", pa.string()), ("text", pa.string()),
+                                 ("conf", pa.float32()), ("left", pa.int32()), ("top", pa.int32()),
+                                 ("width", pa.int32()), ("height", pa.int32()), ("block", pa.int32()),
+                                 ("par", pa.int32()), ("line", pa.int32()), ("word", pa.int32()),
+                                 ("error", pa.string())])
+        self.writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+        self.columns = {name: [] for name in self.schema.names}
+        self.buffered = 0
+
+    def write_record(self, record):
+        words = record.get("words") or []
+        if record.get("error") or not words:
+            words = [dict.fromkeys(WORD_FIELDS)]
+        for word in words:
+            self.columns["path"].append(record["path"])
+            self.columns["region"].append(record.get("region"))
+            for field in WORD_FIELDS:
+                self.columns[field].append(word[field])
+            self.columns["error"].append(record.get("error"))
+            self.buffered += 1
+            if self.buffered >= PARQUET_ROW_GROUP:
+                self.flush()
+
+    def flush(self):
+        if self.buffered:
+            self.writer.write_table(self.pa.table(self.columns, schema=self.schema))
+            self.columns = {name: [] for name in self.schema.names}
+            self.buffered = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+WRITERS = {"jsonl": JsonlWriter, "hocr": HocrWriter, "alto": AltoWriter, "tsv": TsvWriter, "parquet": ParquetWriter}
+
+def destination(path, format=None, count=1):
+    """Describes the files an export of count records to path was written to, for messages."""
+    return WRITERS[format_for(path, format)].destination(path, count)
+
+def open_writer(path, format=None):
+    """Returns a writer for path, in format or the format guessed from the extension."""
+    return WRITERS[format_for(path, format)](path)
+
+def ocr_record(path, region=None):
+    """OCRs one file (or its region) and returns its export record."""
+    try:
+        image = source_ops.open_image(path)
+        words = ocr_ops.image_to_words(image, region, ocr_ops.config_for(path))
+        return {"path": path, "text": ocr_ops.words_to_text(words), "size": list(image.size), "words": words}
+    except Exception as e:
+        return {"path": path, "text": "", "error": str(e)}
+
+def ocr_region_records(path, regions):
+    """
+    OCRs the named regions of one file (see region_ops), decoding it once, and
+    returns one record per region, labelled with the region name.
+    """
+    try:
+        image = source_ops.open_image(path)
+    except Exception as e:
+        return [{"path": path, "region": region["name"], "text": "", "error": str(e)} for region in regions]
+    config = ocr_ops.config_for(path)
+    records = []
+    for region in regions:
+        record = {"path": path, "region": region["name"]}
+        try:
+            box = region_ops.clip(region["box"], image.size)
+            words = ocr_ops.image_to_words(image, box, config) if box is not None else []
+            record.update(text=ocr_ops.words_to_text(words), size=list(image.size), words=words)
+        except Exception as e:
+            record.update(text="", error=str(e))
+        records.append(record)
+    return records
+
+def iter_file_records(paths, region=None, regions=None, priority=scheduler_ops.BACKGROUND, cancelled=None):
+    """
+    OCRs files as scheduler jobs of priority and yields their records in the order
+    of paths: one record per file, or with named regions one per region of each file.
+    Jobs are submitted a few at a time, so memory stays bounded however many paths
+    there are and however slow the consumer is, and interactive OCR goes first.
+    """
+    if regions:
+        for records in scheduler_ops.map_jobs(lambda path: ocr_region_records(path, regions), paths,
+                                              priority=priority, cancelled=cancelled):
+            yield from records
+        return
+    yield from scheduler_ops.map_jobs(lambda path: ocr_record(path, region), paths, priority=priority,
+                                      cancelled=cancelled)
+
+def export(records, path, format=None, progress=None):
+    """
+    Writes records (any iterable, e.g. a generator over a result store) to path.
+    Returns the number of records written.
+    """
+    with open_writer(path, format) as writer:
+        for record in records:
+            writer.write(record)
+            if progress:
+                progress(writer.count)
+    return writer.count
@@ -0,0 +1,106 @@
+from PIL import Image
+
+import ocr_ops
+import scheduler_ops
+import source_ops
+
+HASH_SIZE = 64  # Frames are compared by a 64x64 edge hash, fine enough to notice changed words
+HASH_TOLERANCE = 4  # Gray levels by which neighbouring pixels must differ to set a bit, ignoring dithering noise
+# Frames whose hashes differ in at most this many of the 4096 bits count as duplicates of
+# the last OCR'd frame: a few bits flip with compression noise or a blinking cursor,
+# while changed lines of text flip more
+DUPLICATE_DISTANCE = 3
+
+def frame_count(image):
+    """Returns the number of frames of an image (1 for single-frame formats)."""
+    return getattr(image, "n_frames", 1)
+
+def read_frame(image, index):
+    """Seeks image to frame index and returns a decoded copy of the frame."""
+    image.seek(index)
+    if image.mode in ("1", "L"):
+        return image.convert("L")
+    return image.convert("RGB")
+
+def iter_frames(path):
+    """Yields (index, frame) for every frame of a file, decoding one frame at a time."""
+    image = source_ops.open_image(path)
+    try:
+        for index in range(frame_count(image)):
+            yield index, read_frame(image, index)
+    finally:
+        image.close()
+
+def frame_hash(frame):
+    """Edge hash: one bit per horizontally adjacent pair of pixels of a small grayscale copy that differ."""
+    small = frame.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for column in range(HASH_SIZE):
+            value = (value << 1) | (abs(pixels[offset + column] - pixels[offset + column + 1]) > HASH_TOLERANCE)
+    return value
+
+def hash_distance(a, b):
+    return bin(a ^ b).count("1")
+
+def ocr_frames(path, region=None, priority=scheduler_ops.INTERACTIVE, on_result=None, cancelled=None):
+    """
+    OCRs every distinct frame of a multi-frame file.
+
+    Frames are decoded one at a time and compared with the last OCR'd frame;
+    near-identical frames are skipped. The others are OCR'd in parallel as
+    scheduler jobs of priority, with at most a few frames per worker of the
+    class waiting in memory.
+
+    Args:
+        path: file path or archive member path
+        region: (x1, y1, x2, y2) to OCR in every frame, or None for whole frames
+        priority: scheduler class of the calling job
+        on_result: called as on_result(index, text, duplicate_of) in frame order;
+                   duplicate_of is the index of the frame whose text applies, or None
+        cancelled: function returning True to stop early
+
+    Returns:
+        list of (index, text, duplicate_of) in frame order
+    """
+    config = ocr_ops.config_for(path)
+    results = []
+    texts = {}
+
+    def distinct_frames():
+        """Yields (index, frame or None, duplicate_of) in frame order; duplicates carry no frame."""
+        last_hash = None
+        last_index = None
+        for index, frame in iter_frames(path):
+            if region is not None:
+                frame = frame.crop(tuple(region))
+            current_hash = frame_hash(frame)
+            if last_hash is not None and hash_distance(current_hash, last_hash) <= DUPLICATE_DISTANCE:
+                yield index, None, last_index
+            else:
+                yield index, frame, None
+                last_hash, last_index = current_hash, index
+            del frame
+
+    def ocr_frame(item):
+        index, frame, duplicate_of = item
+        return index, (ocr_ops.ocr_image(frame, None, config) if frame is not None else None), duplicate_of
+
+    for index, text, duplicate_of in scheduler_ops.map_jobs(ocr_frame, distinct_frames(), priority=priority,
+                                                            cancelled=cancelled):
+        if duplicate_of is not None:
+            text = texts[duplicate_of]
+        else:
+            texts[index] = text
+        results.append((index, text, duplicate_of))
+        if on_result:
+            on_result(index, text, duplicate_of)
+    return results
+
+def format_frame(index, text, duplicate_of):
+    """Formats the text of one frame for the output pane."""
+    if duplicate_of is not None:
+        return f"[Frame {index + 1}: same as frame {duplicate_of + 1}]\n\n"
+    return f"[Frame {index + 1}]\n{text.strip()}\n\n"
@@ -1,15 +1,26 @@
 import os
 import time
 import tkinter as tk
-from PIL import Image, ImageTk
-import pytesseract
+from PIL import Image
 import threading
-import pyperclip
 
 import ui_ops
 import ctx_ui
 import settings
 import text_ops
+import source_ops
+import ocr_ops
+import scheduler_ops
+import tile_ops
+import memory_ops
+import overlay_ops
+import diff_ops
+import frame_ops
+import textblock_ops
+import region_ops
+import refine_ops
+import live_ops
+import index_ops
 
 original_image = None
 loaded_image_path = None
@@ -19,15 +30,24 @@ image_resize_time = 0
 image_ocr_time = 0
 extracted_text = ""
 last_resize_time = 0
+load_callbacks = []  # Called once, without arguments, when the next image is displayed or fails to load
 
 # Variables for region selection
 selection_start_x = 0
 selection_start_y = 0
 selection_rect = None
 
-img_resized = None
+img_resized = None  # Visible part of the displayed image
+displayed_size = None  # (width, height) of the whole displayed image with zoom applied
 display_scale_factor = (1, 1)  # (width_scale, height_scale)
 
+# Multi-frame files (GIF, TIFF): the open file and the frame shown from it
+frame_source = None
+frame_index = 0
+
+# Incremented for every load so that a slow tile conversion of a previous file is dropped
+load_generation = 0
+
 # For OCR cancellation
 ocr_generation = 0
 ocr_generation_lock = threading.Lock()
@@ -42,38 +62,81 @@ drag_start_y = 0
 def load_image(file_path):
     """
     Loads an image from the specified file path, updates the UI, and processes the image for OCR.
+    Images above the "tiled_image_megapixels" setting are converted once into a
+    memory-mapped tile cache in the background and displayed from there.
     """
-    global loaded_image_path, original_image, image_load_time, image_file_name, selection_rect, zoom_level, pan_offset_x, pan_offset_y
+    global zoom_level, pan_offset_x, pan_offset_y, load_generation
     
     # Reset zoom and pan when loading a new image
     zoom_level = 1.0
     pan_offset_x = 0
     pan_offset_y = 0
 
-    # Update the directory entry if it's from a different directory
-    directory = os.path.dirname(file_path)
-    if directory != settings.current_directory and os.path.exists(directory):
-        settings.current_directory = directory
-        ctx_ui.directory_entry.delete(0, tk.END)
-        ctx_ui.directory_entry.insert(0, directory)
+    settings.current_file = file_path
+
+    # Switch the browsed root if the file is not part of the current list;
+    # the refreshed list selects the current file once it is populated
+    directory = source_ops.container_directory(file_path)
+    if not ctx_ui.file_tree.exists(file_path) and os.path.exists(directory):
+        ui_ops.set_roots([directory])
         ui_ops.refresh_file_list()
-        
-        # Select the file in the treeview
-        filename = os.path.basename(file_path)
-        for iid in ctx_ui.file_tree.get_children():
-            if ctx_ui.file_tree.item(iid, "values")[0] == filename:
-                ctx_ui.file_tree.selection_set(iid)
-                ctx_ui.file_tree.see(iid)
-                break
     # Start timing for image loading
     start_time = time.time()
+    load_generation += 1
+    my_generation = load_generation
     
     try:
-        original_image = Image.open(file_path)
+        # Only the header is read here, the pixels are decoded on first use
+        image = source_ops.open_image(file_path)
+        if not tile_ops.needs_tiling(image):
+            show_loaded_image(my_generation, file_path, image, start_time)
+            return
+
+        # The previous image must not stay OCR-able under the name of the new file
+        unload_image()
+        my_generation = load_generation
+        ui_ops.set_status(f"Preparing tiled cache for {image.size[0]}x{image.size[1]} image...")
+        ctx_ui.text_output.delete("1.0", tk.END)
+        ctx_ui.text_output.insert(tk.END, "Preparing large image...")
+
+        def tile_task():
+            try:
+                loaded = tile_ops.open_tiled(file_path)
+                if loaded is None:
+                    # Formats that cannot be read in bands are decoded in memory, as
+                    # opening them already checked them against "max_image_megapixels"
+                    image.load()
+                    loaded = image
+                ctx_ui.window.after(0, show_loaded_image, my_generation, file_path, loaded, start_time)
+            except Exception as e:
+                ctx_ui.window.after(0, show_tile_error, my_generation, e)
+        threading.Thread(target=tile_task, daemon=True).start()
+    except Exception as e:
+        show_load_error(e)
+
+def show_loaded_image(generation, file_path, image, start_time):
+    """Makes a freshly opened image the current one, displays it and starts OCR."""
+    global loaded_image_path, original_image, image_load_time, image_file_name
+    global last_display_width, last_display_height, frame_source, frame_index
+
+    if generation != load_generation:
+        return  # Another file was selected meanwhile
+
+    try:
+        # Multi-frame files are shown one frame at a time, selected with the frame slider
+        frame_index = 0
+        if frame_ops.frame_count(image) > 1:
+            frame_source = image
+            image = frame_ops.read_frame(frame_source, 0)
+        else:
+            frame_source = None
+        update_frame_slider()
+
+        original_image = image
+        memory_ops.track("original", "current", memory_ops.image_bytes(image))
         
         # Force display update immediately
         # First reset dimensions to force redraw
-        global last_display_width, last_display_height
         last_display_width = 0
         last_display_height = 0
         
@@ -83,6 +146,9 @@ def load_image(file_path):
         ctx_ui.text_output.delete("1.0", tk.END)
         ctx_ui.text_output.insert(tk.END, "Processing image...")
         
+        # Word boxes of the previous image must not be drawn over this one
+        overlay_ops.clear_words()
+
         # Update the display and force a refresh
         ctx_ui.window.update_idletasks()
         display_image()
@@ -90,14 +156,75 @@ def load_image(file_path):
         # Set the loaded image path
         loaded_image_path = file_path
         image_file_name = os.path.basename(file_path)
+        overlay_ops.on_image_loaded()
         
         # Automatically process the image for OCR
         process_image_async()
     except Exception as e:
-        ui_ops.set_status(f"Error loading image: {e}")
-        ctx_ui.image_canvas.photo = None  # Clear the reference to avoid memory leaks
-        ctx_ui.image_canvas.delete("all")  # Clear the canvas
-        original_image = None
+        show_load_error(e)
+    run_load_callbacks()
+
+def run_load_callbacks():
+    global load_callbacks
+    callbacks, load_callbacks = load_callbacks, []
+    for callback in callbacks:
+        callback()
+
+def show_tile_error(generation, e):
+    if generation == load_generation:
+        show_load_error(e)
+
+def show_load_error(e):
+    """Reports an image loading error and clears the canvas."""
+    global original_image, frame_source
+    ui_ops.set_status(f"Error loading image: {e}")
+    ctx_ui.image_canvas.photo = None  # Clear the reference to avoid memory leaks
+    ctx_ui.image_canvas.delete("all")  # Clear the canvas
+    original_image = None
+    frame_source = None
+    update_frame_slider()
+    release_image_memory()
+    run_load_callbacks()
+
+def image_key():
+    """Identifies the displayed image: its path, plus the frame number for multi-frame files."""
+    if frame_source is not None and loaded_image_path:
+        return f"{loaded_image_path}#{frame_index}"
+    return loaded_image_path
+
+def update_frame_slider():
+    """Shows the frame slider below the preview for multi-frame files and hides it otherwise."""
+    slider = ctx_ui.frame_slider
+    if frame_source is None:
+        slider.pack_forget()
+        return
+    slider.configure(from_=1, to=frame_ops.frame_count(frame_source))
+    slider.set(frame_index + 1)
+    if not slider.winfo_ismapped():
+        slider.pack(side=tk.BOTTOM, fill=tk.X, before=ctx_ui.image_canvas)
+
+def on_frame_slider(value):
+    """Displays the frame chosen with the frame slider."""
+    global original_image, frame_index
+    index = int(float(value)) - 1
+    if frame_source is None or index == frame_index:
+        return
+    try:
+        original_image = frame_ops.read_frame(frame_source, index)
+    except Exception as e:
+        ui_ops.set_status(f"Error reading frame {index + 1}: {e}")
+        return
+    frame_index = index
+    memory_ops.track("original", "current", memory_ops.image_bytes(original_image))
+    overlay_ops.clear_words()
+    display_image(force=True)
+    overlay_ops.on_image_loaded()
+    ui_ops.set_status(f"Frame {index + 1} of {frame_ops.frame_count(frame_source)}")
+
+def release_image_memory():
+    """Forgets the accounted memory of the current image and its display copies."""
+    for category in ("original", "display", "photo"):
+        memory_ops.release(category, "current")
 
 def display_image(force=False):
     """
@@ -108,7 +235,7 @@ def display_image(force=False):
     Args:
         force (bool): If True, forces the image to be redrawn regardless of dimension changes
     """
-    global last_display_width, last_display_height, original_image, loaded_image_path, image_resize_time, display_scale_factor, img_resized, selection_rect
+    global last_display_width, last_display_height, original_image, loaded_image_path, image_resize_time, display_scale_factor, img_resized, displayed_size, selection_rect
     
     if original_image is None:
         return
@@ -160,11 +287,7 @@ def display_image(force=False):
         zoomed_width = int(new_width * zoom_level)
         zoomed_height = int(new_height * zoom_level)
 
-        # Resize the image with zoom applied
-        img_resized = original_image.resize((zoomed_width, zoomed_height), Image.LANCZOS)
-        
-        # Convert to PhotoImage for Tkinter
-        photo = ImageTk.PhotoImage(img_resized)
+        displayed_size = (zoomed_width, zoomed_height)
 
         canvas_width = ctx_ui.image_canvas.winfo_width()
         canvas_height = ctx_ui.image_canvas.winfo_height()
@@ -177,10 +300,37 @@ def display_image(force=False):
         image_x = base_image_x + pan_offset_x
         image_y = base_image_y + pan_offset_y
 
+        # Only the part of the zoomed image that is visible on the canvas is rendered,
+        # so memory use is bounded by the viewport even at high zoom
+        visible_x1 = max(0, image_x)
+        visible_y1 = max(0, image_y)
+        visible_x2 = min(display_width, image_x + zoomed_width)
+        visible_y2 = min(display_height, image_y + zoomed_height)
+
         # Clear canvas and redraw image
         ctx_ui.image_canvas.delete("all")
-        ctx_ui.image_canvas.photo = photo  # Keep a reference!
-        ctx_ui.image_canvas.create_image(image_x, image_y, anchor="nw", image=photo)
+        ctx_ui.image_canvas.photo = None
+        img_resized = None
+        memory_ops.release("display", "current")
+        memory_ops.release("photo", "current")
+        if visible_x2 > visible_x1 and visible_y2 > visible_y1:
+            scale_x = width / zoomed_width
+            scale_y = height / zoomed_height
+            source_box = ((visible_x1 - image_x) * scale_x, (visible_y1 - image_y) * scale_y,
+                          (visible_x2 - image_x) * scale_x, (visible_y2 - image_y) * scale_y)
+            img_resized = original_image.resize((visible_x2 - visible_x1, visible_y2 - visible_y1),
+                                                Image.LANCZOS, box=source_box)
+            
+            # Convert to PhotoImage for Tkinter (ImageTk is imported on first display)
+            from PIL import ImageTk
+            memory_ops.track("display", "current", memory_ops.image_bytes(img_resized))
+            photo = ImageTk.PhotoImage(img_resized)
+            ctx_ui.image_canvas.photo = photo  # Keep a reference!
+            ctx_ui.image_canvas.create_image(visible_x1, visible_y1, anchor="nw", image=photo)
+            memory_ops.track("photo", "current", memory_ops.photo_bytes(*img_resized.size))
+            # The resized copy is only needed to fill the photo
+            img_resized = None
+            memory_ops.release("display", "current")
         
         # Calculate resize time
         image_resize_time = (time.time() - start_time) * 1000  # Convert to milliseconds
@@ -212,6 +362,8 @@ def display_image(force=False):
             # Update the visual selection rectangle to match the stored coordinates
             update_selection_rectangle_from_coords()
 
+        overlay_ops.draw_overlay()
+
         if force:
             # For forced updates, keep the existing status message
             pass
@@ -224,6 +376,28 @@ def display_image(force=False):
         ctx_ui.image_canvas.photo = None  # Clear the reference to avoid memory leaks
         ctx_ui.image_canvas.delete("all")  # Clear the canvas
 
+def image_origin():
+    """Returns the canvas position (x, y) of the top-left corner of the displayed image."""
+    canvas_width = ctx_ui.image_canvas.winfo_width()
+    canvas_height = ctx_ui.image_canvas.winfo_height()
+    img_width, img_height = displayed_size
+    return ((canvas_width - img_width) // 2 + pan_offset_x,
+            (canvas_height - img_height) // 2 + pan_offset_y)
+
+def image_to_canvas(x, y):
+    """Converts original image coordinates to canvas coordinates."""
+    image_x, image_y = image_origin()
+    img_width, img_height = displayed_size
+    orig_width, orig_height = original_image.size
+    return image_x + x * img_width / orig_width, image_y + y * img_height / orig_height
+
+def canvas_to_image(x, y):
+    """Converts canvas coordinates to original image coordinates."""
+    image_x, image_y = image_origin()
+    img_width, img_height = displayed_size
+    orig_width, orig_height = original_image.size
+    return (x - image_x) * orig_width / img_width, (y - image_y) * orig_height / img_height
+
 def update_selection_rectangle_from_coords():
     """
     Creates or updates the selection rectangle on the canvas based on the stored selection coordinates.
@@ -237,8 +411,8 @@ def update_selection_rectangle_from_coords():
     # Get canvas and image display info
     canvas_width = ctx_ui.image_canvas.winfo_width()
     canvas_height = ctx_ui.image_canvas.winfo_height()
-    if img_resized is not None:
-        img_width, img_height = img_resized.size
+    if displayed_size is not None:
+        img_width, img_height = displayed_size
     else:
         return
     
@@ -280,7 +454,7 @@ def update_selection_rectangle_from_coords():
 
 def process_image_async():
     """
-    Processes the loaded image using OCR in a background thread.
+    Processes the loaded image using OCR as an interactive scheduler job.
     Cancels previous OCR operation if a new one is started.
     """
     global original_image, extracted_text, image_ocr_time, loaded_image_path, ocr_generation
@@ -289,6 +463,37 @@ def process_image_async():
         ocr_generation += 1
         my_generation = ocr_generation
 
+    # In change-aware mode a whole image is compared with the file listed before it
+    change_aware = False
+    previous_path = None
+    if ctx_ui.change_aware_var.get() and original_image is not None and diff_ops.numpy_available():
+        width, height = original_image.size
+        change_aware = settings.selection_coords == [0, 0, width, height]
+        previous_path = ui_ops.previous_listed_path(loaded_image_path)
+
+    # Without a selected region, only the detected text blocks are OCR'd
+    detect_blocks = False
+    if ctx_ui.detect_text_blocks_var.get() and original_image is not None and diff_ops.numpy_available():
+        width, height = original_image.size
+        detect_blocks = settings.selection_coords == [0, 0, width, height]
+    # Named regions are all OCR'd together in place of the selection
+    regions = []
+    if ctx_ui.named_regions_var.get():
+        regions = [dict(region) for region in region_ops.named_regions()]
+    two_pass = ctx_ui.two_pass_var.get()
+    # Whole still images indexed in the background are not OCR'd again, unless the
+    # two-pass OCR is on: the index holds single-pass text
+    use_index = False
+    if ctx_ui.index_var.get() and not two_pass and original_image is not None:
+        width, height = original_image.size
+        use_index = settings.selection_coords == [0, 0, width, height]
+    key = image_key()
+    config = ocr_ops.config_for(loaded_image_path)
+
+    if frame_source is not None:
+        process_frames_async(my_generation)
+        return
+
     def ocr_task(my_generation):
         if not loaded_image_path or not original_image or settings.selection_coords == [0, 0, 0, 0]:
             if my_generation == ocr_generation:
@@ -296,10 +501,37 @@ def process_image_async():
                 ctx_ui.text_output.insert(tk.END, "Please select an image first.")
             return
         start_time = time.time()
+        ocr_message = None
         try:
-            x1, y1, x2, y2 = settings.selection_coords
-            region_image = original_image.crop((x1, y1, x2, y2))
-            result = pytesseract.image_to_string(region_image)
+            indexed = index_ops.lookup(loaded_image_path, config) if use_index else None
+            if regions:
+                result = region_ops.format_results(region_ops.ocr_named_regions(original_image, regions, config))
+                ocr_message = f"OCR'd {len(regions)} named regions."
+            elif change_aware:
+                result, ocr_message = ocr_changes(loaded_image_path, original_image, previous_path, config)
+            elif detect_blocks:
+                result, blocks = textblock_ops.ocr_text_blocks(original_image, config)
+                ctx_ui.window.after(0, overlay_ops.set_text_blocks, key, blocks)
+                if blocks:
+                    ocr_message = f"OCR'd {len(blocks)} detected text blocks."
+            elif indexed is not None and "words" in indexed:
+                # Indexed in the background: shown without OCR, and the word boxes are reused
+                result = indexed["text"]
+                overlay_ops.word_cache.put(key, indexed["words"])
+                ocr_message = "Text from the background index."
+            elif two_pass:
+                words, refined, lines = refine_ops.two_pass_words(original_image, settings.selection_coords, config)
+                result = ocr_ops.words_to_text(words)
+                ocr_message = f"Two-pass OCR: re-read {refined} of {lines} lines."
+            else:
+                # Text is shown band by band as it arrives
+                parts = []
+                for text, fraction in ocr_ops.iter_ocr(original_image, settings.selection_coords, config,
+                                                       cancelled=lambda: my_generation != ocr_generation):
+                    parts.append(text)
+                    if fraction < 1.0:
+                        ctx_ui.window.after(0, show_partial_text, my_generation, text, len(parts) == 1, fraction)
+                result = "".join(parts)
             elapsed = (time.time() - start_time) * 1000
             def update_ui():
                 nonlocal result, elapsed
@@ -311,6 +543,8 @@ def process_image_async():
                 ctx_ui.text_output.delete("1.0", tk.END)
                 ctx_ui.text_output.insert(tk.END, result)
                 ui_ops.show_status()
+                if ocr_message:
+                    ui_ops.set_status(ocr_message)
                 
                 # Auto-copy to clipboard if "Copy text on region select" is enabled
                 if ctx_ui.copy_on_region_select_var.get() and result:
@@ -318,7 +552,7 @@ def process_image_async():
                     text_to_copy = result
                     if ctx_ui.reformat_lines_var.get():
                         text_to_copy = text_ops.reformat_text(text_to_copy)
-                    pyperclip.copy(text_to_copy)
+                    text_ops.copy_text(text_to_copy)
                     ui_ops.set_status("Text extracted and copied to clipboard.")
             ctx_ui.window.after(0, update_ui)
         except Exception as e:
@@ -329,73 +563,133 @@ def process_image_async():
                 ctx_ui.text_output.insert(tk.END, f"Error during OCR processing: {e}")
                 ui_ops.show_status()
             ctx_ui.window.after(0, update_ui_error, e)
-    threading.Thread(target=ocr_task, args=(my_generation,), daemon=True).start()
-
-# Function to delete the current image file
-def delete_image():
-    """Delete the current image file from storage."""
-    global loaded_image_path, original_image, last_display_width, last_display_height
-    
-    if not loaded_image_path or not os.path.exists(loaded_image_path):
-        ui_ops.set_status("No valid image to delete.")
-        return
-    
-    try:
-        os.remove(loaded_image_path)
-        ui_ops.set_status(f"Image deleted: {loaded_image_path}")
-        
-        # Remove from treeview
-        filename = os.path.basename(loaded_image_path)
-        next_iid = None
-        iids = list(ctx_ui.file_tree.get_children())
-        for idx, iid in enumerate(iids):
-            if ctx_ui.file_tree.item(iid, "values")[0] == filename:
-                ctx_ui.file_tree.delete(iid)
-                # Determine next file index
-                if len(iids) > 1:
-                    if idx < len(iids) - 1:
-                        next_iid = iids[idx + 1]
-                    elif idx > 0:
-                        next_iid = iids[idx - 1]
-                break
-        
-        # Clear the UI elements
+    # A newer request replaces a still queued one, so only the latest selection is OCR'd
+    scheduler_ops.submit(ocr_task, my_generation, priority=scheduler_ops.INTERACTIVE, key="selection")
+
+def show_partial_text(my_generation, text, first, fraction):
+    """Appends the text of one OCR band to the output pane while the rest is still being read."""
+    if my_generation != ocr_generation:
+        return  # Cancelled
+    if first:
         ctx_ui.text_output.delete("1.0", tk.END)
-        ctx_ui.text_output.insert(tk.END, "Image deleted.")
-        ctx_ui.image_canvas.delete("all")  # Clear the canvas
-        ctx_ui.image_canvas.photo = None  # Clear the reference to avoid memory leaks
-        ctx_ui.status_label.config(text="No image loaded")
-        
-        # Reset cache variables
-        loaded_image_path = ""
-        original_image = None
-        last_display_width = 0
-        last_display_height = 0
+    ctx_ui.text_output.insert(tk.END, text)
+    ui_ops.set_status(f"OCR {fraction:.0%}...")
 
-        # Automatically open and process the next file in the list, if any
-        if next_iid is not None:
-            file_name = ctx_ui.file_tree.item(next_iid, "values")[0]
-            ctx_ui.file_tree.selection_set(next_iid)
-            ctx_ui.file_tree.see(next_iid)
-            next_file_path = os.path.join(settings.current_directory, file_name)
-            load_image(next_file_path)
-    except Exception as e:
-        ui_ops.set_status(f"Error deleting image: {e}")
+def process_frames_async(my_generation):
+    """
+    OCRs every distinct frame of the loaded multi-frame file in parallel.
+    The text of each frame is appended to the output pane as soon as it and
+    all frames before it are done.
+    """
+    path = loaded_image_path
+    region = settings.selection_coords
+    width, height = original_image.size
+    if region == [0, 0, width, height]:
+        region = None
+    ctx_ui.text_output.delete("1.0", tk.END)
+    ctx_ui.text_output.insert(tk.END, "Processing frames...")
 
-def update_selection_rectangle():
+    def is_cancelled():
+        return my_generation != ocr_generation
+
+    def append_frame(index, text, duplicate_of):
+        if is_cancelled():
+            return
+        if index == 0:
+            ctx_ui.text_output.delete("1.0", tk.END)
+        ctx_ui.text_output.insert(tk.END, frame_ops.format_frame(index, text, duplicate_of))
+
+    def frames_task():
+        start_time = time.time()
+        try:
+            results = frame_ops.ocr_frames(path, region, cancelled=is_cancelled,
+                                           on_result=lambda *result: ctx_ui.window.after(0, append_frame, *result))
+        except Exception as e:
+            ctx_ui.window.after(0, ui_ops.set_status, f"Error during OCR processing: {e}")
+            return
+        elapsed = (time.time() - start_time) * 1000
+
+        def update_ui():
+            global extracted_text, image_ocr_time
+            if is_cancelled():
+                return
+            image_ocr_time = elapsed
+            extracted_text = "".join(frame_ops.format_frame(*result) for result in results)
+            skipped = sum(1 for _, _, duplicate_of in results if duplicate_of is not None)
+            ui_ops.set_status(f"OCR'd {len(results) - skipped} of {len(results)} frames "
+                              f"({skipped} duplicates skipped) in {elapsed / 1000:.1f}s")
+            if ctx_ui.copy_on_region_select_var.get() and extracted_text:
+                text_ops.copy_text(extracted_text)
+        ctx_ui.window.after(0, update_ui)
+
+    scheduler_ops.submit(frames_task, priority=scheduler_ops.INTERACTIVE, key="selection")
+
+def ocr_changes(path, image, previous_path, config=None):
     """
-    Updates the selection coordinates based on the current selection rectangle on the canvas.
-    This function converts from display coordinates to original image coordinates.
+    Change-aware OCR: re-reads only the areas that differ from the previous file
+    and takes the text of the other areas from its cached word boxes.
+    Returns the text and a status message.
+    """
+    previous_image = None
+    previous_words = overlay_ops.word_cache.get(previous_path) if previous_path else None
+    if previous_words is not None:
+        try:
+            previous_image = diff_ops.previous_frame(previous_path)
+        except Exception as e:
+            text_ops.log(f"Cannot read previous file {previous_path}: {e}")
+    words, fraction = diff_ops.ocr_changes(image, previous_image, previous_words, config)
+    overlay_ops.word_cache.put(path, words)
+    diff_ops.remember_frame(path, image)
+    ctx_ui.window.after(0, overlay_ops.set_words, path, words)
+    if fraction >= 1.0:
+        return ocr_ops.words_to_text(words), None
+    return ocr_ops.words_to_text(words), f"Changes: re-read {fraction:.0%} of the image, reused the rest."
+
+def unload_image():
+    """Closes the current image, e.g. because its file is being deleted or moved."""
+    global loaded_image_path, original_image, last_display_width, last_display_height, frame_source
+    global load_generation, ocr_generation
+
+    # Drops a tile conversion or OCR still running for the file
+    load_generation += 1
+    with ocr_generation_lock:
+        ocr_generation += 1
+    # The frames of a multi-frame file are read from an open handle
+    if frame_source is not None:
+        frame_source.close()
+        frame_source = None
+        update_frame_slider()
+    if original_image is not None and hasattr(original_image, "close"):
+        original_image.close()
+    overlay_ops.clear_words()
+    ctx_ui.text_output.delete("1.0", tk.END)
+    ctx_ui.image_canvas.delete("all")  # Clear the canvas
+    ctx_ui.image_canvas.photo = None  # Clear the reference to avoid memory leaks
+    ctx_ui.status_label.config(text="No image loaded")
+
+    # Reset cache variables
+    loaded_image_path = ""
+    original_image = None
+    release_image_memory()
+    last_display_width = 0
+    last_display_height = 0
+
+def selection_box():
+    """
+    Converts the selection rectangle on the canvas to original image coordinates.
+
+    Returns:
+        ([x1, y1, x2, y2] in original image coordinates, (x1, y1, x2, y2) on the canvas
+        constrained to the image), or None without a selection rectangle
     """
-    global selection_rect, display_scale_factor
     if not selection_rect or not original_image:
-        return
+        return None
         
     # Get canvas size and displayed image size
     canvas_width = ctx_ui.image_canvas.winfo_width()
     canvas_height = ctx_ui.image_canvas.winfo_height()
-    if img_resized is not None:
-        img_width, img_height = img_resized.size
+    if displayed_size is not None:
+        img_width, img_height = displayed_size
     else:
         img_width, img_height = canvas_width, canvas_height
     
@@ -443,12 +737,22 @@ def update_selection_rectangle():
     orig_y1 = max(0, min(orig_y1, height - 1))
     orig_x2 = max(orig_x1 + 1, min(orig_x2, width))
     orig_y2 = max(orig_y1 + 1, min(orig_y2, height))
+    return [orig_x1, orig_y1, orig_x2, orig_y2], (x1, y1, x2, y2)
+
+def update_selection_rectangle():
+    """
+    Updates the selection coordinates based on the current selection rectangle on the canvas.
+    This function converts from display coordinates to original image coordinates.
+    """
+    box = selection_box()
+    if box is None:
+        return
     
     # Update selection coordinates
-    settings.selection_coords = [orig_x1, orig_y1, orig_x2, orig_y2]
+    settings.selection_coords, canvas_coords = box
     
     # Update the selection rectangle coordinates on canvas
-    ctx_ui.image_canvas.coords(selection_rect, x1, y1, x2, y2)
+    ctx_ui.image_canvas.coords(selection_rect, *canvas_coords)
 
     # Log new selection coordinates
     text_ops.log(f"Updated selection coordinates: {settings.selection_coords}")
@@ -476,8 +780,8 @@ def on_selection_motion(event):
         # Get canvas size and displayed image size
         canvas_width = ctx_ui.image_canvas.winfo_width()
         canvas_height = ctx_ui.image_canvas.winfo_height()
-        if img_resized is not None:
-            img_width, img_height = img_resized.size
+        if displayed_size is not None:
+            img_width, img_height = displayed_size
         else:
             img_width, img_height = canvas_width, canvas_height
         
@@ -494,12 +798,14 @@ def on_selection_motion(event):
         y = min(max(event.y, image_y), image_y + img_height)
         ctx_ui.image_canvas.tag_raise(selection_rect)
         ctx_ui.image_canvas.coords(selection_rect, selection_start_x, selection_start_y, x, y)
+        live_ops.schedule_preview()
 
 def on_selection_end(event):
     """
     Finalize the selection rectangle and update the selection coordinates.
     Then process the selected region.
     """
+    live_ops.cancel_preview()
     update_selection_rectangle()
     # Process the selected region
     process_image_async()
@@ -570,10 +876,10 @@ def zoom_in_at_point(event):
     """Zoom in by 1.5x and center on the click position."""
     global zoom_level, pan_offset_x, pan_offset_y
     
-    if not original_image or img_resized is None:
+    if not original_image or displayed_size is None:
         return
     
-    current_width, current_height = img_resized.size
+    current_width, current_height = displayed_size
     
     # Apply zoom
     zoom_level *= 1.5
@@ -590,10 +896,10 @@ def zoom_out_at_point(event):
     """Zoom out by 1.5x and center on the click position."""
     global zoom_level, pan_offset_x, pan_offset_y
     
-    if not original_image or img_resized is None:
+    if not original_image or displayed_size is None:
         return
     
-    current_width, current_height = img_resized.size
+    current_width, current_height = displayed_size
     
     # Apply zoom
     zoom_level /= 1.5
@@ -660,6 +966,8 @@ def on_mouse_press(event):
         zoom_in_at_point(event)
     elif mode == "zoom_out":
         zoom_out_at_point(event)
+    elif mode == "word_select":
+        overlay_ops.on_word_click(event)
     else:
         # Default to area selection
         on_selection_start(event)
@@ -0,0 +1,382 @@
+import glob
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import backend_ops
+import export_ops
+import ocr_ops
+import scheduler_ops
+import settings
+import source_ops
+
+# The index is kept next to the settings file and shared by all directories
+INDEX_FILE = os.path.join(os.path.dirname(settings.CONFIG_FILE), ".tessashot_index.sqlite")
+RESCAN_SECONDS = 60  # A finished directory is checked again for new or changed files after this
+SEARCH_LIMIT = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    directory TEXT NOT NULL,
+    mtime_ns INTEGER,
+    size INTEGER,
+    text TEXT,
+    words TEXT,
+    error TEXT,
+    indexed REAL,
+    config TEXT
+);
+CREATE INDEX IF NOT EXISTS files_directory ON files(directory);
+"""
+
+_local = threading.local()
+
+def connect(db_path=INDEX_FILE):
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    # Indexes made before the configuration was stored get the column; their records count as stale
+    if "config" not in [row[1] for row in conn.execute("PRAGMA table_info(files)")]:
+        conn.execute("ALTER TABLE files ADD COLUMN config TEXT")
+    try:
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS texts USING fts5(path UNINDEXED, text)")
+    except sqlite3.OperationalError:
+        pass  # SQLite without FTS5; search falls back to LIKE
+    return conn
+
+def connection():
+    """Returns the index connection of the calling thread, opened on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = connect()
+    return conn
+
+def has_fts(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'texts'").fetchone() is not None
+
+def signature(path):
+    """Returns (mtime_ns, size) of a file, or of the archive containing it."""
+    archive_path, _ = source_ops.split_member_path(path)
+    stat = os.stat(archive_path)
+    return stat.st_mtime_ns, stat.st_size
+
+def config_key(config):
+    """
+    Returns the OCR configuration (see ocr_ops.config_for) a file is indexed with as
+    a string, including the engine and the x-height target, which change the text too.
+    """
+    config = dict(config or {})
+    config.setdefault("backend", settings.settings.get("ocr_backend") or backend_ops.DEFAULT_BACKEND)
+    config.setdefault("x_height", settings.settings.get("target_x_height", 0))
+    return json.dumps(config, sort_keys=True)
+
+def lookup(path, config=None, conn=None):
+    """
+    Returns the indexed record of path (see export_ops) if the file has not changed
+    since it was indexed with the same OCR configuration, else None.
+    """
+    conn = conn or connection()
+    row = conn.execute("SELECT mtime_ns, size, text, words, error, config FROM files WHERE path = ?",
+                       (path,)).fetchone()
+    if row is None or row[5] != config_key(config):
+        return None
+    try:
+        if (row[0], row[1]) != signature(path):
+            return None
+    except OSError:
+        return None
+    record = {"path": path, "text": row[2] or ""}
+    if row[3]:
+        stored = json.loads(row[3])
+        record["size"] = stored["size"]
+        record["words"] = export_ops.decode_words(stored["words"])
+    if row[4]:
+        record["error"] = row[4]
+    return record
+
+def store(conn, path, file_signature, text, words=None, size=None, error=None, config=None):
+    words_json = None
+    if words is not None:
+        words_json = json.dumps({"size": list(size), "words": export_ops.encode_words(words)}, separators=(",", ":"))
+    directory = os.path.abspath(source_ops.container_directory(path))
+    conn.execute("BEGIN")
+    conn.execute("INSERT OR REPLACE INTO files (path, directory, mtime_ns, size, text, words, error, indexed, config) "
+                 "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                 (path, directory, file_signature[0], file_signature[1], text, words_json, error, time.time(),
+                  config_key(config)))
+    if has_fts(conn):
+        conn.execute("DELETE FROM texts WHERE path = ?", (path,))
+        conn.execute("INSERT INTO texts (path, text) VALUES (?, ?)", (path, text))
+    conn.execute("COMMIT")
+
+def search(query, directory=None, limit=SEARCH_LIMIT, conn=None):
+    """
+    Finds indexed files containing all words of query, optionally within one directory.
+
+    Returns:
+        list of (path, snippet)
+    """
+    conn = conn or connection()
+    terms = query.split()
+    if not terms:
+        return []
+    directory = os.path.abspath(directory) if directory else None
+    if has_fts(conn):
+        # Every term is quoted, so that the query syntax of FTS5 does not apply to user input
+        match = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        sql = ("SELECT texts.path, snippet(texts, 1, '[', ']', '...', 8) FROM texts "
+               "JOIN files ON files.path = texts.path WHERE texts MATCH ?")
+        params = [match]
+    else:
+        sql = "SELECT path, substr(text, 1, 80) FROM files WHERE " + " AND ".join(["text LIKE ?"] * len(terms))
+        params = [f"%{term}%" for term in terms]
+    if directory:
+        sql += " AND files.directory = ?" if "JOIN" in sql else " AND directory = ?"
+        params.append(directory)
+    sql += " LIMIT ?"
+    params.append(limit)
+    return [(path, " ".join((snippet or "").split())) for path, snippet in conn.execute(sql, params)]
+
+def system_busy(max_load):
+    """Returns True if the 1-minute load average per CPU exceeds max_load (Unix only)."""
+    if not hasattr(os, "getloadavg"):
+        return False
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1) > max_load
+    except OSError:
+        return False
+
+def on_battery():
+    """Returns True if the computer runs on battery, as far as it can be told."""
+    try:
+        import psutil
+        battery = psutil.sensors_battery()
+        return battery is not None and not battery.power_plugged
+    except (ImportError, AttributeError):
+        pass
+    # Linux without psutil: on battery when no mains supply is online
+    mains = [path for path in glob.glob("/sys/class/power_supply/*") if _read(os.path.join(path, "type")) == "Mains"]
+    if not mains:
+        return False
+    return not any(_read(os.path.join(path, "online")) == "1" for path in mains)
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def lower_thread_priority():
+    """
+    Lowers the CPU priority of the calling thread as far as the platform allows.
+    On Linux the tesseract processes started from the thread inherit it.
+    """
+    try:
+        if sys.platform.startswith("linux"):
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        elif sys.platform == "win32":
+            import ctypes
+            THREAD_MODE_BACKGROUND_BEGIN = 0x00010000
+            kernel32 = ctypes.windll.kernel32
+            kernel32.SetThreadPriority(kernel32.GetCurrentThread(), THREAD_MODE_BACKGROUND_BEGIN)
+    except (OSError, AttributeError) as e:
+        print(f"Cannot lower the indexer priority: {e}")
+
+def pending_paths(directory, conn):
+    """
+    Returns the images of directory that are not indexed yet, or changed or got
+    another OCR configuration since.
+    """
+    paths = []
+    for path, _, _ in source_ops.list_images([directory], recursive=False):
+        row = conn.execute("SELECT mtime_ns, size, config FROM files WHERE path = ?", (path,)).fetchone()
+        try:
+            if (row is None or (row[0], row[1]) != signature(path)
+                    or row[2] != config_key(ocr_ops.config_for(path))):
+                paths.append(path)
+        except OSError:
+            continue
+    return paths
+
+def ocr_file(path, config):
+    """
+    OCRs one file with its word boxes, as a background scheduler job. The worker
+    thread and the engine processes it starts run at the lowest CPU priority,
+    which suits every job of the background class.
+
+    Returns:
+        (words, image size)
+    """
+    if not getattr(_local, "lowered", False):
+        lower_thread_priority()
+        backend_ops.lower_engine_priority()
+        _local.lowered = True
+    image = source_ops.open_image(path)
+    return ocr_ops.image_to_words(image, config=config), image.size
+
+def index_file(conn, path):
+    """
+    OCRs one file with its word boxes and stores the result. The OCR is a
+    background scheduler job, so it is not started while interactive or prefetch
+    OCR is queued and counts against the limit of the background class.
+    """
+    file_signature = signature(path)
+    config = ocr_ops.config_for(path)
+    try:
+        words, size = scheduler_ops.call(ocr_file, path, config, priority=scheduler_ops.BACKGROUND)
+    except Exception as e:
+        store(conn, path, file_signature, "", error=str(e), config=config)
+        return
+    store(conn, path, file_signature, ocr_ops.words_to_text(words), words, size, config=config)
+
+def index_directory(directory, conn=None, allowed=None, progress=None):
+    """
+    Indexes the images of directory that are new or changed.
+
+    Args:
+        allowed: called before every file; blocks while indexing should pause
+            and returns False to stop
+        progress: called as progress(done, total)
+
+    Returns:
+        int: number of files indexed
+    """
+    conn = conn or connection()
+    paths = pending_paths(directory, conn)
+    done = 0
+    for path in paths:
+        if allowed and not allowed():
+            break
+        index_file(conn, path)
+        done += 1
+        if progress:
+            progress(done, len(paths))
+    return done
+
+class Indexer:
+    """
+    Background thread indexing the current directory while the user is idle.
+
+    Before every file it waits until there has been no user input for
+    "idle_seconds", the system load is below "max_load" per CPU, the computer
+    is not on battery (with "pause_on_battery") and no interactive or prefetch
+    OCR is pending. Files are OCR'd as background scheduler jobs (see index_file)
+    at the lowest CPU priority.
+    """
+
+    def __init__(self):
+        self.directory = None
+        self.generation = 0
+        self.last_activity = time.time()
+        self.wake = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.on_progress = None
+        self.state = "stopped"
+
+    def start(self, directory, on_progress=None):
+        """Indexes directory, replacing the directory being indexed."""
+        with self.lock:
+            self.directory = directory
+            self.generation += 1
+            self.on_progress = on_progress
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name="indexer", daemon=True)
+                self.thread.start()
+        self.wake.set()
+
+    def stop(self):
+        with self.lock:
+            self.directory = None
+            self.generation += 1
+        self.wake.set()
+
+    def note_activity(self):
+        """Called on user input; the indexer pauses before its next file."""
+        self.last_activity = time.time()
+
+    def sleep(self, seconds):
+        """
+        Waits until seconds pass or start() or stop() is called. Callers clear the
+        event before reading the state they wait on, so a wake-up set in between
+        ends the wait at once instead of being lost.
+        """
+        self.wake.wait(seconds)
+
+    def wait_until_allowed(self, generation):
+        index_settings = settings.settings.get("background_index", {})
+        while True:
+            self.wake.clear()
+            if generation != self.generation:
+                return False
+            idle = time.time() - self.last_activity
+            idle_seconds = index_settings.get("idle_seconds", 5)
+            if idle < idle_seconds:
+                self.state = "paused (user active)"
+                self.sleep(idle_seconds - idle)
+            elif system_busy(index_settings.get("max_load", 0.75)):
+                self.state = "paused (system busy)"
+                self.sleep(5)
+            elif index_settings.get("pause_on_battery", True) and on_battery():
+                self.state = "paused (on battery)"
+                self.sleep(30)
+            elif scheduler_ops.get_scheduler().has_higher_priority_work(scheduler_ops.BACKGROUND):
+                self.state = "paused (OCR running)"
+                scheduler_ops.get_scheduler().wait_for_turn(scheduler_ops.BACKGROUND)
+            else:
+                self.state = "indexing"
+                return True
+
+    def run(self):
+        lower_thread_priority()
+        conn = connect()
+        while True:
+            self.wake.clear()
+            with self.lock:
+                directory, generation, on_progress = self.directory, self.generation, self.on_progress
+            if not directory or not os.path.isdir(directory):
+                self.state = "stopped"
+                self.sleep(None)
+                continue
+            try:
+                index_directory(directory, conn, allowed=lambda: self.wait_until_allowed(generation),
+                                progress=on_progress)
+            except Exception as e:
+                print(f"Error indexing {directory}: {e}")
+            if generation == self.generation:
+                self.state = "up to date"
+                self.sleep(RESCAN_SECONDS)
+
+_indexer = Indexer()
+
+def get_indexer():
+    return _indexer
+
+def run_cli(directory):
+    """Command line indexing of a directory, pausing while the system is busy or on battery."""
+    index_settings = settings.settings.get("background_index", {})
+    lower_thread_priority()
+
+    def allowed():
+        while system_busy(index_settings.get("max_load", 0.75)) or (
+                index_settings.get("pause_on_battery", True) and on_battery()):
+            time.sleep(5)
+        return True
+
+    def progress(done, total):
+        if done == total or done % 50 == 0:
+            print(f"Indexed {done}/{total} files")
+
+    print(f"Indexing {directory} into {INDEX_FILE}")
+    index_directory(directory, allowed=allowed, progress=progress)
+
+def search_cli(query, directory=None):
+    """Command line search of the index."""
+    for path, snippet in search(query, directory):
+        print(f"{path}\t{snippet}")
@@ -0,0 +1,114 @@
+import tkinter as tk
+
+from PIL import Image
+
+import ctx_ui
+import image_ops
+import ocr_ops
+import overlay_ops
+import scheduler_ops
+import settings
+import ui_ops
+
+MIN_PREVIEW_SIZE = 8  # Selections smaller than this in original pixels are not previewed
+MIN_PREVIEW_HEIGHT = 32  # Crops are not reduced below this height, where Tesseract stops reading
+
+# Pending after() job of the debounced preview
+preview_job = None
+
+def live_settings():
+    return settings.settings.get("live_ocr", {})
+
+def schedule_preview():
+    """
+    Called while the selection rectangle is dragged: restarts the debounce timer
+    of the speculative OCR, so that it runs once the mouse rests briefly.
+    """
+    global preview_job
+    if not ctx_ui.live_ocr_var.get():
+        return
+    cancel_preview()
+    preview_job = ctx_ui.window.after(live_settings().get("delay_ms", 120), run_preview)
+
+def cancel_preview():
+    """Drops a pending preview, e.g. because the selection was released."""
+    global preview_job
+    if preview_job is not None:
+        ctx_ui.window.after_cancel(preview_job)
+        preview_job = None
+
+def words_in_region(word_list, region):
+    """Returns the words whose centre lies in region, in reading order."""
+    x1, y1, x2, y2 = region
+    return [word for word in word_list
+            if x1 <= word["left"] + word["width"] / 2 <= x2 and y1 <= word["top"] + word["height"] / 2 <= y2]
+
+def cached_words():
+    """Returns the word boxes of the displayed image if they are already known, else None."""
+    key = image_ops.image_key()
+    if overlay_ops.words_path == key:
+        return overlay_ops.words
+    return overlay_ops.word_cache.get(key) if key else None
+
+def ocr_preview(image, region, config=None, scale=None):
+    """
+    Fast, approximate OCR of a region: the crop is reduced by scale
+    (default: the "live_ocr" setting) and not rescaled to the target x-height.
+    """
+    if scale is None:
+        scale = live_settings().get("scale", 0.5)
+    crop = image.crop(tuple(region))
+    width, height = crop.size
+    scale = max(scale, min(1.0, MIN_PREVIEW_HEIGHT / max(1, height)))
+    if scale < 1.0:
+        crop = crop.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.BILINEAR)
+    return ocr_ops.ocr_image(crop, config=dict(config or {}, x_height=0))
+
+def run_preview():
+    """
+    Shows the text of the region currently being dragged: straight from the cached
+    word boxes when the image has them, otherwise from a reduced resolution OCR job.
+    A newer preview or the precise OCR on release replaces a queued job and
+    discards the result of a running one.
+    """
+    global preview_job
+    preview_job = None
+    box = image_ops.selection_box()
+    if box is None or image_ops.frame_source is not None:
+        return
+    region = box[0]
+    if region[2] - region[0] < MIN_PREVIEW_SIZE or region[3] - region[1] < MIN_PREVIEW_SIZE:
+        return
+
+    with image_ops.ocr_generation_lock:
+        image_ops.ocr_generation += 1
+        my_generation = image_ops.ocr_generation
+
+    word_list = cached_words()
+    if word_list is not None:
+        show_preview(my_generation, ocr_ops.words_to_text(words_in_region(word_list, region)), "word boxes")
+        return
+
+    image = image_ops.original_image
+    config = ocr_ops.config_for(image_ops.loaded_image_path)
+
+    def preview_task():
+        if my_generation != image_ops.ocr_generation:
+            return  # A newer preview or the precise OCR is already requested
+        try:
+            text = ocr_preview(image, region, config)
+        except Exception as e:
+            ctx_ui.window.after(0, show_preview, my_generation, f"Error during OCR processing: {e}", None)
+            return
+        ctx_ui.window.after(0, show_preview, my_generation, text, "reduced resolution")
+
+    # Shares the key of the precise OCR, which replaces a still queued preview on release
+    scheduler_ops.submit(preview_task, priority=scheduler_ops.INTERACTIVE, key="selection")
+
+def show_preview(my_generation, text, source):
+    if my_generation != image_ops.ocr_generation:
+        return  # Stale
+    ctx_ui.text_output.delete("1.0", tk.END)
+    ctx_ui.text_output.insert(tk.END, text)
+    if source:
+        ui_ops.set_status(f"Live preview from {source}; release the mouse for the precise OCR.")
@@ -0,0 +1,181 @@
+import collections
+import sys
+import threading
+import tracemalloc
+
+import settings
+
+# Bytes held per category, each category keyed by owner (e.g. "current", a cache name or a job id)
+_usage = collections.defaultdict(dict)
+_usage_lock = threading.RLock()
+
+# Caches that can give memory back when the budget is exceeded
+_caches = []
+
+def image_bytes(image):
+    """Estimates the decoded size of a PIL image in bytes."""
+    if image is None:
+        return 0
+    if not hasattr(image, "getbands"):
+        return 0  # Memory-mapped images are not resident
+    width, height = image.size
+    bytes_per_band = 4 if image.mode in ("I", "F", "I;16") else 1
+    return width * height * len(image.getbands()) * bytes_per_band
+
+def photo_bytes(width, height):
+    """Tk photo images are stored with four bytes per pixel."""
+    return width * height * 4
+
+def track(category, key, nbytes):
+    """Records that key holds nbytes in category and enforces the budget."""
+    with _usage_lock:
+        _usage[category][key] = nbytes
+    enforce_budget()
+
+def release(category, key):
+    """Forgets the memory held by key in category."""
+    with _usage_lock:
+        _usage[category].pop(key, None)
+
+def usage():
+    """Returns {category: bytes} for all categories."""
+    with _usage_lock:
+        return {category: sum(owners.values()) for category, owners in _usage.items() if owners}
+
+def total():
+    """Returns the total number of tracked bytes."""
+    return sum(usage().values())
+
+def budget():
+    """Returns the configured budget in bytes, or 0 if unlimited."""
+    return int(settings.settings.get("memory_budget_mb", 0) * 1024 * 1024)
+
+def enforce_budget():
+    """
+    Evicts cache entries, least recently used first, until the total is within budget.
+
+    Only caches give memory back. The current image, its Tk photo (bounded by
+    the viewport), OCR crops and shared segments are in use while they are
+    tracked; they count towards the total, so the caches make room for them,
+    but they are never evicted and can exceed the budget on their own.
+    Images above "tiled_image_megapixels" are memory-mapped and not resident.
+    """
+    limit = budget()
+    if not limit:
+        return
+    excess = total() - limit
+    if excess <= 0:
+        return
+    # Largest caches give back memory first
+    for cache in sorted(_caches, key=lambda c: c.bytes, reverse=True):
+        excess -= cache.evict_bytes(excess)
+        if excess <= 0:
+            break
+
+def ocr_thread_count():
+    """Returns the number of live OCR worker threads."""
+    return sum(1 for thread in threading.enumerate() if thread.name.startswith("ocr-"))
+
+def format_usage():
+    """Formats the memory usage for the status bar, e.g. "Mem 312.0/1024 MB"."""
+    used = total() / (1024 * 1024)
+    limit = budget() / (1024 * 1024)
+    if limit:
+        return f"Mem {used:.1f}/{limit:.0f} MB"
+    return f"Mem {used:.1f} MB"
+
+def describe():
+    """Returns a multi-line breakdown of the tracked memory per category and cache."""
+    lines = [f"{category}: {nbytes / (1024 * 1024):.1f} MB" for category, nbytes in sorted(usage().items())]
+    for cache in _caches:
+        lines.append(f"cache {cache.name}: {len(cache)} entries, {cache.bytes / (1024 * 1024):.1f} MB")
+    lines.append(f"OCR threads: {ocr_thread_count()}")
+    return "\n".join(lines)
+
+def start_tracing():
+    """Starts tracemalloc if it is enabled in the settings."""
+    if settings.settings.get("tracemalloc", False) and not tracemalloc.is_tracing():
+        tracemalloc.start(10)
+
+def snapshot_report(limit=10):
+    """Returns the top allocation sites from a tracemalloc snapshot, if tracing is active."""
+    if not tracemalloc.is_tracing():
+        return "tracemalloc is not active (enable \"tracemalloc\" in the settings)"
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    lines = [f"Traced: {current / (1024 * 1024):.1f} MB (peak {peak / (1024 * 1024):.1f} MB)"]
+    lines.extend(str(stat) for stat in snapshot.statistics("lineno")[:limit])
+    return "\n".join(lines)
+
+class BoundedCache:
+    """
+    Thread-safe LRU cache whose size is reported to the memory accounting.
+
+    Entries are evicted when max_entries is exceeded, and on demand when the
+    global memory budget is exceeded. size_of(value) estimates an entry in bytes.
+    """
+
+    def __init__(self, name, max_entries=None, size_of=sys.getsizeof):
+        self.name = name
+        self.max_entries = max_entries
+        self.size_of = size_of
+        self.entries = collections.OrderedDict()  # key -> (value, nbytes)
+        self.bytes = 0
+        self.lock = threading.Lock()
+        _caches.append(self)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value):
+        nbytes = self.size_of(value)
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            self.entries[key] = (value, nbytes)
+            self.bytes += nbytes
+            while self.max_entries and len(self.entries) > self.max_entries:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.bytes -= evicted
+        track("cache", self.name, self.bytes)
+
+    def pop(self, key, default=None):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return default
+            self.bytes -= entry[1]
+        track("cache", self.name, self.bytes)
+        return entry[0]
+
+    def evict_bytes(self, nbytes):
+        """Evicts least recently used entries until nbytes are freed. Returns the bytes freed."""
+        freed = 0
+        with self.lock:
+            while self.entries and freed < nbytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                freed += evicted
+            self.bytes -= freed
+            remaining = self.bytes
+        with _usage_lock:
+            _usage["cache"][self.name] = remaining
+        return freed
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+        release("cache", self.name)
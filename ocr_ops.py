@@ -0,0 +1,303 @@
+import os
+import threading
+
+import backend_ops
+import memory_ops
+import scheduler_ops
+import settings
+import source_ops
+
+# Crops are rescaled so that their dominant x-height is close to the "target_x_height" setting
+INK_THRESHOLD = 64  # Gray level distance from the background that counts as ink
+MIN_SCALE, MAX_SCALE = 0.25, 4.0
+RESCALE_TOLERANCE = 0.2  # Scale factors within 20% of 1 are not worth a resize
+
+# OCR configuration keys, as found by tune_ops and stored per directory in the "ocr_configs" setting:
+#   psm, oem: Tesseract page segmentation and engine modes (None for Tesseract's default)
+#   x_height: target x-height for rescaling, overriding "target_x_height" (0 disables rescaling)
+#   preprocess: "none", "gray" or "binarize"
+#   whitelist: characters Tesseract may recognise (optional, set by hand; no whitespace, quotes or backslashes)
+#   backend: OCR engine (see backend_ops), overriding the "ocr_backend" setting
+PREPROCESS_MODES = ("none", "gray", "binarize")
+
+# Progressive OCR: tall crops are OCR'd in horizontal bands cut at blank rows, smallest band first
+PROGRESSIVE_MIN_HEIGHT = 400  # Lower crops are OCR'd in one piece
+FIRST_BAND_HEIGHT = 120  # Target height of the first band, so that the first text arrives quickly
+MAX_BANDS = 8
+
+# Tiled images OCR'd without a region are reduced to this many pixels
+MAX_WHOLE_IMAGE_PIXELS = 32 * 1000000
+
+def backend(config=None):
+    """Returns the OCR engine of a configuration, by default the one of the "ocr_backend" setting."""
+    return backend_ops.get_backend((config or {}).get("backend"))
+
+def config_for(path):
+    """Returns the tuned OCR configuration of the directory containing path, or None."""
+    if not path:
+        return None
+    directory = os.path.abspath(source_ops.container_directory(path))
+    return settings.settings.get("ocr_configs", {}).get(directory)
+
+def preprocess(image, config):
+    """Applies the preprocessing of a configuration to an image."""
+    mode = (config or {}).get("preprocess", "none")
+    if mode == "none":
+        return image
+    from PIL import ImageOps
+    gray = ImageOps.autocontrast(image.convert("L"))
+    if mode == "binarize":
+        return gray.point(lambda value: 255 if value > 127 else 0)
+    return gray
+
+def whole_image(image):
+    """
+    Returns a whole image as a PIL image, with its scale. Tiled images
+    (tile_ops.TiledImage) are read from their pyramid, reduced to at most
+    MAX_WHOLE_IMAGE_PIXELS, so that they are never decoded in full.
+    """
+    from PIL import Image
+    if isinstance(image, Image.Image):
+        return image, 1.0
+    width, height = image.size
+    scale = min(1.0, (MAX_WHOLE_IMAGE_PIXELS / (width * height)) ** 0.5)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return image.resize(size, Image.LANCZOS), scale
+
+def covered_region(image, region):
+    """
+    Returns region, or None if it covers the whole image. The UI selects the whole
+    image by default, and only None lets tiled images be read reduced.
+    """
+    if region is None:
+        return None
+    width, height = image.size
+    x1, y1, x2, y2 = region
+    if x1 <= 0 and y1 <= 0 and x2 >= width and y2 >= height:
+        return None
+    return region
+
+def prepare(image, region=None, config=None):
+    """
+    Crops, rescales and preprocesses an image for Tesseract.
+    Always returns a PIL image, also for tiled images.
+
+    Returns:
+        (image, scale) as for rescale_for_ocr
+    """
+    scale = 1.0
+    region = covered_region(image, region)
+    if region is not None:
+        image = image.crop(tuple(region))
+    else:
+        image, scale = whole_image(image)
+    image, rescale = rescale_for_ocr(image, (config or {}).get("x_height"))
+    return preprocess(image, config), scale * rescale
+
+def image_to_string(image, config=None):
+    """Runs OCR on a PIL image and returns the extracted text."""
+    return backend(config).image_to_string(image, config)
+
+def estimate_x_height(image):
+    """
+    Estimates the dominant x-height of the text in an image, in pixels.
+
+    Rows containing ink form text lines; within a line, the rows whose ink
+    count reaches half of the line's peak make up the x-height band.
+    The image is analysed in up to four vertical strips so that side-by-side
+    columns do not merge their lines. Returns None if no lines are found
+    or numpy is not installed.
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        return None
+    gray = np.asarray(image.convert("L"), dtype=np.int16)
+    height, width = gray.shape
+    if height < 8 or width < 8:
+        return None
+    ink = np.abs(gray - int(np.median(gray))) > INK_THRESHOLD
+    heights = []
+    for strip in np.array_split(ink, max(1, min(4, width // 300)), axis=1):
+        profile = strip.sum(axis=1)
+        edges = np.diff(np.concatenate(([0], (profile > 0).astype(np.int8), [0])))
+        for start, end in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+            if end - start < 3:
+                continue  # Rules and specks
+            line = profile[start:end]
+            heights.append(int((line * 2 >= line.max()).sum()))
+    if not heights:
+        return None
+    return float(np.median(heights))
+
+def rescale_for_ocr(image, target=None):
+    """
+    Rescales an image so that its text has the target x-height
+    (default: the "target_x_height" setting).
+
+    Returns:
+        (image, scale); coordinates in the returned image divided by scale give
+        coordinates in the original image
+    """
+    from PIL import Image
+    if target is None:
+        target = settings.settings.get("target_x_height", 0)
+    if not target or not isinstance(image, Image.Image):
+        return image, 1.0
+    x_height = estimate_x_height(image)
+    if not x_height:
+        return image, 1.0
+    scale = min(MAX_SCALE, max(MIN_SCALE, target / x_height))
+    if abs(scale - 1.0) <= RESCALE_TOLERANCE:
+        return image, 1.0
+    width, height = image.size
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return image.resize(size, Image.LANCZOS, reducing_gap=2.0), scale
+
+def ocr_image(image, region=None, config=None):
+    """
+    Runs the OCR pipeline on an image, optionally restricted to a region.
+    The crop is rescaled to the target x-height first.
+
+    Args:
+        image: PIL image
+        region: (x1, y1, x2, y2) in image coordinates, or None for the whole image
+        config: OCR configuration (see config_for), or None for the defaults
+    """
+    image, _ = prepare(image, region, config)
+    # The crop is accounted while Tesseract works on it
+    key = threading.get_ident()
+    memory_ops.track("ocr", key, memory_ops.image_bytes(image))
+    try:
+        return image_to_string(image, config)
+    finally:
+        memory_ops.release("ocr", key)
+
+def band_boundaries(image):
+    """
+    Splits an image into horizontal bands for progressive OCR.
+
+    Bands are cut at rows without ink so that no text line is split. The first
+    band is small and each following band is twice as high, up to MAX_BANDS.
+    Returns a list of (top, bottom); a single band if the image is low,
+    has no blank rows or numpy is not installed.
+    """
+    width, height = image.size
+    if height < PROGRESSIVE_MIN_HEIGHT:
+        return [(0, height)]
+    try:
+        import numpy as np
+    except ImportError:
+        return [(0, height)]
+    gray = np.asarray(image.convert("L"), dtype=np.int16)
+    blank = np.flatnonzero(~(np.abs(gray - int(np.median(gray))) > INK_THRESHOLD).any(axis=1))
+    bands = []
+    top = 0
+    band_height = max(FIRST_BAND_HEIGHT, height // (2 ** MAX_BANDS))
+    while top < height and len(bands) < MAX_BANDS - 1:
+        # The first blank row at or below the target cuts the band
+        candidates = blank[blank >= top + band_height]
+        if not len(candidates):
+            break
+        bottom = int(candidates[0]) + 1
+        if height - bottom < band_height:
+            break  # A sliver would cost a Tesseract start for little text
+        bands.append((top, bottom))
+        top = bottom
+        band_height *= 2
+    bands.append((top, height))
+    return bands
+
+def iter_ocr(image, region=None, config=None, cancelled=None, priority=scheduler_ops.INTERACTIVE):
+    """
+    Runs OCR band by band and yields the text of each band as soon as it and
+    all bands above it are done. Bands are OCR'd in parallel as scheduler jobs
+    of priority, within the limit of its class.
+
+    Args:
+        image: PIL image
+        region: (x1, y1, x2, y2) in image coordinates, or None for the whole image
+        config: OCR configuration (see config_for), or None for the defaults
+        cancelled: function returning True to stop early
+        priority: scheduler class of the calling job
+
+    Yields:
+        (text, fraction of the rows done)
+    """
+    region = covered_region(image, region)
+    if region is not None:
+        image = image.crop(tuple(region))
+    else:
+        image, _ = whole_image(image)
+    bands = band_boundaries(image)
+    if len(bands) == 1:
+        yield ocr_image(image, config=config), 1.0
+        return
+    width, height = image.size
+
+    def ocr_band(band):
+        top, bottom = band
+        return ocr_image(image.crop((0, top, width, bottom)), None, config)
+
+    texts = scheduler_ops.map_jobs(ocr_band, bands, priority=priority, cancelled=cancelled)
+    for (top, bottom), text in zip(bands, texts):
+        yield text.rstrip() + "\n", bottom / height
+
+def image_to_words(image, region=None, config=None):
+    """
+    Runs OCR and returns the recognised words with their boxes.
+
+    Args:
+        image: PIL image
+        region: (x1, y1, x2, y2) to restrict OCR to, or None for the whole image
+        config: OCR configuration (see config_for), or None for the defaults
+
+    Returns:
+        list of dicts with "text", "conf", "left", "top", "width", "height" (in image
+        coordinates, also when the crop was rescaled) and the "block", "par", "line",
+        "word" numbers Tesseract assigned
+    """
+    offset_x, offset_y = 0, 0
+    region = covered_region(image, region)
+    if region is not None:
+        offset_x, offset_y = int(region[0]), int(region[1])
+    image, scale = prepare(image, region, config)
+    key = threading.get_ident()
+    memory_ops.track("ocr", key, memory_ops.image_bytes(image))
+    try:
+        data = backend(config).image_to_data(image, config)
+    finally:
+        memory_ops.release("ocr", key)
+    words = []
+    for index, text in enumerate(data["text"]):
+        if not text.strip():
+            continue
+        words.append({
+            "text": text,
+            "conf": float(data["conf"][index]),
+            "left": round(data["left"][index] / scale) + offset_x,
+            "top": round(data["top"][index] / scale) + offset_y,
+            "width": round(data["width"][index] / scale),
+            "height": round(data["height"][index] / scale),
+            "block": data["block_num"][index],
+            "par": data["par_num"][index],
+            "line": data["line_num"][index],
+            "word": data["word_num"][index],
+        })
+    return words
+
+def words_to_text(words):
+    """Reassembles words into text: one line per Tesseract line, blank lines between blocks."""
+    lines = []
+    previous_line = previous_block = None
+    for word in sorted(words, key=lambda w: (w["block"], w["par"], w["line"], w["word"])):
+        line_key = (word["block"], word["par"], word["line"])
+        if line_key != previous_line:
+            if previous_block is not None and word["block"] != previous_block:
+                lines.append("")
+            lines.append(word["text"])
+        else:
+            lines[-1] += " " + word["text"]
+        previous_line = line_key
+        previous_block = word["block"]
+    return "\n".join(lines)
@@ -0,0 +1,248 @@
+import tkinter as tk
+
+import ctx_ui
+import image_ops
+import memory_ops
+import ocr_ops
+import region_ops
+import scheduler_ops
+import text_ops
+import ui_ops
+
+GRID_CELL_SIZE = 64  # Grid cell size in original image pixels
+OVERLAY_TAG = "wordbox"
+BLOCK_TAG = "textblock"
+REGION_TAG = "namedregion"
+MAX_DRAWN_WORDS = 5000  # Above this the overlay is skipped until the user zooms in
+
+# Word boxes per image path (and frame), shared with other features that reuse OCR geometry
+word_cache = memory_ops.BoundedCache("word boxes", max_entries=64,
+                                     size_of=lambda words: 300 * len(words))
+
+# Words of the displayed image, their spatial index and the selected word indices
+words = []
+grid = None
+selected = []
+words_path = None
+
+# Text blocks found by text block detection for the displayed image, in image coordinates
+text_blocks = []
+text_blocks_path = None
+
+class SpatialGrid:
+    """
+    Uniform grid over image coordinates mapping cells to the boxes overlapping them.
+    Point and rectangle queries only look at the cells they touch.
+    """
+
+    def __init__(self, cell_size=GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.boxes = []
+
+    def insert(self, box):
+        """Adds a box (x1, y1, x2, y2) and returns its index."""
+        index = len(self.boxes)
+        self.boxes.append(box)
+        for cell in self._cells(box):
+            self.cells.setdefault(cell, []).append(index)
+        return index
+
+    def _cells(self, box):
+        x1, y1, x2, y2 = box
+        size = self.cell_size
+        for cx in range(int(x1 // size), int(x2 // size) + 1):
+            for cy in range(int(y1 // size), int(y2 // size) + 1):
+                yield cx, cy
+
+    def query(self, box):
+        """Returns the indices of the boxes intersecting box."""
+        x1, y1, x2, y2 = box
+        found = set()
+        for cell in self._cells(box):
+            for index in self.cells.get(cell, ()):
+                bx1, by1, bx2, by2 = self.boxes[index]
+                if bx1 <= x2 and bx2 >= x1 and by1 <= y2 and by2 >= y1:
+                    found.add(index)
+        return found
+
+    def hit(self, x, y):
+        """Returns the index of the smallest box containing the point, or None."""
+        candidates = self.query((x, y, x, y))
+        if not candidates:
+            return None
+        return min(candidates, key=lambda i: (self.boxes[i][2] - self.boxes[i][0]) * (self.boxes[i][3] - self.boxes[i][1]))
+
+def build_grid(word_list):
+    """Indexes the word boxes of an image."""
+    spatial_grid = SpatialGrid()
+    for word in word_list:
+        spatial_grid.insert((word["left"], word["top"], word["left"] + word["width"], word["top"] + word["height"]))
+    return spatial_grid
+
+def set_words(path, word_list):
+    """Makes word_list the word boxes of the displayed image and redraws the overlay."""
+    global words, grid, selected, words_path
+    if path != image_ops.image_key():
+        return  # Another image was loaded meanwhile
+    words = word_list
+    grid = build_grid(word_list)
+    selected = []
+    words_path = path
+    draw_overlay()
+
+def clear_words():
+    global words, grid, selected, words_path
+    words, grid, selected, words_path = [], None, [], None
+    if ctx_ui.image_canvas is not None:
+        ctx_ui.image_canvas.delete(OVERLAY_TAG)
+
+def request_words():
+    """
+    Makes sure the word boxes of the loaded image are available,
+    running word-level OCR as a prefetch job if they are not cached.
+    """
+    path = image_ops.image_key()
+    image = image_ops.original_image
+    config = ocr_ops.config_for(image_ops.loaded_image_path)
+    if not path or image is None:
+        clear_words()
+        return
+    if path == words_path:
+        draw_overlay()
+        return
+    clear_words()
+    cached = word_cache.get(path)
+    if cached is not None:
+        set_words(path, cached)
+        return
+
+    def words_task():
+        try:
+            word_list = ocr_ops.image_to_words(image, config=config)
+        except Exception as e:
+            ctx_ui.window.after(0, ui_ops.set_status, f"Error reading word boxes: {e}")
+            return
+        word_cache.put(path, word_list)
+        ctx_ui.window.after(0, set_words, path, word_list)
+
+    scheduler_ops.submit(words_task, priority=scheduler_ops.PREFETCH, key="words")
+
+def on_image_loaded():
+    """Called after an image was loaded and displayed."""
+    if ctx_ui.show_word_boxes_var.get():
+        request_words()
+    else:
+        clear_words()
+
+def on_toggle():
+    """Called when the "Show word boxes" option changes."""
+    if ctx_ui.show_word_boxes_var.get():
+        request_words()
+    else:
+        ctx_ui.image_canvas.delete(OVERLAY_TAG)
+
+def set_text_blocks(path, blocks):
+    """Makes blocks the detected text blocks of the displayed image and redraws them."""
+    global text_blocks, text_blocks_path
+    if path != image_ops.image_key():
+        return
+    text_blocks = blocks
+    text_blocks_path = path
+    draw_text_blocks()
+
+def draw_text_blocks():
+    """Draws the detected text blocks if "Show text blocks" is checked."""
+    canvas = ctx_ui.image_canvas
+    canvas.delete(BLOCK_TAG)
+    if not ctx_ui.show_text_blocks_var.get() or image_ops.displayed_size is None:
+        return
+    if text_blocks_path != image_ops.image_key():
+        return
+    for x1, y1, x2, y2 in text_blocks:
+        cx1, cy1 = image_ops.image_to_canvas(x1, y1)
+        cx2, cy2 = image_ops.image_to_canvas(x2, y2)
+        canvas.create_rectangle(cx1, cy1, cx2, cy2, outline="green", dash=(4, 2), tags=BLOCK_TAG)
+
+def draw_named_regions():
+    """Draws the named regions with their names if "OCR named regions" is checked."""
+    canvas = ctx_ui.image_canvas
+    canvas.delete(REGION_TAG)
+    if not ctx_ui.named_regions_var.get() or image_ops.displayed_size is None:
+        return
+    for region in region_ops.named_regions():
+        x1, y1, x2, y2 = region["box"]
+        cx1, cy1 = image_ops.image_to_canvas(x1, y1)
+        cx2, cy2 = image_ops.image_to_canvas(x2, y2)
+        canvas.create_rectangle(cx1, cy1, cx2, cy2, outline="purple", width=2, tags=REGION_TAG)
+        canvas.create_text(cx1 + 2, cy1 + 2, text=region["name"], anchor="nw", fill="purple", tags=REGION_TAG)
+
+def draw_overlay():
+    """Draws the optional named regions, text blocks and word boxes over the displayed image."""
+    draw_named_regions()
+    draw_text_blocks()
+    draw_word_boxes()
+
+def draw_word_boxes():
+    """
+    Draws the boxes of the words visible on the canvas.
+    Only words in the visible part of the image are looked up and drawn.
+    """
+    canvas = ctx_ui.image_canvas
+    canvas.delete(OVERLAY_TAG)
+    if not ctx_ui.show_word_boxes_var.get() or grid is None or image_ops.displayed_size is None:
+        return
+    if words_path != image_ops.image_key():
+        return
+    x1, y1 = image_ops.canvas_to_image(0, 0)
+    x2, y2 = image_ops.canvas_to_image(canvas.winfo_width(), canvas.winfo_height())
+    visible = grid.query((x1, y1, x2, y2))
+    if len(visible) > MAX_DRAWN_WORDS:
+        return
+    selected_set = set(selected)
+    for index in visible:
+        bx1, by1, bx2, by2 = grid.boxes[index]
+        cx1, cy1 = image_ops.image_to_canvas(bx1, by1)
+        cx2, cy2 = image_ops.image_to_canvas(bx2, by2)
+        if index in selected_set:
+            canvas.create_rectangle(cx1, cy1, cx2, cy2, outline="orange", width=2,
+                                    fill="orange", stipple="gray25", tags=OVERLAY_TAG)
+        else:
+            canvas.create_rectangle(cx1, cy1, cx2, cy2, outline="blue", width=1, tags=OVERLAY_TAG)
+
+def on_word_click(event):
+    """Selects the word under the cursor; with Shift held, adds or removes it from the selection."""
+    global selected
+    if grid is None:
+        if not ctx_ui.show_word_boxes_var.get():
+            ctx_ui.show_word_boxes_var.set(True)
+        request_words()
+        ui_ops.set_status("Reading word boxes...")
+        return
+    x, y = image_ops.canvas_to_image(event.x, event.y)
+    index = grid.hit(x, y)
+    shift = event.state & 0x0001
+    if index is None:
+        if not shift:
+            selected = []
+    elif shift:
+        if index in selected:
+            selected.remove(index)
+        else:
+            selected.append(index)
+    else:
+        selected = [index]
+    draw_overlay()
+    show_selected_text()
+
+def show_selected_text():
+    """Puts the text of the selected words into the text pane."""
+    text = ocr_ops.words_to_text([words[index] for index in selected])
+    ctx_ui.text_output.delete("1.0", tk.END)
+    ctx_ui.text_output.insert(tk.END, text)
+    if text and ctx_ui.copy_on_region_select_var.get():
+        text_to_copy = text_ops.reformat_text(text) if ctx_ui.reformat_lines_var.get() else text
+        text_ops.copy_text(text_to_copy)
+        ui_ops.set_status(f"{len(selected)} words selected and copied to clipboard.")
+    else:
+        ui_ops.set_status(f"{len(selected)} words selected.")
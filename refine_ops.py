@@ -0,0 +1,88 @@
+import ocr_ops
+import scheduler_ops
+import settings
+
+LINE_PADDING = 4  # Pixels added around a weak line so that descenders and accents are read whole
+
+def refine_config(config=None):
+    """
+    Returns the slow configuration of the second pass: the configuration of the
+    first pass with the "two_pass" setting applied over it.
+    """
+    two_pass = settings.settings.get("two_pass", {})
+    refined = dict(config or {})
+    for key in ("psm", "oem", "x_height", "preprocess"):
+        if key in two_pass:
+            refined[key] = two_pass[key]
+    return refined
+
+def line_key(word):
+    return (word["block"], word["par"], word["line"])
+
+def weak_lines(words, min_confidence):
+    """
+    Groups words into Tesseract lines and returns those containing a word below
+    min_confidence, as a dict of line key to words.
+    """
+    lines = {}
+    for word in words:
+        lines.setdefault(line_key(word), []).append(word)
+    return {key: line for key, line in lines.items()
+            if any(0 <= word["conf"] < min_confidence for word in line)}
+
+def confidence(words):
+    """Mean confidence of words weighted by their length; 0 without words."""
+    characters = sum(len(word["text"]) for word in words if word["conf"] >= 0)
+    if not characters:
+        return 0.0
+    return sum(word["conf"] * len(word["text"]) for word in words if word["conf"] >= 0) / characters
+
+def line_box(line, size, padding=LINE_PADDING):
+    """Returns the padded bounding box of the words of a line, clipped to an image of size."""
+    width, height = size
+    return (max(0, min(word["left"] for word in line) - padding),
+            max(0, min(word["top"] for word in line) - padding),
+            min(width, max(word["left"] + word["width"] for word in line) + padding),
+            min(height, max(word["top"] + word["height"] for word in line) + padding))
+
+def reread_line(image, line, config):
+    """
+    OCRs the box of one line again with config.
+
+    Returns:
+        the new words, numbered as the old line, or the old words if the new ones are not more confident
+    """
+    words = ocr_ops.image_to_words(image, line_box(line, image.size), config)
+    if not words or confidence(words) <= confidence(line):
+        return line
+    block, par, number = line_key(line[0])
+    return [dict(word, block=block, par=par, line=number, word=index)
+            for index, word in enumerate(sorted(words, key=lambda w: w["left"]), 1)]
+
+def two_pass_words(image, region=None, config=None, min_confidence=None, priority=scheduler_ops.INTERACTIVE):
+    """
+    Two-pass OCR: a fast pass at native scale, then only the lines with words
+    below min_confidence (default: the "two_pass" setting) are cropped, upscaled and
+    read again with the slower configuration of refine_config, as scheduler jobs
+    of priority. A re-read line replaces the first one only if its confidence is higher.
+
+    Returns:
+        (words, number of lines re-read, number of lines)
+    """
+    if min_confidence is None:
+        min_confidence = settings.settings.get("two_pass", {}).get("min_confidence", 70)
+    fast_config = dict(config or {}, x_height=0)
+    words = ocr_ops.image_to_words(image, ocr_ops.covered_region(image, region), fast_config)
+    weak = weak_lines(words, min_confidence)
+    line_count = len({line_key(word) for word in words})
+    if not weak:
+        return words, 0, line_count
+
+    slow_config = refine_config(config)
+    rereads = scheduler_ops.map_jobs(lambda line: reread_line(image, line, slow_config), weak.values(), priority=priority)
+    refined = dict(zip(weak, rereads))
+    result = [word for word in words if line_key(word) not in weak]
+    for line in refined.values():
+        result.extend(line)
+    result.sort(key=lambda w: (w["block"], w["par"], w["line"], w["word"]))
+    return result, len(weak), line_count
@@ -0,0 +1,96 @@
+from PIL import Image
+
+import ocr_ops
+import scheduler_ops
+import settings
+import shm_ops
+import source_ops
+
+def named_regions():
+    """Returns the named regions of the settings as a list of {"name", "box"} dicts, in OCR order."""
+    return settings.settings.setdefault("named_regions", [])
+
+def add_region(name, box):
+    """Adds a named region, replacing an existing region of the same name."""
+    regions = named_regions()
+    region = {"name": name, "box": [int(v) for v in box]}
+    for index, existing in enumerate(regions):
+        if existing["name"] == name:
+            regions[index] = region
+            return
+    regions.append(region)
+
+def remove_region(name):
+    settings.settings["named_regions"] = [region for region in named_regions() if region["name"] != name]
+
+def clear_regions():
+    settings.settings["named_regions"] = []
+
+def parse_region(value):
+    """Parses a NAME=X1,Y1,X2,Y2 command line value into a named region."""
+    name, separator, coords = value.rpartition("=")
+    if not separator or not name:
+        raise ValueError(f"expected NAME=X1,Y1,X2,Y2, got {value}")
+    box = [int(v) for v in coords.split(",")]
+    if len(box) != 4:
+        raise ValueError(f"expected four coordinates in {value}")
+    return {"name": name, "box": box}
+
+def clip(box, size):
+    """Clips box to an image of size. Returns None if nothing of it is left."""
+    width, height = size
+    x1, y1, x2, y2 = max(0, box[0]), max(0, box[1]), min(width, box[2]), min(height, box[3])
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return (x1, y1, x2, y2)
+
+def bounding_box(regions):
+    """Returns the smallest box covering all regions."""
+    boxes = [region["box"] for region in regions]
+    return (min(box[0] for box in boxes), min(box[1] for box in boxes),
+            max(box[2] for box in boxes), max(box[3] for box in boxes))
+
+def ocr_named_regions(image, regions, config=None, priority=scheduler_ops.INTERACTIVE):
+    """
+    OCRs all named regions of one image concurrently.
+    Regular images are shared once with the OCR worker processes; tiled images,
+    which cannot be shared, are read by scheduler jobs of priority.
+
+    Returns:
+        list of (name, text) in the order of regions; regions outside the image have empty text
+    """
+    boxes = [clip(region["box"], image.size) for region in regions]
+    inside = [box for box in boxes if box is not None]
+    if len(inside) > 1 and isinstance(image, Image.Image):
+        texts = iter(shm_ops.ocr_regions(image, inside, config))
+    elif len(inside) > 1:
+        texts = scheduler_ops.map_jobs(lambda box: ocr_ops.ocr_image(image, box, config), inside, priority=priority)
+    else:
+        texts = iter([ocr_ops.ocr_image(image, box, config) for box in inside])
+    return [(region["name"], next(texts).strip() if box is not None else "")
+            for region, box in zip(regions, boxes)]
+
+def ocr_file_regions(path, regions, config=None):
+    """
+    Decodes only the part of a file covering all regions, once, and OCRs each region of it.
+    Used by sweeps, which already work on several files in parallel.
+
+    Returns:
+        list of (name, text) in the order of regions; regions outside the image have empty text
+    """
+    # Only the header is read here, the same handle then decodes the region
+    image = source_ops.open_image(path)
+    boxes = [clip(region["box"], image.size) for region in regions]
+    inside = [{"box": box} for box in boxes if box is not None]
+    if not inside:
+        image.close()
+        return [(region["name"], "") for region in regions]
+    x1, y1, x2, y2 = bounding_box(inside)
+    image = source_ops.open_region(path, (x1, y1, x2, y2), image)
+    return [(region["name"], ocr_ops.ocr_image(image, (box[0] - x1, box[1] - y1, box[2] - x1, box[3] - y1),
+                                               config).strip() if box is not None else "")
+            for region, box in zip(regions, boxes)]
+
+def format_results(results):
+    """Formats (name, text) results for the text pane, each under its region name."""
+    return "\n\n".join(f"[{name}]\n{text}" for name, text in results) + "\n"
@@ -0,0 +1,275 @@
+import collections
+import threading
+
+import settings
+
+# Priority classes, lower value runs first
+INTERACTIVE = 0
+PREFETCH = 1
+BACKGROUND = 2
+
+PRIORITY_NAMES = {
+    INTERACTIVE: "interactive",
+    PREFETCH: "prefetch",
+    BACKGROUND: "background",
+}
+
+DEFAULT_LIMITS = {
+    "interactive": 2,
+    "prefetch": 1,
+    "background": 1,
+}
+
+# Priority class of the scheduler worker running in the current thread, if any
+_worker = threading.local()
+
+class Job:
+    """A unit of work submitted to the scheduler."""
+
+    def __init__(self, scheduler, fn, args, priority, key, collect=False):
+        self.scheduler = scheduler
+        self.fn = fn
+        self.args = args
+        self.priority = priority
+        self.key = key
+        self.collect = collect  # The result is waited for, so errors are raised there instead of printed
+        self.state = "queued"  # queued, running, done, cancelled
+        self.result = None
+        self.error = None
+        self.finished = threading.Event()
+
+    def wait(self):
+        """Waits for the job to finish and returns its result, raising its exception."""
+        self.finished.wait()
+        if self.state == "cancelled":
+            raise RuntimeError("OCR job was cancelled")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def cancel(self):
+        """Cancels the job if it has not started yet. Returns True on success."""
+        return self.scheduler.cancel(self)
+
+    @property
+    def cancelled(self):
+        return self.state == "cancelled"
+
+    def should_yield(self):
+        """Returns True while work of a higher priority class is queued or running."""
+        return self.scheduler.has_higher_priority_work(self.priority)
+
+    def pause_if_needed(self):
+        """
+        Blocks a cooperative job while higher priority work is pending.
+        Long background jobs call this between steps so that they defer to interactive work.
+        """
+        self.scheduler.wait_for_turn(self.priority)
+
+class Scheduler:
+    """
+    Runs OCR work on a fixed set of worker threads with priority classes.
+
+    Each class has its own concurrency limit and worker threads, so interactive
+    jobs never wait for a background job to finish. Lower classes are not started
+    while higher priority jobs are queued, and cooperative jobs pause between steps.
+    """
+
+    def __init__(self, limits=None):
+        limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.limits = {priority: max(1, int(limits[name])) for priority, name in PRIORITY_NAMES.items()}
+        self.queues = {priority: collections.deque() for priority in PRIORITY_NAMES}
+        self.queued = {priority: 0 for priority in PRIORITY_NAMES}
+        self.running = {priority: 0 for priority in PRIORITY_NAMES}
+        self.condition = threading.Condition()
+        for priority, limit in self.limits.items():
+            for index in range(limit):
+                name = f"ocr-{PRIORITY_NAMES[priority]}-{index}"
+                threading.Thread(target=self.worker, args=(priority,), name=name, daemon=True).start()
+
+    def submit(self, fn, *args, priority=INTERACTIVE, key=None):
+        """
+        Queues fn(*args) in the given priority class.
+        A queued job with the same key is cancelled, so only the latest request runs.
+        """
+        return self._submit(fn, args, priority, key)
+
+    def _submit(self, fn, args, priority, key, collect=False):
+        with self.condition:
+            if key is not None:
+                for queue in self.queues.values():
+                    for queued_job in queue:
+                        if queued_job.key == key and queued_job.state == "queued":
+                            self._cancel_locked(queued_job)
+            job = Job(self, fn, args, priority, key, collect)
+            self.queues[priority].append(job)
+            self.queued[priority] += 1
+            self.condition.notify_all()
+        return job
+
+    def call(self, fn, *args, priority=INTERACTIVE):
+        """
+        Runs fn(*args) as a job of the priority class and returns its result,
+        raising its exception. Must not be called from a worker of that class.
+        """
+        return self._submit(fn, args, priority, None, collect=True).wait()
+
+    def cancel(self, job):
+        with self.condition:
+            if job.state != "queued":
+                return False
+            self._cancel_locked(job)
+        return True
+
+    def cancel_all(self, priority):
+        """Cancels every queued job of the given priority class."""
+        with self.condition:
+            for job in self.queues[priority]:
+                if job.state == "queued":
+                    self._cancel_locked(job)
+
+    def _cancel_locked(self, job):
+        job.state = "cancelled"
+        self.queued[job.priority] -= 1
+        job.finished.set()
+        self.condition.notify_all()
+
+    def map_jobs(self, fn, items, priority=INTERACTIVE, cancelled=None):
+        """
+        Runs fn(item) for every item as jobs of the priority class and yields the
+        results in order, so that the parallel parts of OCR work count against the
+        class limit instead of starting threads of their own.
+
+        At most twice the class limit of items are submitted ahead. When called
+        from a worker of the same class (a job splitting its work), the calling
+        thread runs every job that no other worker has started yet itself, so it
+        never waits for a queued job and only idle workers of the class help.
+        Stops early when cancelled() returns True; jobs not started are cancelled.
+        """
+        inline = getattr(_worker, "priority", None) == priority
+        window = 2 * self.limits[priority]
+        items = iter(items)
+        pending = collections.deque()
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < window:
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending.append(self._submit(fn, (item,), priority, None, collect=True))
+                if not pending or (cancelled and cancelled()):
+                    return
+                job = pending.popleft()
+                if inline and self._claim(job):
+                    self._execute(job)
+                yield job.wait()
+        finally:
+            for job in pending:
+                self.cancel(job)
+
+    def _claim(self, job):
+        """Takes a queued job for running in the calling worker, which already holds a slot of the class."""
+        with self.condition:
+            if job.state != "queued":
+                return False
+            job.state = "running"
+            self.queued[job.priority] -= 1
+            self.condition.notify_all()
+        return True
+
+    def _execute(self, job):
+        """Runs a job in the calling thread and records its result."""
+        try:
+            job.result = job.fn(*job.args)
+        except Exception as e:
+            job.error = e
+            if not job.collect:
+                print(f"Error in {PRIORITY_NAMES[job.priority]} OCR job: {e}")
+        finally:
+            with self.condition:
+                job.state = "done"
+                self.condition.notify_all()
+            job.finished.set()
+
+    def has_higher_priority_work(self, priority):
+        with self.condition:
+            return self._higher_pending_locked(priority)
+
+    def _higher_pending_locked(self, priority):
+        return any(self.queued[p] or self.running[p] for p in PRIORITY_NAMES if p < priority)
+
+    def wait_for_turn(self, priority):
+        with self.condition:
+            while self._higher_pending_locked(priority):
+                self.condition.wait()
+
+    def _next_job_locked(self, priority):
+        """Pops the oldest runnable job of the class, or None."""
+        # Lower classes are deferred while higher priority jobs are still queued
+        if any(self.queued[p] for p in PRIORITY_NAMES if p < priority):
+            return None
+        queue = self.queues[priority]
+        while queue:
+            job = queue.popleft()
+            if job.state == "queued":
+                return job
+        return None
+
+    def worker(self, priority):
+        _worker.priority = priority
+        while True:
+            with self.condition:
+                job = self._next_job_locked(priority)
+                while job is None:
+                    self.condition.wait()
+                    job = self._next_job_locked(priority)
+                job.state = "running"
+                self.queued[priority] -= 1
+                self.running[priority] += 1
+            try:
+                self._execute(job)
+            finally:
+                with self.condition:
+                    self.running[priority] -= 1
+                    self.condition.notify_all()
+
+    def stats(self):
+        """Returns {class name: (running, queued)} for every priority class."""
+        with self.condition:
+            return {name: (self.running[priority], self.queued[priority])
+                    for priority, name in PRIORITY_NAMES.items()}
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """Returns the shared scheduler, creating it with the configured limits on first use."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = Scheduler(settings.settings.get("ocr_scheduler"))
+    return _scheduler
+
+def submit(fn, *args, priority=INTERACTIVE, key=None):
+    """Queues fn(*args) on the shared scheduler."""
+    return get_scheduler().submit(fn, *args, priority=priority, key=key)
+
+def call(fn, *args, priority=INTERACTIVE):
+    """Runs fn(*args) as a job on the shared scheduler and returns its result (see Scheduler.call)."""
+    return get_scheduler().call(fn, *args, priority=priority)
+
+def map_jobs(fn, items, priority=INTERACTIVE, cancelled=None):
+    """Runs fn(item) for every item on the shared scheduler and yields the results in order (see Scheduler.map_jobs)."""
+    return get_scheduler().map_jobs(fn, items, priority=priority, cancelled=cancelled)
+
+def stats():
+    """Returns the queue state of the shared scheduler."""
+    return get_scheduler().stats()
+
+def format_stats(stats):
+    """Formats queue state for the status bar, e.g. "OCR I 1/0 P 0/0 B 1/4" (running/queued)."""
+    return "OCR " + " ".join(f"{name[0].upper()} {running}/{queued}" for name, (running, queued) in stats.items())
@@ -0,0 +1,289 @@
+import base64
+import hashlib
+import io
+import json
+import os
+import queue
+import socket
+import socketserver
+import stat
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import backend_ops
+import memory_ops
+import ocr_ops
+import settings
+import source_ops
+
+DEFAULT_PORT = 8765
+BATCH_SIZE = 16  # Maximum requests dispatched together
+BATCH_WINDOW = 0.005  # Seconds to wait for more requests before dispatching a batch
+CACHE_ENTRIES = 512
+
+def warm_worker(worker_settings=None):
+    """Pool initializer: loads the OCR engine once per worker process."""
+    # Workers started with spawn (Windows, macOS) have not loaded the settings file
+    settings.settings.update(worker_settings or {})
+    source_ops.set_pixel_limit(settings.settings.get("max_image_megapixels", 1000))
+    ocr_ops.backend().warm()
+
+def ocr_batch(items):
+    """
+    Runs OCR for a batch of requests inside a worker process.
+
+    Args:
+        items: list of (image_bytes, path, region); either image_bytes or path is set
+
+    Returns:
+        list of dicts with "text" or "error" and the decode/OCR timings in milliseconds
+    """
+    from PIL import Image
+    results = []
+    for image_bytes, path, region in items:
+        try:
+            start_time = time.time()
+            if image_bytes is not None:
+                image = Image.open(io.BytesIO(image_bytes))
+            else:
+                image = source_ops.open_image(path)
+            image.load()
+            decode_time = (time.time() - start_time) * 1000
+            start_time = time.time()
+            text = ocr_ops.ocr_image(image, region, ocr_ops.config_for(path))
+            ocr_time = (time.time() - start_time) * 1000
+            results.append({"text": text, "decode_ms": decode_time, "ocr_ms": ocr_time})
+        except Exception as e:
+            results.append({"error": str(e)})
+    return results
+
+class OcrRequest:
+    """A request waiting to be batched, with the future its handler waits on."""
+
+    def __init__(self, image_bytes, path, region, cache_key):
+        self.image_bytes = image_bytes
+        self.path = path
+        self.region = region
+        self.cache_key = cache_key
+        self.arrival_time = time.time()
+        self.dispatch_time = None
+        self.future = Future()
+
+class OcrService:
+    """
+    Batches concurrent OCR requests onto a warm pool of worker processes.
+    Results are cached by image content (or path and mtime) and region.
+    """
+
+    def __init__(self, workers=None, batch_size=BATCH_SIZE, batch_window=BATCH_WINDOW):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_worker,
+                                        initargs=(backend_ops.worker_settings(),))
+        self.requests = queue.Queue()
+        self.cache = memory_ops.BoundedCache("server results", CACHE_ENTRIES,
+                                             size_of=lambda result: len(result.get("text", "")) + 256)
+        self.served = 0
+        self.batches = 0
+        # Start every worker now so that the first requests do not pay the startup cost
+        for _ in range(self.workers):
+            self.pool.submit(warm_worker, backend_ops.worker_settings())
+        threading.Thread(target=self.batch_loop, name="ocr-batcher", daemon=True).start()
+
+    def cache_key(self, image_bytes, path, region):
+        digest = hashlib.sha1()
+        if image_bytes is not None:
+            digest.update(image_bytes)
+        else:
+            archive_path, _ = source_ops.split_member_path(path)
+            stat = os.stat(archive_path)
+            digest.update(f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}".encode("utf-8"))
+        digest.update(json.dumps(region).encode("utf-8"))
+        return digest.hexdigest()
+
+    def submit(self, image_bytes=None, path=None, region=None):
+        """Queues a request and returns a future resolving to the result dict."""
+        key = self.cache_key(image_bytes, path, region)
+        cached = self.cache.get(key)
+        request = OcrRequest(image_bytes, path, region, key)
+        if cached is not None:
+            request.future.set_result(dict(cached, cached=True, queue_ms=0.0, total_ms=0.0))
+            return request.future
+        self.requests.put(request)
+        return request.future
+
+    def batch_loop(self):
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.time() + self.batch_window
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.dispatch(batch)
+
+    def dispatch(self, batch):
+        """Splits a batch evenly over the workers and submits the chunks."""
+        self.batches += 1
+        chunk_size = max(1, -(-len(batch) // self.workers))
+        for index in range(0, len(batch), chunk_size):
+            chunk = batch[index:index + chunk_size]
+            for request in chunk:
+                request.dispatch_time = time.time()
+            items = [(request.image_bytes, request.path, request.region) for request in chunk]
+            future = self.pool.submit(ocr_batch, items)
+            future.add_done_callback(lambda f, chunk=chunk: self.complete(chunk, f))
+
+    def complete(self, chunk, future):
+        try:
+            results = future.result()
+        except Exception as e:
+            results = [{"error": str(e)}] * len(chunk)
+        now = time.time()
+        for request, result in zip(chunk, results):
+            result = dict(result,
+                          cached=False,
+                          queue_ms=(request.dispatch_time - request.arrival_time) * 1000,
+                          total_ms=(now - request.arrival_time) * 1000)
+            if "error" not in result:
+                self.cache.put(request.cache_key, result)
+            self.served += 1
+            request.future.set_result(result)
+
+    def stats(self):
+        return {"workers": self.workers, "queued": self.requests.qsize(), "served": self.served,
+                "batches": self.batches, "cached": len(self.cache), "memory": memory_ops.usage()}
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+def parse_region(value):
+    """Parses a region given as [x1, y1, x2, y2] or "x1,y1,x2,y2"."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        value = value.split(",")
+    region = [int(float(v)) for v in value]
+    if len(region) != 4:
+        raise ValueError("region must have four values: x1,y1,x2,y2")
+    return region
+
+class OcrRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP front end of the OCR service.
+
+    GET  /health  returns service statistics.
+    POST /ocr     accepts either a JSON body {"path" | "image_base64", "region"}
+                  or raw image bytes with an optional ?region=x1,y1,x2,y2 query.
+    """
+
+    service = None  # Set by serve()
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/health":
+            self.send_json(200, self.service.stats())
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/ocr":
+            self.send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length)
+            image_bytes = path = None
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                request = json.loads(body)
+                if "image_base64" in request:
+                    image_bytes = base64.b64decode(request["image_base64"])
+                else:
+                    path = request["path"]
+                region = parse_region(request.get("region"))
+            else:
+                image_bytes = body
+                region = parse_region(parse_qs(url.query).get("region", [None])[0])
+            result = self.service.submit(image_bytes=image_bytes, path=path, region=region).result()
+        except Exception as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        self.send_json(500 if "error" in result else 200, result)
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # Unix socket clients have no (host, port) address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+if hasattr(socket, "AF_UNIX"):
+    class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+def remove_stale_socket(socket_path):
+    """
+    Removes the socket file left at socket_path by a server that is gone.
+    Refuses to start over anything else: a file that is not a socket, or the
+    socket of a server still accepting connections.
+    """
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise RuntimeError(f"{socket_path} exists and is not a socket")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except OSError:
+            os.remove(socket_path)
+            return
+    raise RuntimeError(f"another server is listening on {socket_path}")
+
+def serve(port=DEFAULT_PORT, socket_path=None, workers=None):
+    """
+    Runs the headless OCR server until interrupted.
+    Listens on localhost:port, or on a Unix socket when socket_path is given.
+    """
+    if socket_path:
+        if not hasattr(socket, "AF_UNIX"):
+            raise RuntimeError("Unix sockets are not supported on this platform")
+        remove_stale_socket(socket_path)
+    OcrRequestHandler.service = service = OcrService(workers=workers)
+    socket_inode = None
+    if socket_path:
+        server = ThreadingUnixHTTPServer(socket_path, OcrRequestHandler)
+        socket_inode = os.lstat(socket_path).st_ino
+        address = socket_path
+    else:
+        server = ThreadingHTTPServer(("127.0.0.1", port), OcrRequestHandler)
+        address = f"http://127.0.0.1:{port}"
+    print(f"Tess-a-shot OCR server listening on {address} with {service.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+        # Only the socket this server created is removed, not a file put there since
+        try:
+            current = os.lstat(socket_path) if socket_inode is not None else None
+        except FileNotFoundError:
+            current = None
+        if current is not None and stat.S_ISSOCK(current.st_mode) and current.st_ino == socket_inode:
+            os.remove(socket_path)
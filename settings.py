@@ -5,7 +5,8 @@ import tkinter as tk
 CONFIG_FILE = os.path.join(os.path.expanduser("~"), ".tessashot_config.json")
 
 current_directory = ""
-current_file = ""
+current_roots = []  # All browsed roots, current_directory is the first one
+current_file = ""  # Full path (or archive member path) of the selected file
 selection_coords = [0, 0, 0, 0]  # [x1, y1, x2, y2] in original image coordinates
 
 DEFAULT_SETTINGS = {
@@ -21,9 +22,19 @@ DEFAULT_SETTINGS = {
         "copy_on_region_select": False,
         "copy_on_select": False,
         "reformat_lines": False,
-        "remember_region": False
+        "remember_region": False,
+        "recursive_scan": False,
+        "show_word_boxes": False,
+        "change_aware_ocr": False,
+        "detect_text_blocks": False,
+        "show_text_blocks": False,
+        "ocr_named_regions": False,
+        "two_pass_ocr": False,
+        "live_ocr": False,
+        "index_when_idle": False
     },
     "last_directory": "",
+    "last_roots": [],
     "last_file": "",
     "last_selection": {
         "x1": 0,
@@ -31,6 +42,40 @@ DEFAULT_SETTINGS = {
         "x2": 0,
         "y2": 0
     },
+    "tiled_image_megapixels": 64,  # Larger images are displayed from a memory-mapped tile cache
+    "tile_cache_megabytes": 4096,  # The least recently opened tile caches are removed above this, 0 keeps all
+    "max_image_megapixels": 1000,  # Larger images are refused as decompression bombs, 0 disables the check
+    "memory_budget_mb": 1024,  # Caches are evicted above this (images in use are not), 0 disables the budget
+    "tracemalloc": False,  # Trace Python allocations for memory reports
+    "ocr_backend": "pytesseract",  # OCR engine: "pytesseract", "tesserocr" or "fake", see backend_ops
+    "tesseract_cmd": None,  # Path of the tesseract program for pytesseract, if it is not on the PATH
+    "target_x_height": 20,  # Crops are rescaled to this x-height in pixels before OCR, 0 disables
+    "ocr_configs": {},  # Tuned OCR configuration per directory, see tune_ops
+    "two_pass": {  # Second pass of two-pass OCR, see refine_ops
+        "min_confidence": 70,  # Lines with a word below this confidence are read again
+        "x_height": 32,  # Weak lines are upscaled to this x-height
+        "psm": 7,  # Each weak line is read as a single text line
+        "preprocess": "gray"
+    },
+    "live_ocr": {  # Speculative OCR while the selection is dragged, see live_ops
+        "delay_ms": 120,  # The mouse must rest this long before a preview runs
+        "scale": 0.5  # Previews OCR the crop reduced by this factor
+    },
+    "background_index": {  # Idle-time indexing of the current directory, see index_ops
+        "idle_seconds": 5,  # Indexing pauses until there was no user input for this long
+        "max_load": 0.75,  # Indexing pauses while the load average per CPU is above this
+        "pause_on_battery": True
+    },
+    "named_regions": [],  # [{"name": ..., "box": [x1, y1, x2, y2]}], OCR'd together on every image, see region_ops
+    "autotune": {
+        "samples": 8,  # Images benchmarked per directory
+        "min_confidence": 80  # Mean word confidence a configuration must reach
+    },
+    "ocr_scheduler": {  # Worker threads per priority class
+        "interactive": 2,
+        "prefetch": 1,
+        "background": 1
+    },
     "file_list_columns": {
         "name": 200,
         "size": 80
@@ -51,7 +96,17 @@ def save(ctx_ui):
     settings["options"]["copy_on_select"] = ctx_ui.copy_on_select_var.get()
     settings["options"]["reformat_lines"] = ctx_ui.reformat_lines_var.get()
     settings["options"]["remember_region"] = ctx_ui.remember_region_var.get()
+    settings["options"]["recursive_scan"] = ctx_ui.recursive_scan_var.get()
+    settings["options"]["show_word_boxes"] = ctx_ui.show_word_boxes_var.get()
+    settings["options"]["change_aware_ocr"] = ctx_ui.change_aware_var.get()
+    settings["options"]["detect_text_blocks"] = ctx_ui.detect_text_blocks_var.get()
+    settings["options"]["show_text_blocks"] = ctx_ui.show_text_blocks_var.get()
+    settings["options"]["ocr_named_regions"] = ctx_ui.named_regions_var.get()
+    settings["options"]["two_pass_ocr"] = ctx_ui.two_pass_var.get()
+    settings["options"]["live_ocr"] = ctx_ui.live_ocr_var.get()
+    settings["options"]["index_when_idle"] = ctx_ui.index_var.get()
     settings["last_directory"] = current_directory
+    settings["last_roots"] = current_roots
     settings["last_file"] = current_file
     if ctx_ui.remember_region_var.get():
         settings["last_selection"] = {
@@ -73,6 +128,10 @@ def save(ctx_ui):
             "name": ctx_ui.file_tree.column("name", option="width"),
             "size": ctx_ui.file_tree.column("size", option="width")
         }
+    write()
+
+def write():
+    """Writes the settings to the config file."""
     try:
         with open(CONFIG_FILE, 'w') as f:
             json.dump(settings, f, indent=4)
@@ -104,20 +163,33 @@ def apply(ctx_ui):
     ctx_ui.copy_on_select_var.set(settings["options"]["copy_on_select"])
     ctx_ui.reformat_lines_var.set(settings["options"]["reformat_lines"])
     ctx_ui.remember_region_var.set(settings["options"].get("remember_region", False))
+    ctx_ui.recursive_scan_var.set(settings["options"].get("recursive_scan", False))
+    ctx_ui.show_word_boxes_var.set(settings["options"].get("show_word_boxes", False))
+    ctx_ui.change_aware_var.set(settings["options"].get("change_aware_ocr", False))
+    ctx_ui.detect_text_blocks_var.set(settings["options"].get("detect_text_blocks", False))
+    ctx_ui.show_text_blocks_var.set(settings["options"].get("show_text_blocks", False))
+    ctx_ui.named_regions_var.set(settings["options"].get("ocr_named_regions", False))
+    ctx_ui.two_pass_var.set(settings["options"].get("two_pass_ocr", False))
+    ctx_ui.live_ocr_var.set(settings["options"].get("live_ocr", False))
+    ctx_ui.index_var.set(settings["options"].get("index_when_idle", False))
 
     selection_coords[0] = settings["last_selection"]["x1"]
     selection_coords[1] = settings["last_selection"]["y1"]
     selection_coords[2] = settings["last_selection"]["x2"]
     selection_coords[3] = settings["last_selection"]["y2"]
 
-    global current_directory, current_file
+    global current_directory, current_roots, current_file
 
     current_directory = settings["last_directory"]
+    current_roots = settings.get("last_roots") or ([current_directory] if current_directory else [])
     current_file = settings["last_file"]
+    # Older settings stored the file name relative to the directory
+    if current_file and current_directory and not os.path.isabs(current_file):
+        current_file = os.path.join(current_directory, current_file)
+    # The file list itself is restored by ui_ops.restore_session once the window is shown
     if current_directory and os.path.exists(current_directory):
         ctx_ui.directory_entry.delete(0, tk.END)
-        ctx_ui.directory_entry.insert(0, current_directory)
-        ctx_ui.refresh_file_list()
+        ctx_ui.directory_entry.insert(0, os.pathsep.join(current_roots))
 
     # Restore file list column widths if available
     if hasattr(ctx_ui, 'file_tree') and ctx_ui.file_tree is not None:
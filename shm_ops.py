@@ -0,0 +1,125 @@
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from PIL import Image
+
+import backend_ops
+import memory_ops
+import ocr_ops
+import settings
+import source_ops
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Segments attached in a worker process, kept open for the following jobs on the same image
+_attached = {}
+
+class SharedImage:
+    """
+    A decoded image placed once in shared memory, to be read by worker processes.
+
+    Workers receive the small descriptor dict instead of the pixels and wrap
+    the shared bytes in a PIL image without copying them. The owner must close
+    the SharedImage (or use it as a context manager) once all jobs are done;
+    the segment is then unlinked.
+    """
+
+    def __init__(self, image):
+        # PIL wraps these layouts around an external buffer without copying (RGB is stored as RGBX)
+        mode = "L" if image.mode in ("1", "L") else "RGBX"
+        width, height = image.size
+        nbytes = width * height * len(mode)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, nbytes))
+        # Decode straight into the segment rather than through an intermediate bytes object
+        target = Image.frombuffer(mode, image.size, self.shm.buf, "raw", mode, 0, 1)
+        target.readonly = False
+        target.paste(image if image.mode == mode else image.convert(mode))
+        del target
+        self.descriptor = {"name": self.shm.name, "size": (width, height), "mode": mode}
+        memory_ops.track("shared", self.shm.name, nbytes)
+
+    def close(self):
+        if self.shm is not None:
+            memory_ops.release("shared", self.shm.name)
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _open_segment(name):
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    # Pool workers share the resource tracker of the owner, where the segment is already registered
+    return shared_memory.SharedMemory(name=name)
+
+def attach(descriptor):
+    """Returns a PIL image wrapping the shared pixels of descriptor, without copying them."""
+    name = descriptor["name"]
+    segment = _attached.get(name)
+    if segment is None:
+        # Only the most recent image stays attached; older segments are released
+        for old in _attached.values():
+            old.close()
+        _attached.clear()
+        segment = _attached[name] = _open_segment(name)
+    mode = descriptor["mode"]
+    return Image.frombuffer(mode, tuple(descriptor["size"]), segment.buf, "raw", mode, 0, 1)
+
+def ocr_shared(descriptor, region=None, config=None):
+    """Worker side: OCRs a region of a shared image. Only the crop is copied."""
+    image = attach(descriptor)
+    box = tuple(region) if region is not None else (0, 0) + image.size
+    crop = image.crop(box)
+    del image
+    if crop.mode == "RGBX":
+        crop = crop.convert("RGB")
+    return ocr_ops.ocr_image(crop, config=config)
+
+def warm_worker(worker_settings=None):
+    # Spawned workers have not loaded the settings file; the engine settings are handed over
+    settings.settings.update(worker_settings or {})
+    source_ops.set_pixel_limit(settings.settings.get("max_image_megapixels", 1000))
+    ocr_ops.backend().warm()
+
+def get_pool():
+    """
+    Returns the shared pool of OCR worker processes, started on first use.
+    Workers are spawned rather than forked so that they do not inherit the GUI's threads.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = os.cpu_count() or 1
+                _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=warm_worker, initargs=(backend_ops.worker_settings(),))
+    return _pool
+
+def ocr_regions(image, regions, config=None, pool=None):
+    """
+    OCRs several regions of one image in parallel worker processes.
+    The image is decoded and copied into shared memory once; each job only carries its region.
+
+    Returns:
+        list of texts in the order of regions
+    """
+    pool = pool or get_pool()
+    # Spawned workers have not loaded the settings
+    config = dict(config or {})
+    if config.get("x_height") is None:
+        config["x_height"] = settings.settings.get("target_x_height", 0)
+    if config.get("backend") is None:
+        config["backend"] = settings.settings.get("ocr_backend")
+    with SharedImage(image) as shared:
+        futures = [pool.submit(ocr_shared, shared.descriptor, region, config) for region in regions]
+        return [future.result() for future in futures]
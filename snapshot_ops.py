@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+
+import settings
+import source_ops
+
+# Snapshots of recently used directories are kept next to the settings file
+SNAPSHOT_DIR = os.path.join(os.path.dirname(settings.CONFIG_FILE), ".tessashot_snapshots")
+MAX_SNAPSHOTS = 20
+SNAPSHOT_VERSION = 1
+
+def snapshot_path(roots, recursive):
+    """Returns the file used to store the snapshot of the given roots."""
+    key = json.dumps([[os.path.normcase(os.path.abspath(root)) for root in roots], bool(recursive)])
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return os.path.join(SNAPSHOT_DIR, f"{digest}.json")
+
+def load(roots, recursive):
+    """
+    Loads the stored snapshot of the given roots.
+    Returns None if there is no usable snapshot.
+    """
+    path = snapshot_path(roots, recursive)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if snapshot.get("version") != SNAPSHOT_VERSION or snapshot.get("roots") != list(roots):
+        return None
+    return snapshot
+
+def save(snapshot):
+    """Stores a snapshot and prunes the least recently used ones."""
+    path = snapshot_path(snapshot["roots"], snapshot["recursive"])
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        # Write to a temporary file first so a crash never leaves a truncated snapshot
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+        os.replace(temp_path, path)
+        prune()
+    except OSError as e:
+        print(f"Error saving directory snapshot: {e}")
+
+def prune():
+    """Removes the oldest snapshots beyond MAX_SNAPSHOTS."""
+    try:
+        files = [os.path.join(SNAPSHOT_DIR, f) for f in os.listdir(SNAPSHOT_DIR) if f.endswith(".json")]
+    except OSError:
+        return
+    files.sort(key=os.path.getmtime, reverse=True)
+    for path in files[MAX_SNAPSHOTS:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def archive_record(path, stat, cached):
+    """Returns the record of an archive, reusing cached when the archive itself is unchanged."""
+    if cached and cached["size"] == stat.st_size and cached["mtime"] == stat.st_mtime_ns:
+        return cached
+    members = [[source_ops.split_member_path(member)[1], size] for member, size in source_ops.list_archive(path)]
+    return {"size": stat.st_size, "mtime": stat.st_mtime_ns, "members": members}
+
+def revalidate(directory, record):
+    """
+    Checks the files of a directory record whose directory mtime is unchanged.
+    Files rewritten in place change only their own size and mtime, not the
+    directory's, so every file and archive is stat'ed again.
+
+    Returns:
+        tuple: (record, changed)
+    """
+    files = []
+    archives = {}
+    for name, size, mtime in record["files"]:
+        try:
+            stat = os.stat(os.path.join(directory, name))
+        except OSError:
+            continue
+        files.append([name, stat.st_size, stat.st_mtime_ns])
+    for name, cached in record["archives"].items():
+        path = os.path.join(directory, name)
+        try:
+            archives[name] = archive_record(path, os.stat(path), cached)
+        except OSError:
+            continue
+    changed = files != record["files"] or any(archives.get(name) is not cached for name, cached in record["archives"].items())
+    if not changed:
+        return record, False
+    return dict(record, files=files, archives=archives), True
+
+def scan_directory(directory, previous, include_archives=True):
+    """
+    Returns (record, changed) for a single directory.
+    When the directory mtime is unchanged, the previous record is only
+    revalidated file by file; archive member lists are reused when the
+    archive itself is unchanged.
+    """
+    mtime = os.stat(directory).st_mtime_ns
+    if previous is not None and previous.get("mtime") == mtime:
+        return revalidate(directory, previous)
+
+    previous_archives = previous.get("archives", {}) if previous else {}
+    files = []
+    archives = {}
+    subdirs = []
+    for entry in sorted(os.scandir(directory), key=lambda e: e.name.lower()):
+        try:
+            if entry.is_dir():
+                subdirs.append(entry.name)
+            elif entry.is_file():
+                if source_ops.is_image_name(entry.name):
+                    stat = entry.stat()
+                    files.append([entry.name, stat.st_size, stat.st_mtime_ns])
+                elif include_archives and source_ops.is_archive_name(entry.name):
+                    archives[entry.name] = archive_record(entry.path, entry.stat(), previous_archives.get(entry.name))
+        except OSError:
+            continue
+    return {"mtime": mtime, "files": files, "archives": archives, "subdirs": subdirs}, True
+
+def scan(roots, recursive, previous=None):
+    """
+    Builds a fresh snapshot of the given roots, reusing the records of
+    unchanged directories from the previous snapshot.
+
+    Returns:
+        tuple: (snapshot, changed) where changed tells whether any directory was re-read
+    """
+    previous_dirs = previous.get("dirs", {}) if previous else {}
+    dirs = {}
+    changed = previous is None
+    for root in roots:
+        if not os.path.isdir(root):
+            continue
+        pending = [root]
+        while pending:
+            directory = pending.pop()
+            try:
+                record, rescanned = scan_directory(directory, previous_dirs.get(directory))
+            except OSError as e:
+                print(f"Error reading directory {directory}: {e}")
+                continue
+            dirs[directory] = record
+            changed = changed or rescanned
+            if recursive:
+                pending.extend(os.path.join(directory, name) for name in reversed(record["subdirs"]))
+    # Directories that disappeared also count as a change
+    changed = changed or set(dirs) != set(previous_dirs)
+    sort = previous.get("sort", {"column": "name", "reverse": False}) if previous else {"column": "name", "reverse": False}
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "roots": list(roots),
+        "recursive": bool(recursive),
+        "sort": sort,
+        "dirs": dirs,
+    }
+    return snapshot, changed
+
+def entries(snapshot):
+    """Yields (path, root, size) for every image in a snapshot."""
+    dirs = snapshot["dirs"]
+    for root in snapshot["roots"]:
+        pending = [root]
+        while pending:
+            directory = pending.pop()
+            record = dirs.get(directory)
+            if record is None:
+                continue
+            for name, size, _ in record["files"]:
+                yield os.path.join(directory, name), root, size
+            for name, archive in record["archives"].items():
+                archive_path = os.path.join(directory, name)
+                for member, size in archive["members"]:
+                    yield source_ops.member_path(archive_path, member), root, size
+            if snapshot["recursive"]:
+                pending.extend(os.path.join(directory, name) for name in reversed(record["subdirs"]))
+
+def diff(old_entries, new_entries):
+    """
+    Compares two {path: (root, size)} mappings.
+
+    Returns:
+        tuple: (added, removed, resized) lists of paths
+    """
+    added = [path for path in new_entries if path not in old_entries]
+    removed = [path for path in old_entries if path not in new_entries]
+    resized = [path for path, (_, size) in new_entries.items()
+               if path in old_entries and old_entries[path][1] != size]
+    return added, removed, resized
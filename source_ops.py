@@ -0,0 +1,232 @@
+import io
+import os
+import zipfile
+
+from PIL import Image
+
+# Extensions recognised as images, both on disk and inside archives
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.gif')
+
+# Extensions of archives whose members can be browsed without extraction
+ARCHIVE_EXTENSIONS = ('.zip',)
+
+# Separator between an archive path and a member name, e.g. "day.zip::shots/a.png"
+MEMBER_SEPARATOR = "::"
+
+def is_image_name(name):
+    """Return True if the file name has a supported image extension."""
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+def is_archive_name(name):
+    """Return True if the file name is an archive that can be browsed."""
+    return name.lower().endswith(ARCHIVE_EXTENSIONS)
+
+def member_path(archive_path, member):
+    """Build the virtual path used for an image stored inside an archive."""
+    return f"{archive_path}{MEMBER_SEPARATOR}{member}"
+
+def split_member_path(path):
+    """
+    Split a virtual archive member path into (archive_path, member).
+    Returns (path, None) for regular files.
+    """
+    if MEMBER_SEPARATOR in path:
+        archive_path, member = path.split(MEMBER_SEPARATOR, 1)
+        if is_archive_name(archive_path):
+            return archive_path, member
+    return path, None
+
+def is_member_path(path):
+    """Return True if the path points inside an archive."""
+    return split_member_path(path)[1] is not None
+
+def container_directory(path):
+    """Return the on-disk directory holding the file or the archive of a member."""
+    archive_path, _ = split_member_path(path)
+    return os.path.dirname(archive_path)
+
+def exists(path):
+    """Check that a regular file or an archive member exists."""
+    archive_path, member = split_member_path(path)
+    if member is None:
+        return os.path.isfile(path)
+    try:
+        with zipfile.ZipFile(archive_path) as archive:
+            archive.getinfo(member)
+        return True
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return False
+
+def split_roots(text):
+    """Split the directory entry text into a list of roots (os.pathsep separated)."""
+    return [root.strip() for root in text.split(os.pathsep) if root.strip()]
+
+def join_roots(roots):
+    """Join a list of roots back into the directory entry text."""
+    return os.pathsep.join(roots)
+
+def display_name(path, root, multi_root):
+    """
+    Name shown in the file list: the path relative to its root,
+    prefixed with the root folder name when several roots are listed.
+    """
+    archive_path, member = split_member_path(path)
+    name = os.path.relpath(archive_path, root)
+    if member is not None:
+        name = member_path(name, member)
+    if multi_root:
+        name = os.path.join(os.path.basename(os.path.normpath(root)), name)
+    return name
+
+def list_archive(archive_path):
+    """
+    Yield (path, size) for every image member of a zip archive.
+    Only the central directory is read; no member is decompressed.
+    """
+    try:
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not is_image_name(info.filename):
+                    continue
+                yield member_path(archive_path, info.filename), info.file_size
+    except (OSError, zipfile.BadZipFile) as e:
+        print(f"Error reading archive {archive_path}: {e}")
+
+def list_images(roots, recursive=False, include_archives=True):
+    """
+    Yield (path, root, size) for every image under the given roots.
+    Subdirectories are walked when recursive is True and zip archives are
+    expanded into their image members when include_archives is True.
+    """
+    for root in roots:
+        if not os.path.isdir(root):
+            continue
+        pending = [root]
+        while pending:
+            directory = pending.pop()
+            try:
+                entries = sorted(os.scandir(directory), key=lambda e: e.name.lower())
+            except OSError as e:
+                print(f"Error reading directory {directory}: {e}")
+                continue
+            subdirectories = []
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        if recursive:
+                            subdirectories.append(entry.path)
+                    elif entry.is_file():
+                        if is_image_name(entry.name):
+                            yield entry.path, root, entry.stat().st_size
+                        elif include_archives and is_archive_name(entry.name):
+                            for path, size in list_archive(entry.path):
+                                yield path, root, size
+                except OSError:
+                    continue
+            # Reverse so that the stack pops subdirectories in name order
+            pending.extend(reversed(subdirectories))
+
+def read_bytes(path):
+    """Read the raw bytes of a regular file or an archive member."""
+    archive_path, member = split_member_path(path)
+    if member is None:
+        with open(path, 'rb') as f:
+            return f.read()
+    with zipfile.ZipFile(archive_path) as archive:
+        return archive.read(member)
+
+def open_image(path):
+    """
+    Open an image from a regular file or from a zip archive member.
+    Archive members are decompressed straight into memory, never to disk.
+    """
+    archive_path, member = split_member_path(path)
+    if member is None:
+        return Image.open(path)
+    with zipfile.ZipFile(archive_path) as archive:
+        with archive.open(member) as stream:
+            return Image.open(io.BytesIO(stream.read()))
+
+def set_pixel_limit(megapixels):
+    """
+    Sets PIL's decompression bomb limit for the whole process, once at startup:
+    images of more than megapixels are refused (0 disables the check). Images
+    above the tiling threshold are displayed from a tile cache, so the limit is
+    well above PIL's default.
+    """
+    import warnings
+    # PIL warns above MAX_IMAGE_PIXELS and refuses images of twice as many pixels
+    Image.MAX_IMAGE_PIXELS = int(megapixels * 1000000) // 2 if megapixels else None
+    warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+
+# Modes whose raw rows are exactly one byte per band, used to derive a missing raw stride
+BYTE_MODES = ("L", "P", "RGB", "RGBA", "RGBX", "CMYK")
+
+def _intersects(extents, box):
+    return extents[0] < box[2] and extents[2] > box[0] and extents[1] < box[3] and extents[3] > box[1]
+
+def _restrict_tiles(image, box):
+    """
+    Rewrites the decoder tiles of a not yet loaded image so that only the rows
+    covering box are decoded. Returns False if the format does not allow it.
+
+    - Non-interlaced PNG: rows are one zlib stream, decoding stops after the last needed row.
+    - Uncompressed single-tile formats (BMP, raw TIFF): the decoder seeks straight to the needed rows.
+    - Striped or tiled formats (TIFF): only the strips/tiles intersecting box are decoded.
+    JPEG and other formats are decoded in full.
+    """
+    tiles = list(image.tile)
+    width, height = image.size
+    x1, y1, x2, y2 = box
+    y1, y2 = max(0, y1), min(height, y2)
+    if y1 >= y2:
+        return False
+    if len(tiles) > 1:
+        image.tile = [tile for tile in tiles if _intersects(tile[1], box)]
+        return True
+    if len(tiles) != 1 or tuple(tiles[0][1]) != (0, 0, width, height):
+        return False
+    decoder_name, _, offset, args = tiles[0]
+    if image.format == "PNG" and decoder_name == "zip" and not image.info.get("interlace"):
+        image.tile = [(decoder_name, (0, 0, width, y2), offset, args)]
+        image._size = (width, y2)
+        return True
+    if decoder_name == "raw" and isinstance(args, tuple) and len(args) == 3:
+        rawmode, stride, orientation = args
+        if not stride and rawmode == image.mode and image.mode in BYTE_MODES:
+            stride = width * len(image.getbands())
+        if not stride or orientation not in (1, -1):
+            return False
+        if orientation == 1:
+            row_offset = offset + y1 * stride
+        else:
+            # Bottom-up storage: the last needed row comes first in the file
+            row_offset = offset + (height - y2) * stride
+        image.tile = [(decoder_name, (0, y1, width, y2), row_offset, (rawmode, stride, orientation))]
+        return True
+    return False
+
+def open_region(path, box, image=None):
+    """
+    Opens an image and decodes only the part needed for box, where the format allows it.
+    Returns the cropped region as a loaded PIL image.
+
+    Args:
+        image: the file as opened by open_image and not decoded yet, e.g. to read
+            its size first; it is closed once the region is read
+    """
+    box = tuple(int(v) for v in box)
+    if image is None:
+        image = open_image(path)
+    try:
+        try:
+            if _restrict_tiles(image, box):
+                image.load()
+                return image.crop(box)
+        except Exception:
+            # Fall back to a full decode if the partial decode is not supported
+            image.close()
+            image = open_image(path)
+        return image.crop(box)
+    finally:
+        image.close()
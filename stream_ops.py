@@ -0,0 +1,167 @@
+import io
+import json
+import os
+import stat
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import ocr_ops
+
+# Framed stream: every frame is a 4-byte big-endian header length, a JSON header
+# ({"id", "region", "config"}, all optional; length 0 for none), a 4-byte big-endian
+# image length and the encoded image bytes
+LENGTH = struct.Struct(">I")
+MAX_HEADER_BYTES = 1 << 20
+MAX_IMAGE_BYTES = 1 << 30
+
+# Unframed streams of PNG files are split at the end of each file
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+def write_frame(stream, image_bytes, header=None):
+    """Writes one frame of the framed format, e.g. from a capture script."""
+    header_bytes = json.dumps(header).encode("utf-8") if header else b""
+    stream.write(LENGTH.pack(len(header_bytes)) + header_bytes + LENGTH.pack(len(image_bytes)))
+    stream.write(image_bytes)
+    stream.flush()
+
+def read_exact(stream, size, at_boundary=False):
+    """
+    Reads exactly size bytes. Raises EOFError if the stream ends before, except
+    at_boundary (between frames), where None is returned if nothing was read.
+    """
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = stream.read(remaining)
+        if not chunk:
+            if at_boundary and remaining == size:
+                return None
+            raise EOFError(f"stream ended {remaining} bytes before the end of a frame")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+def read_frames(stream):
+    """Yields (header dict, image bytes) for every frame of a framed stream until it ends."""
+    while True:
+        prefix = read_exact(stream, LENGTH.size, at_boundary=True)
+        if prefix is None:
+            return
+        (header_length,) = LENGTH.unpack(prefix)
+        if header_length > MAX_HEADER_BYTES:
+            raise ValueError(f"frame header of {header_length} bytes, the stream is not framed")
+        header = json.loads(read_exact(stream, header_length)) if header_length else {}
+        (image_length,) = LENGTH.unpack(read_exact(stream, LENGTH.size))
+        if image_length > MAX_IMAGE_BYTES:
+            raise ValueError(f"frame image of {image_length} bytes, the stream is not framed")
+        yield header, read_exact(stream, image_length)
+
+def read_png(stream, signature):
+    """Reads the chunks of one PNG image up to its IEND chunk and returns the whole file."""
+    parts = [signature]
+    while True:
+        chunk_header = read_exact(stream, 8)
+        (length,) = LENGTH.unpack(chunk_header[:4])
+        parts.append(chunk_header)
+        parts.append(read_exact(stream, length + 4))  # Data and CRC
+        if chunk_header[4:] == b"IEND":
+            return b"".join(parts)
+
+def read_raw(stream):
+    """
+    Yields the images of an unframed stream: concatenated PNG files are split at
+    their IEND chunks, any other format is read as one image up to the end of the stream.
+    """
+    while True:
+        signature = read_exact(stream, len(PNG_SIGNATURE), at_boundary=True)
+        if signature is None:
+            return
+        if signature != PNG_SIGNATURE:
+            yield {}, signature + stream.read()
+            return
+        yield {}, read_png(stream, signature)
+
+def ocr_frame(image_bytes, region=None, config=None):
+    """Decodes and OCRs one image held in memory."""
+    from PIL import Image
+    image = Image.open(io.BytesIO(image_bytes))
+    image.load()
+    return ocr_ops.ocr_image(image, region, config)
+
+def is_fifo(path):
+    return path != "-" and stat.S_ISFIFO(os.stat(path).st_mode)
+
+def open_source(path):
+    if path == "-":
+        return sys.stdin.buffer
+    return open(path, "rb")
+
+def run(path="-", framed=True, region=None, config=None, workers=None, output=None):
+    """
+    Reads images from stdin ("-") or a file or FIFO and OCRs each one in memory.
+    Every result is written to output (default: stdout) as one JSON line as soon as
+    it is done, so results may come out of order; "index" counts frames from 0 and
+    "id" echoes the frame header.
+
+    In framed mode every frame may carry its own "region" and "config" (merged over
+    config). In raw mode the stream is a sequence of PNG files, or a single image
+    of another format. A FIFO is reopened after every writer until interrupted.
+
+    Returns:
+        int: number of frames read
+    """
+    output = output or sys.stdout
+    workers = workers or os.cpu_count() or 1
+    output_lock = threading.Lock()
+    # Bounds the frames held in memory when the producer is faster than OCR
+    in_flight = threading.BoundedSemaphore(workers * 2)
+    count = 0
+
+    def emit(result):
+        with output_lock:
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+
+    def task(index, header, image_bytes):
+        result = {"index": index}
+        if "id" in header:
+            result["id"] = header["id"]
+        try:
+            frame_config = dict(config or {}, **header.get("config", {}))
+            start_time = time.time()
+            result["text"] = ocr_frame(image_bytes, header.get("region", region), frame_config)
+            result["ocr_ms"] = (time.time() - start_time) * 1000
+        except Exception as e:
+            result["error"] = str(e)
+        finally:
+            in_flight.release()
+        emit(result)
+
+    reopen = is_fifo(path)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stream-ocr") as executor:
+        while True:
+            stream = open_source(path)
+            try:
+                for header, image_bytes in (read_frames(stream) if framed else read_raw(stream)):
+                    in_flight.acquire()
+                    executor.submit(task, count, header, image_bytes)
+                    count += 1
+            except (EOFError, ValueError) as e:
+                emit({"index": count, "error": f"Invalid stream: {e}"})
+            finally:
+                if stream is not sys.stdin.buffer:
+                    stream.close()
+            if not reopen:
+                break
+    return count
+
+def run_cli(path, framed=True, region=None, workers=None):
+    """Command line entry point: streams results to stdout and a summary to stderr."""
+    try:
+        count = run(path, framed=framed, region=region, workers=workers)
+    except KeyboardInterrupt:
+        return
+    print(f"OCR'd {count} frames", file=sys.stderr)
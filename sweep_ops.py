@@ -0,0 +1,97 @@
+import csv
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import ocr_ops
+import region_ops
+import source_ops
+
+def ocr_file_region(path, region):
+    """
+    Decodes only the rows of the file covering region and runs OCR on them.
+
+    Returns:
+        tuple: (text, error)
+    """
+    try:
+        return ocr_ops.ocr_image(source_ops.open_region(path, region), config=ocr_ops.config_for(path)), ""
+    except Exception as e:
+        return "", str(e)
+
+def ocr_file_named_regions(path, regions):
+    """
+    Decodes the part of the file covering all named regions once and runs OCR on each region.
+
+    Returns:
+        tuple: (list of texts in the order of regions, error)
+    """
+    try:
+        return [text for _, text in region_ops.ocr_file_regions(path, regions, ocr_ops.config_for(path))], ""
+    except Exception as e:
+        return [""] * len(regions), str(e)
+
+def sweep(paths, region, output_path, workers=None, progress=None, pause=None, cancelled=None):
+    """
+    Applies the same region to every file and writes all results to one CSV file
+    (path, text, error), in the order of paths. With named regions, the CSV file has
+    one text column per region instead (path, <name>..., error).
+
+    Args:
+        paths: image paths (regular files or archive members)
+        region: (x1, y1, x2, y2) in original image coordinates, or a list of
+            named regions ({"name", "box"} dicts, see region_ops)
+        output_path: CSV file to write
+        workers (int): number of files decoded and OCR'd in parallel (default: CPU count)
+        progress: optional callback(done, total, elapsed_seconds)
+        pause: optional callable invoked before each file, e.g. to defer to interactive OCR
+        cancelled: optional callable returning True to stop the sweep
+
+    Returns:
+        int: number of files processed
+    """
+    paths = list(paths)
+    workers = workers or os.cpu_count() or 1
+    start_time = time.time()
+    named = bool(region) and isinstance(region[0], dict)
+
+    def task(path):
+        if cancelled and cancelled():
+            return None
+        if pause:
+            pause()
+        if named:
+            return ocr_file_named_regions(path, region)
+        return ocr_file_region(path, region)
+
+    done = 0
+    with open(output_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if named:
+            writer.writerow(["path"] + [r["name"] for r in region] + ["error"])
+        else:
+            writer.writerow(["path", "text", "error"])
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for path, result in zip(paths, executor.map(task, paths)):
+                if result is None:
+                    continue
+                text, error = result
+                if named:
+                    writer.writerow([path] + text + [error])
+                else:
+                    writer.writerow([path, text.strip(), error])
+                done += 1
+                if progress:
+                    progress(done, len(paths), time.time() - start_time)
+    return done
+
+def run_cli(root, region, output_path, recursive=False, workers=None):
+    """Command line sweep: applies region (or named regions) to every image under root and prints progress."""
+    paths = [path for path, _, _ in source_ops.list_images([root], recursive=recursive)]
+
+    def progress(done, total, elapsed):
+        if done == total or done % 100 == 0:
+            print(f"{done}/{total} files, {done / elapsed if elapsed else 0:.1f} files/s")
+
+    done = sweep(paths, region, output_path, workers=workers, progress=progress)
+    print(f"Wrote {done} results to {output_path}")
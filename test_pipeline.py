@@ -0,0 +1,186 @@
+import io
+import json
+
+import pytest
+from PIL import Image
+
+import export_ops
+import index_ops
+import ocr_ops
+import settings
+import stream_ops
+import tile_ops
+
+# The "fake" backend reports the image size as one word spanning the image, so these
+# tests check the pipeline around the OCR engine without Tesseract installed
+
+
+@pytest.fixture(autouse=True)
+def fake_backend(monkeypatch):
+    monkeypatch.setitem(settings.settings, "ocr_backend", "fake")
+    monkeypatch.setitem(settings.settings, "target_x_height", 0)  # No rescaling, the fake word is the crop
+    monkeypatch.setitem(settings.settings, "ocr_configs", {})
+
+
+def png_bytes(width, height):
+    buffer = io.BytesIO()
+    Image.new("L", (width, height), 255).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_image_to_words_region_offsets():
+    image = Image.new("L", (300, 200), 255)
+    words = ocr_ops.image_to_words(image, (40, 30, 140, 90))
+    assert [(word["text"], word["left"], word["top"], word["width"], word["height"]) for word in words] == \
+        [("100x60", 40, 30, 100, 60)]
+
+
+def test_image_to_words_whole_image():
+    words = ocr_ops.image_to_words(Image.new("L", (120, 80), 255))
+    assert [(word["left"], word["top"], word["width"], word["height"]) for word in words] == [(0, 0, 120, 80)]
+
+
+def test_tiled_image_full_selection_is_read_reduced(tmp_path, monkeypatch):
+    source = tmp_path / "large.bmp"
+    Image.new("L", (1200, 800), 255).save(source)
+    tile_ops.build(str(source), str(tmp_path / "tiles"))
+    image = tile_ops.TiledImage(str(tmp_path / "tiles"))
+    levels = []
+    read_region = image.read_region
+    monkeypatch.setattr(image, "read_region", lambda level, box: levels.append(level) or read_region(level, box))
+    monkeypatch.setattr(ocr_ops, "MAX_WHOLE_IMAGE_PIXELS", 60000)
+    # The UI selects the whole image by default
+    words = ocr_ops.image_to_words(image, (0, 0, 1200, 800))
+    text = "".join(text for text, _ in ocr_ops.iter_ocr(image, (0, 0, 1200, 800)))
+    image.close()
+    assert levels and 0 not in levels
+    assert text.strip() == "300x200"
+    assert [(word["left"], word["top"], word["width"], word["height"]) for word in words] == [(0, 0, 1200, 800)]
+
+
+def test_read_frames():
+    stream = io.BytesIO()
+    stream_ops.write_frame(stream, b"first", {"id": "a"})
+    stream_ops.write_frame(stream, b"second")
+    stream.seek(0)
+    assert list(stream_ops.read_frames(stream)) == [({"id": "a"}, b"first"), ({}, b"second")]
+
+
+def test_read_frames_truncated():
+    stream = io.BytesIO()
+    stream_ops.write_frame(stream, b"image bytes", {"id": "a"})
+    stream = io.BytesIO(stream.getvalue()[:-3])
+    with pytest.raises(EOFError):
+        list(stream_ops.read_frames(stream))
+
+
+def test_run_framed(tmp_path):
+    path = tmp_path / "frames.bin"
+    with open(path, "wb") as f:
+        stream_ops.write_frame(f, png_bytes(30, 20), {"id": "a"})
+        stream_ops.write_frame(f, png_bytes(50, 40), {"id": "b", "region": [0, 0, 10, 10]})
+    output = io.StringIO()
+    assert stream_ops.run(str(path), workers=2, output=output) == 2
+    results = sorted((json.loads(line) for line in output.getvalue().splitlines()), key=lambda r: r["index"])
+    assert [(result["id"], result["text"].strip()) for result in results] == [("a", "30x20"), ("b", "10x10")]
+
+
+def test_run_truncated(tmp_path):
+    path = tmp_path / "frames.bin"
+    buffer = io.BytesIO()
+    stream_ops.write_frame(buffer, png_bytes(30, 20))
+    stream_ops.write_frame(buffer, png_bytes(30, 20))
+    path.write_bytes(buffer.getvalue()[:-5])
+    output = io.StringIO()
+    assert stream_ops.run(str(path), workers=1, output=output) == 1
+    results = sorted((json.loads(line) for line in output.getvalue().splitlines()), key=lambda r: r["index"])
+    assert results[0]["text"].strip() == "30x20"
+    assert results[1]["index"] == 1 and results[1]["error"].startswith("Invalid stream")
+
+
+def export_records(tmp_path):
+    image_path = tmp_path / "page.png"
+    image_path.write_bytes(png_bytes(80, 40))
+    return [export_ops.ocr_record(str(image_path)), export_ops.ocr_record(str(tmp_path / "missing.png"))]
+
+
+def test_export_jsonl(tmp_path):
+    records = export_records(tmp_path)
+    out = tmp_path / "out.jsonl"
+    assert export_ops.export(records, str(out)) == 2
+    lines = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+    assert lines[0]["text"].strip() == "80x40"
+    assert "error" in lines[1]
+
+
+def test_export_tsv(tmp_path):
+    out = tmp_path / "out.tsv"
+    export_ops.export(export_records(tmp_path), str(out))
+    rows = [line.split("\t") for line in out.read_text(encoding="utf-8").splitlines()]
+    header = rows[0]
+    assert header[:2] == ["path", "region"] and header[-1] == "error"
+    word = dict(zip(header, rows[1]))
+    assert (word["text"], word["width"], word["height"], word["error"]) == ("80x40", "80", "40", "")
+    assert dict(zip(header, rows[2]))["error"]
+
+
+def test_export_tsv_record_without_words(tmp_path):
+    out = tmp_path / "out.tsv"
+    export_ops.export([{"path": "blank.png", "text": "", "size": [10, 10], "words": []}], str(out))
+    rows = [line.split("\t") for line in out.read_text(encoding="utf-8").splitlines()]
+    assert len(rows) == 2 and rows[1][0] == "blank.png" and rows[1][-1] == ""
+
+
+def test_export_hocr(tmp_path):
+    out = tmp_path / "out.hocr"
+    export_ops.export(export_records(tmp_path), str(out))
+    text = out.read_text(encoding="utf-8")
+    assert "bbox 0 0 80 40" in text and ">80x40<" in text
+    assert "x_error" in text
+
+
+def test_export_alto(tmp_path):
+    out = tmp_path / "out.xml"
+    export_ops.export(export_records(tmp_path), str(out))
+    first = (tmp_path / "out_00001.xml").read_text(encoding="utf-8")
+    second = (tmp_path / "out_00002.xml").read_text(encoding="utf-8")
+    assert "<fileName>" in first and 'CONTENT="80x40"' in first and "FILENAME" not in first
+    assert "<processingStepDescription>" in second
+    assert export_ops.destination(str(out), count=2) == f"{tmp_path / 'out_00001.xml'} ... {tmp_path / 'out_00002.xml'}"
+
+
+def test_export_parquet(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    out = tmp_path / "out.parquet"
+    export_ops.export(export_records(tmp_path), str(out))
+    table = pq.read_table(str(out)).to_pydict()
+    assert table["text"][0] == "80x40"
+    assert table["text"][1] is None and table["error"][1]
+
+
+def test_index_lookup_and_search(tmp_path):
+    conn = index_ops.connect(str(tmp_path / "index.sqlite"))
+    image_path = tmp_path / "page.png"
+    image_path.write_bytes(png_bytes(64, 32))
+    assert index_ops.lookup(str(image_path), conn=conn) is None
+    index_ops.index_file(conn, str(image_path))
+    record = index_ops.lookup(str(image_path), conn=conn)
+    assert record["text"] == "64x32" and record["size"] == [64, 32]
+    assert [word["width"] for word in record["words"]] == [64]
+    assert [path for path, _ in index_ops.search("64x32", conn=conn)] == [str(image_path)]
+    assert index_ops.search("absent", conn=conn) == []
+    # A rewritten file is stale until indexed again
+    image_path.write_bytes(png_bytes(64, 33))
+    assert index_ops.lookup(str(image_path), conn=conn) is None
+
+
+def test_index_lookup_other_config(tmp_path, monkeypatch):
+    conn = index_ops.connect(str(tmp_path / "index.sqlite"))
+    image_path = tmp_path / "page.png"
+    image_path.write_bytes(png_bytes(64, 32))
+    index_ops.index_file(conn, str(image_path))
+    assert index_ops.lookup(str(image_path), conn=conn) is not None
+    assert index_ops.lookup(str(image_path), {"psm": 6}, conn=conn) is None
+    monkeypatch.setitem(settings.settings, "target_x_height", 30)
+    assert index_ops.lookup(str(image_path), conn=conn) is None
+    assert index_ops.pending_paths(str(tmp_path), conn) == [str(image_path)]
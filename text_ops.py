@@ -1,5 +1,4 @@
 import tkinter as tk
-import pyperclip
 
 import ctx_ui
 import ui_ops
@@ -22,6 +21,11 @@ def reformat_text(text):
     # Join lines back with newlines
     return ' '.join(normalized_words)
 
+def copy_text(text):
+    """Copy text to the system clipboard, importing pyperclip on first use."""
+    import pyperclip
+    pyperclip.copy(text)
+
 # Function to copy selected text to clipboard
 def copy_to_clipboard():
     """Copy selected text to clipboard, or all text if none selected."""
@@ -35,7 +39,7 @@ def copy_to_clipboard():
         if ctx_ui.reformat_lines_var.get():
             selected_text = reformat_text(selected_text)
         
-        pyperclip.copy(selected_text)
+        copy_text(selected_text)
         ui_ops.set_status("Text copied to clipboard.")
     else:
         ui_ops.set_status("No text to copy.")
@@ -58,7 +62,7 @@ def on_text_selection(event):
                 if ctx_ui.reformat_lines_var.get():
                     selected_text = reformat_text(selected_text)
                 
-                pyperclip.copy(selected_text)
+                copy_text(selected_text)
                 ui_ops.set_status("Selected text copied to clipboard.")
     except tk.TclError:  # No selection or other Tcl errors
         pass  # Do nothing if no text is selected or other errors occur
@@ -0,0 +1,123 @@
+from PIL import Image
+
+import ocr_ops
+import shm_ops
+
+DETECT_WIDTH = 800  # Images are analysed at this width (or their own, if narrower)
+EDGE_THRESHOLD = 32  # Gray level step between neighbouring pixels that counts as an edge
+MIN_INK_RUNS = 3  # Blocks whose rows cross fewer separate runs of ink are flat graphics, not text
+MIN_GAP = 6  # Empty rows or columns (at analysis scale) that separate two blocks
+DILATE_X, DILATE_Y = 6, 2  # Edge pixels are smeared over glyph gaps before cutting
+PADDING = 6  # Pixels added around a block in the original image
+MIN_BLOCK_AREA = 40  # Smaller blocks (at analysis scale) are noise
+MAX_BLOCKS = 40  # More blocks than this cost more in Tesseract startups than they save
+FULL_OCR_FRACTION = 0.7  # If the blocks cover more than this, the whole image is OCR'd
+
+def _dilate(mask, dx, dy):
+    """Grows the True pixels of a boolean array by dx columns and dy rows, using running sums."""
+    import numpy as np
+    if dx:
+        padded = np.pad(mask, ((0, 0), (dx, dx))).astype(np.int32).cumsum(axis=1)
+        padded = np.pad(padded, ((0, 0), (1, 0)))
+        mask = (padded[:, 2 * dx + 1:] - padded[:, :-2 * dx - 1]) > 0
+    if dy:
+        padded = np.pad(mask, ((dy, dy), (0, 0))).astype(np.int32).cumsum(axis=0)
+        padded = np.pad(padded, ((1, 0), (0, 0)))
+        mask = (padded[2 * dy + 1:, :] - padded[:-2 * dy - 1, :]) > 0
+    return mask
+
+def _runs(profile, min_gap):
+    """Returns the (start, end) runs of True in a 1-D profile, joining runs separated by less than min_gap."""
+    import numpy as np
+    runs = []
+    for index in np.flatnonzero(profile):
+        index = int(index)
+        if runs and index - runs[-1][1] < min_gap:
+            runs[-1][1] = index + 1
+        else:
+            runs.append([index, index + 1])
+    return runs
+
+def _xy_cut(mask, x0, y0, blocks):
+    """Recursive XY-cut: splits at wide empty rows, then columns, until a block cannot be split."""
+    rows = _runs(mask.any(axis=1), MIN_GAP)
+    if not rows:
+        return
+    columns = _runs(mask.any(axis=0), MIN_GAP)
+    if len(rows) > 1:
+        for top, bottom in rows:
+            _xy_cut(mask[top:bottom], x0, y0 + top, blocks)
+    elif len(columns) > 1:
+        for left, right in columns:
+            _xy_cut(mask[:, left:right], x0 + left, y0, blocks)
+    else:
+        (top, bottom), (left, right) = rows[0], columns[0]
+        blocks.append((x0 + left, y0 + top, x0 + right, y0 + bottom))
+
+def _has_strokes(gray):
+    """
+    Returns True if a block looks like text: in its median row (among the rows
+    with ink), at least MIN_INK_RUNS separate runs of ink. Ink is what differs
+    from the block's own background (its median gray level) by EDGE_THRESHOLD.
+    A filled shape gives one run per row and an outline two, text many.
+    """
+    import numpy as np
+    ink = np.abs(gray - int(np.median(gray))) > EDGE_THRESHOLD
+    runs = ink[:, :1].sum(axis=1) + (ink[:, 1:] & ~ink[:, :-1]).sum(axis=1)
+    runs = runs[runs > 0]
+    return bool(len(runs)) and np.median(runs) >= MIN_INK_RUNS
+
+def detect_blocks(image):
+    """
+    Finds the blocks of an image that may contain text.
+
+    Edges are detected on a downscaled grayscale copy, smeared over the gaps
+    between glyphs and cut into blocks at empty rows and columns (projection
+    profiles). Blocks that are tiny are dropped, and so are flat graphics, whose
+    rows cross only one or two runs of ink while text rows cross many strokes.
+
+    Returns:
+        list of (x1, y1, x2, y2) boxes in image coordinates, in reading order
+    """
+    import numpy as np
+    width, height = image.size
+    scale = min(1.0, DETECT_WIDTH / width)
+    small_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    small = image.resize(small_size, Image.BILINEAR).convert("L")
+    gray = np.asarray(small, dtype=np.int16)
+
+    edges = np.zeros(gray.shape, dtype=bool)
+    edges[:, 1:] |= np.abs(np.diff(gray, axis=1)) > EDGE_THRESHOLD
+    edges[1:, :] |= np.abs(np.diff(gray, axis=0)) > EDGE_THRESHOLD
+    mask = _dilate(edges, DILATE_X, DILATE_Y)
+
+    found = []
+    _xy_cut(mask, 0, 0, found)
+    blocks = []
+    for x1, y1, x2, y2 in found:
+        if (x2 - x1) * (y2 - y1) < MIN_BLOCK_AREA or not _has_strokes(gray[y1:y2, x1:x2]):
+            continue
+        blocks.append((max(0, int(x1 / scale) - PADDING), max(0, int(y1 / scale) - PADDING),
+                       min(width, int(x2 / scale) + PADDING), min(height, int(y2 / scale) + PADDING)))
+    blocks.sort(key=lambda box: (box[1], box[0]))
+    return blocks
+
+def ocr_text_blocks(image, config=None):
+    """
+    OCRs only the detected text blocks of an image.
+    Falls back to the whole image when the blocks would not save work.
+
+    Returns:
+        (text, blocks); blocks is empty if the whole image was OCR'd
+    """
+    blocks = detect_blocks(image)
+    width, height = image.size
+    area = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in blocks)
+    if len(blocks) > MAX_BLOCKS or area > FULL_OCR_FRACTION * width * height:
+        return ocr_ops.ocr_image(image, config=config), []
+    if len(blocks) > 1 and isinstance(image, Image.Image):
+        # The blocks are OCR'd in parallel processes reading the same shared pixels
+        texts = [text.strip() for text in shm_ops.ocr_regions(image, blocks, config)]
+    else:
+        texts = [ocr_ops.ocr_image(image, block, config).strip() for block in blocks]
+    return "\n\n".join(text for text in texts if text), blocks
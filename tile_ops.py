@@ -0,0 +1,399 @@
+import hashlib
+import io
+import json
+import math
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import time
+import zipfile
+import zlib
+
+from PIL import Image
+
+import settings
+import source_ops
+
+# Converted images are kept next to the settings file
+TILE_CACHE_DIR = os.path.join(os.path.dirname(settings.CONFIG_FILE), ".tessashot_tiles")
+TILE_SIZE = 256
+TILE_VERSION = 1
+BUILD_PREFIX = "build-"  # Conversions in progress, renamed to their cache directory when done
+STALE_BUILD_SECONDS = 24 * 3600  # Older conversion directories are left over from a crash
+
+# PNG files are decoded in row bands; other compressed formats cannot be tiled
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}  # Samples per pixel by colour type
+PNG_READ_SIZE = 1 << 20  # Compressed bytes read from the file at a time
+
+def needs_tiling(image):
+    """Returns True if the image is large enough to be displayed from the tile cache."""
+    threshold = settings.settings.get("tiled_image_megapixels", 64) * 1000000
+    width, height = image.size
+    return width * height > threshold
+
+def cache_directory(path):
+    """Returns the tile cache directory of a file, keyed by path, size and mtime."""
+    archive_path, _ = source_ops.split_member_path(path)
+    stat = os.stat(archive_path)
+    key = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return os.path.join(TILE_CACHE_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest())
+
+def tile_mode(mode):
+    """Tiles are stored as 8-bit grayscale or RGB."""
+    return "L" if mode in ("1", "L", "I;16", "I", "F") else "RGB"
+
+class TiledImage:
+    """
+    A read-only image backed by a memory-mapped tile pyramid on disk.
+
+    Level 0 has full resolution and every further level halves the size.
+    Each level is a raw file of TILE_SIZE x TILE_SIZE tiles in row-major order.
+    Only the tiles intersecting a requested region are read, so memory use is
+    bounded by the size of the requested output, not by the size of the image.
+    Implements the subset of the PIL image interface used by the UI and OCR.
+    """
+
+    format = "TILED"
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, "meta.json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.directory = directory
+        self.size = tuple(meta["size"])
+        self.width, self.height = self.size
+        self.mode = meta["mode"]
+        self.bands = len(self.mode)  # "L" or "RGB"
+        self.info = {}
+        self.levels = []
+        for level, (width, height) in enumerate(meta["levels"]):
+            path = os.path.join(directory, f"level{level}.raw")
+            with open(path, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.levels.append((width, height, data))
+
+    def close(self):
+        for _, _, data in self.levels:
+            data.close()
+        self.levels = []
+
+    def read_region(self, level, box):
+        """Assembles the region box (in level coordinates) from the intersecting tiles."""
+        width, height, data = self.levels[level]
+        x1, y1, x2, y2 = [int(v) for v in box]
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(width, x2), min(height, y2)
+        output = Image.new(self.mode, (max(1, x2 - x1), max(1, y2 - y1)))
+        if x2 <= x1 or y2 <= y1:
+            return output
+        tiles_x = math.ceil(width / TILE_SIZE)
+        tile_bytes = TILE_SIZE * TILE_SIZE * self.bands
+        view = memoryview(data)
+        try:
+            for ty in range(y1 // TILE_SIZE, (y2 - 1) // TILE_SIZE + 1):
+                for tx in range(x1 // TILE_SIZE, (x2 - 1) // TILE_SIZE + 1):
+                    offset = (ty * tiles_x + tx) * tile_bytes
+                    # Wraps the mapped bytes without copying the tile
+                    tile = Image.frombuffer(self.mode, (TILE_SIZE, TILE_SIZE), view[offset:offset + tile_bytes],
+                                            "raw", self.mode, 0, 1)
+                    tile_x, tile_y = tx * TILE_SIZE, ty * TILE_SIZE
+                    crop = (max(x1, tile_x) - tile_x, max(y1, tile_y) - tile_y,
+                            min(x2, tile_x + TILE_SIZE) - tile_x, min(y2, tile_y + TILE_SIZE) - tile_y)
+                    output.paste(tile.crop(crop), (tile_x + crop[0] - x1, tile_y + crop[1] - y1))
+                    del tile
+        finally:
+            view.release()
+        return output
+
+    def crop(self, box):
+        """Returns the region box of the full resolution image."""
+        return self.read_region(0, box)
+
+    def resize(self, size, resample=Image.LANCZOS, box=None, reducing_gap=None):
+        """
+        Returns the region box (full resolution coordinates, default whole image)
+        scaled to size, read from the smallest pyramid level that still has enough detail.
+        """
+        if box is None:
+            box = (0, 0, self.width, self.height)
+        x1, y1, x2, y2 = box
+        target_width, target_height = max(1, int(size[0])), max(1, int(size[1]))
+        scale = min((x2 - x1) / target_width, (y2 - y1) / target_height)
+        level = 0
+        while level + 1 < len(self.levels) and 2 ** (level + 1) <= scale:
+            level += 1
+        factor = 2 ** level
+        region = self.read_region(level, (x1 / factor, y1 / factor, math.ceil(x2 / factor), math.ceil(y2 / factor)))
+        return region.resize((target_width, target_height), resample)
+
+    def load(self):
+        return None
+
+def _open_stream(path):
+    """Opens a file or zip archive member for sequential reading, without reading it into memory."""
+    archive_path, member = source_ops.split_member_path(path)
+    if member is None:
+        return open(path, 'rb')
+    with zipfile.ZipFile(archive_path) as archive:
+        # The member stream keeps the archive file open until it is closed
+        return archive.open(member)
+
+def _png_chunk(chunk_type, data):
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+def _png_band_source(path):
+    """
+    Returns a function reading rows [y1, y2) of a PNG file, called for consecutive
+    bands from the top. The IDAT stream is decompressed incrementally, so only the
+    compressed read buffer and the current band are held in memory.
+
+    Each band is unfiltered by PIL: its filtered rows are wrapped into a small
+    uncompressed PNG, preceded by the last row of the previous band, which the
+    filters of the first row refer to. Returns None for interlaced files and bit
+    depths other than 8, which cannot be decoded by rows this way.
+    """
+    stream = _open_stream(path)
+    if stream.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+        stream.close()
+        return None
+    header_chunks = []
+    while True:
+        length, chunk_type = struct.unpack(">I4s", stream.read(8))
+        if chunk_type == b"IDAT":
+            break
+        data = stream.read(length)
+        stream.read(4)  # CRC
+        if chunk_type == b"IHDR":
+            width, height, bit_depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", data)
+            if bit_depth != 8 or interlace or color_type not in PNG_CHANNELS:
+                stream.close()
+                return None
+            stride = width * PNG_CHANNELS[color_type]
+        if chunk_type in (b"IHDR", b"PLTE", b"tRNS"):
+            header_chunks.append((chunk_type, data))
+        elif chunk_type == b"IEND":
+            stream.close()
+            raise ValueError(f"{path} has no image data")
+
+    state = {"remaining": length, "next_row": 0, "previous": bytes(stride)}
+    decompressor = zlib.decompressobj()
+    pending = bytearray()
+
+    def read_compressed():
+        """Returns the next piece of IDAT data, b"" at the end of the image data."""
+        while not state["remaining"]:
+            stream.read(4)  # CRC
+            chunk_header = stream.read(8)
+            if len(chunk_header) < 8:
+                return b""
+            state["remaining"], chunk_type = struct.unpack(">I4s", chunk_header)
+            if chunk_type != b"IDAT":
+                return b""
+        data = stream.read(min(state["remaining"], PNG_READ_SIZE))
+        if not data:
+            return b""
+        state["remaining"] -= len(data)
+        return data
+
+    def read_rows(y1, y2):
+        if y1 != state["next_row"]:
+            raise ValueError("PNG rows must be read in order")
+        needed = (y2 - y1) * (stride + 1)
+        while len(pending) < needed:
+            if decompressor.unconsumed_tail:
+                data = decompressor.unconsumed_tail
+            else:
+                data = read_compressed()
+                if not data:
+                    raise ValueError(f"{path} is truncated at row {y1 + len(pending) // (stride + 1)}")
+            pending.extend(decompressor.decompress(data, max(needed - len(pending), PNG_READ_SIZE)))
+        rows = bytes(pending[:needed])
+        del pending[:needed]
+        band_ihdr = struct.pack(">IIBBBBB", width, y2 - y1 + 1, 8, color_type, 0, 0, 0)
+        png = [PNG_SIGNATURE, _png_chunk(b"IHDR", band_ihdr)]
+        png.extend(_png_chunk(chunk_type, data) for chunk_type, data in header_chunks if chunk_type != b"IHDR")
+        # Stored (level 0) deflate costs a copy, the filtering is undone by PIL's decoder
+        png.append(_png_chunk(b"IDAT", zlib.compress(b"\0" + state["previous"] + rows, 0)))
+        png.append(_png_chunk(b"IEND", b""))
+        band = Image.open(io.BytesIO(b"".join(png)))
+        band.load()
+        state["previous"] = band.crop((0, y2 - y1, width, y2 - y1 + 1)).tobytes()
+        state["next_row"] = y2
+        if y2 == height:
+            stream.close()
+        return band.crop((0, 1, width, y2 - y1 + 1))
+
+    return read_rows
+
+def _band_source(path):
+    """
+    Returns a function reading rows [y1, y2) of the source image, so that the
+    full image is never decoded in memory. Uncompressed files are read band by
+    band straight from disk, PNG files are decompressed band by band. Returns
+    None for other formats.
+    """
+    image = source_ops.open_image(path)
+    tiles = list(image.tile)
+    width, height = image.size
+    if (not source_ops.is_member_path(path) and len(tiles) == 1 and tiles[0][0] == "raw"
+            and tuple(tiles[0][1]) == (0, 0, width, height) and image.mode != "P"):
+        _, _, offset, args = tiles[0]
+        if isinstance(args, tuple) and len(args) == 3:
+            rawmode, stride, orientation = args
+            mode = image.mode
+            if not stride and rawmode == mode and mode in source_ops.BYTE_MODES:
+                stride = width * len(image.getbands())
+            if stride and orientation in (1, -1):
+                def read_rows(y1, y2):
+                    # Bottom-up files store the last rows first
+                    start = y1 if orientation == 1 else height - y2
+                    with open(path, 'rb') as f:
+                        f.seek(offset + start * stride)
+                        data = f.read((y2 - y1) * stride)
+                    return Image.frombuffer(mode, (width, y2 - y1), data, "raw", rawmode, stride, orientation)
+                return read_rows
+    if image.format == "PNG":
+        return _png_band_source(path)
+    return None
+
+def _write_level(path, width, height, bands, read_rows, mode):
+    """Writes one pyramid level, reading TILE_SIZE rows at a time."""
+    tiles_x = math.ceil(width / TILE_SIZE)
+    tiles_y = math.ceil(height / TILE_SIZE)
+    tile_bytes = TILE_SIZE * TILE_SIZE * bands
+    with open(path, 'wb') as f:
+        f.truncate(tiles_x * tiles_y * tile_bytes)
+        for ty in range(tiles_y):
+            y1 = ty * TILE_SIZE
+            band = read_rows(y1, min(height, y1 + TILE_SIZE))
+            if band.mode != mode:
+                band = band.convert(mode)
+            for tx in range(tiles_x):
+                x1 = tx * TILE_SIZE
+                tile = Image.new(mode, (TILE_SIZE, TILE_SIZE))
+                tile.paste(band.crop((x1, 0, min(width, x1 + TILE_SIZE), band.size[1])), (0, 0))
+                f.seek((ty * tiles_x + tx) * tile_bytes)
+                f.write(tile.tobytes())
+
+def build(path, directory, progress=None):
+    """
+    Converts an image file into a tile pyramid in directory. Returns False if
+    the format cannot be read in bands (see _band_source).
+    """
+    image = source_ops.open_image(path)
+    width, height = image.size
+    mode = tile_mode(image.mode)
+    bands = len(mode)
+    read_rows = _band_source(path)
+    if read_rows is None:
+        return False
+    # Every conversion has its own directory, so that loads of the same file can overlap
+    os.makedirs(os.path.dirname(directory), exist_ok=True)
+    temp_directory = tempfile.mkdtemp(prefix=BUILD_PREFIX, dir=os.path.dirname(directory))
+    try:
+        _build_levels(temp_directory, width, height, mode, bands, read_rows, progress)
+        if os.path.isdir(directory):
+            if is_valid(directory):
+                return True  # Converted meanwhile by another load
+            shutil.rmtree(directory, ignore_errors=True)
+        try:
+            os.replace(temp_directory, directory)
+        except OSError:
+            if not is_valid(directory):
+                raise
+    finally:
+        shutil.rmtree(temp_directory, ignore_errors=True)
+    return True
+
+def _build_levels(temp_directory, width, height, mode, bands, read_rows, progress):
+    """Writes all pyramid levels and the metadata into temp_directory."""
+    levels = [(width, height)]
+    _write_level(os.path.join(temp_directory, "level0.raw"), width, height, bands, read_rows, mode)
+    while max(levels[-1]) > TILE_SIZE:
+        previous_width, previous_height = levels[-1]
+        level_width, level_height = math.ceil(previous_width / 2), math.ceil(previous_height / 2)
+        level = len(levels)
+        if progress:
+            progress(level)
+        # Each level is read from the previous one through the same tiled reader
+        with open(os.path.join(temp_directory, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump({"version": TILE_VERSION, "size": [width, height], "mode": mode, "levels": levels}, f)
+        source = TiledImage(temp_directory)
+        try:
+            def read_rows(y1, y2, source=source, level=level):
+                rows = source.read_region(level - 1, (0, y1 * 2, previous_width, y2 * 2))
+                return rows.resize((level_width, y2 - y1), Image.BOX)
+            _write_level(os.path.join(temp_directory, f"level{level}.raw"), level_width, level_height, bands, read_rows, mode)
+        finally:
+            source.close()
+        levels.append((level_width, level_height))
+
+    with open(os.path.join(temp_directory, "meta.json"), 'w', encoding='utf-8') as f:
+        json.dump({"version": TILE_VERSION, "size": [width, height], "mode": mode, "levels": levels}, f)
+
+def is_valid(directory):
+    """Returns True if directory holds a complete tile pyramid of the current version."""
+    try:
+        with open(os.path.join(directory, "meta.json"), 'r', encoding='utf-8') as f:
+            return json.load(f).get("version") == TILE_VERSION
+    except (OSError, ValueError):
+        return False
+
+def directory_size(directory):
+    size = 0
+    for name in os.listdir(directory):
+        try:
+            size += os.path.getsize(os.path.join(directory, name))
+        except OSError:
+            pass
+    return size
+
+def prune(keep=None):
+    """
+    Removes the least recently opened tile caches beyond the "tile_cache_megabytes"
+    setting (0 keeps all), and conversions left over from a crash. keep, the cache
+    being opened, is never removed.
+    """
+    limit = settings.settings.get("tile_cache_megabytes", 4096) * 1000000
+    try:
+        names = os.listdir(TILE_CACHE_DIR)
+    except OSError:
+        return
+    caches = []
+    for name in names:
+        directory = os.path.join(TILE_CACHE_DIR, name)
+        try:
+            mtime = os.path.getmtime(directory if name.startswith(BUILD_PREFIX) else os.path.join(directory, "meta.json"))
+        except OSError:
+            mtime = 0
+        if name.startswith(BUILD_PREFIX):
+            if time.time() - mtime > STALE_BUILD_SECONDS:
+                shutil.rmtree(directory, ignore_errors=True)
+        elif directory != keep:
+            caches.append((mtime, directory))
+    if not limit:
+        return
+    total = directory_size(keep) if keep and os.path.isdir(keep) else 0
+    for _, directory in sorted(caches, reverse=True):
+        size = directory_size(directory)
+        if total + size > limit:
+            # Memory-mapped files of an image still open cannot be removed on Windows
+            shutil.rmtree(directory, ignore_errors=True)
+        else:
+            total += size
+
+def open_tiled(path, progress=None):
+    """
+    Opens a file through the tile cache, converting it on first use. Returns None
+    if the file cannot be converted without decoding it whole.
+    """
+    directory = cache_directory(path)
+    if is_valid(directory):
+        # The modification time of the metadata orders the caches by last use for prune
+        os.utime(os.path.join(directory, "meta.json"))
+    elif not build(path, directory, progress):
+        return None
+    prune(keep=directory)
+    return TiledImage(directory)
@@ -0,0 +1,99 @@
+import os
+import queue
+import shutil
+import threading
+import time
+
+import source_ops
+
+BATCH_SIZE = 200  # Finished paths reported together, so the file list is updated in a few large steps
+BATCH_INTERVAL = 0.2  # Seconds after which finished paths are reported even if the batch is not full
+
+OPERATION_NAMES = {"delete": "Deleted", "move": "Moved", "trash": "Sent to trash"}
+
+def trash_available():
+    """Returns True if the optional send2trash package is installed."""
+    try:
+        import send2trash  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def unique_target(directory, name):
+    """Returns a path in directory for name that does not overwrite an existing file."""
+    target = os.path.join(directory, name)
+    stem, extension = os.path.splitext(name)
+    counter = 1
+    while os.path.exists(target):
+        target = os.path.join(directory, f"{stem} ({counter}){extension}")
+        counter += 1
+    return target
+
+def apply(operation, path, destination=None):
+    """Performs one file operation. Raises on failure."""
+    if source_ops.is_member_path(path):
+        raise ValueError("images inside archives cannot be changed")
+    if operation == "delete":
+        os.remove(path)
+    elif operation == "move":
+        shutil.move(path, unique_target(destination, os.path.basename(path)))
+    elif operation == "trash":
+        from send2trash import send2trash
+        send2trash(path)
+    else:
+        raise ValueError(f"unknown operation {operation}")
+
+class FileWorker:
+    """
+    A single background thread performing file operations in submission order.
+    Disk work never blocks the UI, and operations on the same files cannot overlap.
+    """
+
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, operation, paths, destination=None, on_batch=None, on_done=None):
+        """
+        Queues an operation on paths.
+
+        on_batch(done_paths) is called with the paths finished so far, at most every
+        BATCH_SIZE paths or BATCH_INTERVAL seconds; on_done(done_count, errors) is called
+        at the end with errors as a list of (path, message). Both run on the worker thread.
+        """
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name="file-worker", daemon=True)
+                self.thread.start()
+        self.jobs.put((operation, list(paths), destination, on_batch, on_done))
+
+    def run(self):
+        while True:
+            operation, paths, destination, on_batch, on_done = self.jobs.get()
+            done = []
+            done_count = 0
+            errors = []
+            last_report = time.time()
+            for path in paths:
+                try:
+                    apply(operation, path, destination)
+                    done.append(path)
+                    done_count += 1
+                except Exception as e:
+                    errors.append((path, str(e)))
+                if done and (len(done) >= BATCH_SIZE or time.time() - last_report >= BATCH_INTERVAL):
+                    if on_batch:
+                        on_batch(done)
+                    done = []
+                    last_report = time.time()
+            if done and on_batch:
+                on_batch(done)
+            if on_done:
+                on_done(done_count, errors)
+
+_worker = FileWorker()
+
+def submit(operation, paths, destination=None, on_batch=None, on_done=None):
+    """Queues a file operation on the shared background worker."""
+    _worker.submit(operation, paths, destination, on_batch, on_done)
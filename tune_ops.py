@@ -0,0 +1,135 @@
+import os
+import random
+import time
+
+import ocr_ops
+import settings
+import source_ops
+
+# Values tried for each configuration key; the first value of each is the starting point
+SEARCH_SPACE = [
+    ("psm", [None, 3, 4, 6, 11]),
+    ("oem", [None, 1]),
+    ("x_height", [None, 0, 14, 28]),  # None: the "target_x_height" setting, 0: no rescaling
+    ("preprocess", ["none", "gray", "binarize"]),
+]
+MIN_SPEEDUP = 0.05  # A configuration must be this much faster to replace the current one, so timing noise does not decide
+
+def sample_paths(directory, samples, seed=0):
+    """Picks up to samples images of a directory, the same ones on every run."""
+    paths = sorted(path for path, _, _ in source_ops.list_images([directory], recursive=False))
+    if len(paths) <= samples:
+        return paths
+    return sorted(random.Random(seed).sample(paths, samples))
+
+def measure(images, config):
+    """
+    Runs OCR with config on every image.
+
+    Returns:
+        (seconds per image, mean word confidence weighted by word length)
+    """
+    start_time = time.time()
+    weighted = 0.0
+    characters = 0
+    for image in images:
+        for word in ocr_ops.image_to_words(image, config=config):
+            if word["conf"] < 0:
+                continue
+            weighted += word["conf"] * len(word["text"])
+            characters += len(word["text"])
+    elapsed = (time.time() - start_time) / max(1, len(images))
+    return elapsed, (weighted / characters if characters else 0.0)
+
+def better(candidate, best, min_confidence):
+    """
+    Compares two (seconds, confidence) results: the faster one wins among those
+    reaching min_confidence, otherwise the more confident one.
+    """
+    candidate_ok = candidate[1] >= min_confidence
+    best_ok = best[1] >= min_confidence
+    if candidate_ok != best_ok:
+        return candidate_ok
+    if candidate_ok:
+        return candidate[0] < best[0] * (1 - MIN_SPEEDUP)
+    return candidate[1] > best[1]
+
+def autotune(directory, samples=None, min_confidence=None, progress=None, pause=None):
+    """
+    Finds the fastest OCR configuration for the images of a directory that
+    reaches min_confidence, and stores it in the "ocr_configs" setting.
+    Keys of the directory's configuration outside SEARCH_SPACE, e.g. a hand-set
+    "whitelist" or "backend", apply to the measurements and are kept.
+
+    The keys of SEARCH_SPACE are tuned one after another (coordinate descent),
+    each with the best values found so far for the others, which needs far fewer
+    OCR runs than the full grid.
+
+    Args:
+        progress: called as progress(message) after every measurement
+        pause: called between measurements, e.g. to yield to interactive OCR
+
+    Returns:
+        the chosen configuration, including its measured "seconds" and "confidence"
+    """
+    tune_settings = settings.settings.get("autotune", {})
+    samples = samples or tune_settings.get("samples", 8)
+    if min_confidence is None:
+        min_confidence = tune_settings.get("min_confidence", 80)
+    paths = sample_paths(directory, samples)
+    if not paths:
+        raise ValueError(f"No images found in {directory}")
+    images = []
+    for path in paths:
+        image = source_ops.open_image(path)
+        image.load()
+        images.append(image)
+
+    directory = os.path.abspath(directory)
+    existing = settings.settings.get("ocr_configs", {}).get(directory, {})
+    config = dict(existing, **{key: values[0] for key, values in SEARCH_SPACE})
+    for key in ("seconds", "confidence", "samples", "tuned"):
+        config.pop(key, None)
+    ocr_ops.image_to_string(images[0], config)  # The engine's first start is not counted
+    best = measure(images, config)
+    tried = 1
+    for key, values in SEARCH_SPACE:
+        for value in values[1:]:
+            if pause:
+                pause()
+            candidate_config = dict(config, **{key: value})
+            try:
+                result = measure(images, candidate_config)
+            except Exception as e:
+                # E.g. an engine mode the installed language data does not support
+                if progress:
+                    progress(f"{key}={value}: {e}")
+                continue
+            tried += 1
+            if progress:
+                progress(f"{key}={value}: {result[0]:.2f}s/image, confidence {result[1]:.0f}")
+            if better(result, best, min_confidence):
+                config, best = candidate_config, result
+
+    chosen = dict(existing, **config, seconds=round(best[0], 3), confidence=round(best[1], 1),
+                  samples=len(images), tuned=time.strftime("%Y-%m-%d %H:%M"))
+    settings.settings.setdefault("ocr_configs", {})[directory] = chosen
+    settings.write()
+    if progress:
+        progress(f"Tried {tried} configurations: {describe(chosen)}")
+    return chosen
+
+def describe(config):
+    """Formats a configuration for the status bar or console."""
+    x_height = config.get("x_height")
+    parts = [f"psm {config.get('psm') or 'default'}", f"oem {config.get('oem') or 'default'}",
+             "x-height " + ("default" if x_height is None else str(x_height or "unscaled")),
+             config.get("preprocess", "none")]
+    if "seconds" in config:
+        parts.append(f"{config['seconds']:.2f}s/image, confidence {config['confidence']:.0f}")
+    return ", ".join(parts)
+
+def run_cli(directory, samples=None, min_confidence=None):
+    """Command line entry point: tunes a directory and prints the measurements."""
+    print(f"Auto-tuning OCR for {directory}")
+    autotune(directory, samples=samples, min_confidence=min_confidence, progress=print)
@@ -1,48 +1,291 @@
 from tkinter import filedialog
+from tkinter import messagebox
+from tkinter import simpledialog
 import tkinter as tk
 import os
 import time
+import threading
 
 import settings
 import ctx_ui
 import image_ops
+import source_ops
+import snapshot_ops
+import scheduler_ops
+import sweep_ops
+import memory_ops
+import diff_ops
+import tune_ops
+import triage_ops
+import region_ops
+import export_ops
+import index_ops
+import overlay_ops
 
 status_message = ""
 
 resize_delay = 300  # Milliseconds
+select_load_delay = 150  # Milliseconds the file selection must stay unchanged before the file is loaded
+select_load_job = None
+activity_status_interval = 500  # Milliseconds
 
 # Track sort order for columns
 file_tree_sort_column = "name"
 file_tree_sort_reverse = False
 
+# Incremented for every directory scan so that results of stale scans are dropped
+scan_generation = 0
+
+# Snapshot of the listed roots and the entries shown in the file tree (path -> (root, size))
+current_snapshot = None
+listed_entries = {}
+
+# Rows inserted into the file tree per after() callback
+populate_batch_size = 1000
+# True while the file tree is being filled in batches; a reconcile arriving
+# meanwhile is kept in pending_reconcile and applied afterwards
+populating = False
+pending_reconcile = None
+
 def on_file_select(event):
-    """Handles file selection from the file tree."""
+    """
+    Handles file selection from the file tree.
+    The file is loaded once the selection has settled, so that moving quickly
+    through the list (or selecting many files) does not decode every file.
+    """
+    global select_load_job
+    if select_load_job is not None:
+        ctx_ui.window.after_cancel(select_load_job)
+        select_load_job = None
     selection = ctx_ui.file_tree.selection()
     if not selection:
         return
-    item_id = selection[0]
-    file_name = ctx_ui.file_tree.item(item_id, "values")[0]
-    settings.current_file = file_name
-    file_path = os.path.join(settings.current_directory, file_name)
+    if len(selection) > 1:
+        set_status(f"{len(selection)} files selected")
+        return
+    # Item ids are the full paths (or archive member paths) of the files
+    file_path = selection[0]
+    if file_path == image_ops.loaded_image_path:
+        return  # Already loaded, e.g. selected programmatically after loading
+    select_load_job = ctx_ui.window.after(select_load_delay, load_selected_file, file_path)
+
+def load_selected_file(file_path):
+    global select_load_job
+    select_load_job = None
+    if ctx_ui.file_tree.selection() != (file_path,) or not ctx_ui.file_tree.exists(file_path):
+        return
+    settings.current_file = file_path
     image_ops.load_image(file_path)
 
+def bulk_operation(operation, destination=None):
+    """
+    Deletes, moves or trashes the selected files on the background file worker.
+    The files are greyed out at once and leave the list in batches as the work progresses.
+    """
+    file_tree = ctx_ui.file_tree
+    paths = [path for path in file_tree.selection() if not source_ops.is_member_path(path)]
+    if not paths:
+        set_status("No files selected (images inside archives cannot be changed).")
+        return
+    name = triage_ops.OPERATION_NAMES[operation]
+
+    # The item after the last selected one is shown once the files are gone
+    selected = set(paths)
+    next_path = file_tree.next(paths[-1])
+    while next_path and next_path in selected:
+        next_path = file_tree.next(next_path)
+    if not next_path:
+        next_path = file_tree.prev(paths[0])
+        while next_path and next_path in selected:
+            next_path = file_tree.prev(next_path)
+
+    if image_ops.loaded_image_path in selected:
+        image_ops.unload_image()
+    for path in paths:
+        file_tree.item(path, tags=("busy",))
+    file_tree.selection_set(())
+
+    def remove_batch(done):
+        existing = [path for path in done if file_tree.exists(path)]
+        if existing:
+            file_tree.delete(*existing)
+        for path in done:
+            listed_entries.pop(path, None)
+        set_status(f"{name} {len(done)} files...")
+
+    def finish(done_count, errors):
+        for path, _ in errors:
+            if file_tree.exists(path):
+                file_tree.item(path, tags=())
+        message = f"{name} {done_count} files."
+        if errors:
+            message += f" {len(errors)} failed: {errors[0][1]}"
+        set_status(message)
+        if next_path and file_tree.exists(next_path) and not file_tree.selection():
+            file_tree.selection_set(next_path)
+            file_tree.see(next_path)
+
+    triage_ops.submit(operation, paths, destination,
+                      on_batch=lambda done: ctx_ui.window.after(0, remove_batch, done),
+                      on_done=lambda done_count, errors: ctx_ui.window.after(0, finish, done_count, errors))
+    set_status(f"{name} 0/{len(paths)} files...")
+
+def delete_selected(event=None):
+    """Deletes the selected files, asking first if there are several."""
+    count = len(ctx_ui.file_tree.selection())
+    if count > 1 and not messagebox.askyesno("Delete Files", f"Delete {count} files permanently?"):
+        return
+    bulk_operation("delete")
+
+def move_selected():
+    """Moves the selected files to a chosen folder."""
+    if not ctx_ui.file_tree.selection():
+        set_status("No files selected.")
+        return
+    destination = filedialog.askdirectory(title="Move Files To", initialdir=settings.current_directory)
+    if destination:
+        bulk_operation("move", destination)
+
+def trash_selected():
+    """Sends the selected files to the trash (requires send2trash)."""
+    if not triage_ops.trash_available():
+        set_status("Sending to trash requires send2trash (pip install send2trash).")
+        return
+    bulk_operation("trash")
+
+def show_file_menu(event):
+    """Shows the file list context menu; a right-click outside the selection selects the clicked file."""
+    file_tree = ctx_ui.file_tree
+    item = file_tree.identify_row(event.y)
+    if item and item not in file_tree.selection():
+        file_tree.selection_set(item)
+    ctx_ui.file_menu.tk_popup(event.x_root, event.y_root)
+
+def previous_listed_path(file_path):
+    """Returns the file listed before file_path in the current sort order, or None."""
+    file_tree = ctx_ui.file_tree
+    if not file_path or not file_tree.exists(file_path):
+        return None
+    return file_tree.prev(file_path) or None
+
+def toggle_change_aware():
+    """Called when the "Change-aware OCR" option changes."""
+    if ctx_ui.change_aware_var.get() and not diff_ops.numpy_available():
+        ctx_ui.change_aware_var.set(False)
+        set_status("Change-aware OCR requires numpy (pip install numpy).")
+
+def toggle_detect_text_blocks():
+    """Called when the "Detect text blocks" option changes."""
+    if ctx_ui.detect_text_blocks_var.get() and not diff_ops.numpy_available():
+        ctx_ui.detect_text_blocks_var.set(False)
+        set_status("Text block detection requires numpy (pip install numpy).")
+        return
+    if image_ops.original_image is not None:
+        image_ops.process_image_async()
+
+def toggle_two_pass():
+    """Called when the "Two-pass OCR" option changes."""
+    if image_ops.original_image is not None:
+        image_ops.process_image_async()
+
+def toggle_named_regions():
+    """Called when the "OCR named regions" option changes."""
+    overlay_ops.draw_named_regions()
+    if image_ops.original_image is not None:
+        image_ops.process_image_async()
+
+def add_named_region():
+    """Stores the current selection as a named region, asking for its name."""
+    region = list(settings.selection_coords)
+    if region == [0, 0, 0, 0] or region[2] <= region[0] or region[3] <= region[1]:
+        set_status("Select a region first.")
+        return
+    name = simpledialog.askstring("Add Named Region", "Region name:",
+                                  initialvalue=f"region {len(region_ops.named_regions()) + 1}")
+    if not name or not name.strip():
+        return
+    region_ops.add_region(name.strip(), region)
+    set_status(f"Named region \"{name.strip()}\" set to {region} ({len(region_ops.named_regions())} regions).")
+    overlay_ops.draw_named_regions()
+    if ctx_ui.named_regions_var.get() and image_ops.original_image is not None:
+        image_ops.process_image_async()
+
+def clear_named_regions():
+    """Forgets all named regions."""
+    region_ops.clear_regions()
+    overlay_ops.draw_named_regions()
+    set_status("Named regions cleared.")
+
+def note_activity(event=None):
+    index_ops.get_indexer().note_activity()
+
+def toggle_index():
+    """Called when the "Index this directory when idle" option changes."""
+    update_index()
+    if not ctx_ui.index_var.get():
+        set_status("Background indexing stopped.")
+
+def update_index():
+    """Points the background indexer at the current directory, or stops it if the option is off."""
+    indexer = index_ops.get_indexer()
+    if not ctx_ui.index_var.get() or not settings.current_directory:
+        indexer.stop()
+        return
+
+    def progress(done, total):
+        if done == total or done % 10 == 0:
+            ctx_ui.window.after(0, set_status, f"Index: {done}/{total} new files in {settings.current_directory}")
+
+    indexer.start(settings.current_directory, on_progress=progress)
+
+def search_index():
+    """Searches the indexed text of the current directory and selects the matching files."""
+    query = simpledialog.askstring("Search Index", "Words to find:")
+    if not query or not query.strip():
+        return
+    try:
+        results = index_ops.search(query, settings.current_directory)
+    except Exception as e:
+        set_status(f"Error searching the index: {e}")
+        return
+    listed = [path for path, _ in results if ctx_ui.file_tree.exists(path)]
+    if listed:
+        ctx_ui.file_tree.selection_set(listed)
+        ctx_ui.file_tree.see(listed[0])
+    ctx_ui.text_output.delete("1.0", tk.END)
+    ctx_ui.text_output.insert(tk.END, "\n".join(f"{os.path.basename(path)}: {snippet}" for path, snippet in results))
+    set_status(f"Found \"{query}\" in {len(results)} indexed files.")
+
 def sort_file_tree(column):
     """Sort the file tree by the given column."""
     global file_tree_sort_column, file_tree_sort_reverse
-    file_tree = ctx_ui.file_tree
-    items = [(file_tree.set(k, column), k) for k in file_tree.get_children("")]
-    if column == "size":
-        items.sort(key=lambda t: float(t[0]), reverse=(file_tree_sort_column == column and not file_tree_sort_reverse))
-    else:
-        items.sort(key=lambda t: t[0].lower(), reverse=(file_tree_sort_column == column and not file_tree_sort_reverse))
-    for index, (val, k) in enumerate(items):
-        file_tree.move(k, '', index)
+    reverse = (file_tree_sort_column == column and not file_tree_sort_reverse)
+    apply_file_tree_sort(column, reverse)
     # Toggle sort order if same column, else reset
     if file_tree_sort_column == column:
         file_tree_sort_reverse = not file_tree_sort_reverse
     else:
         file_tree_sort_column = column
         file_tree_sort_reverse = False
+    save_snapshot_sort()
+
+def apply_file_tree_sort(column, reverse):
+    """Reorder the items of the file tree by the given column."""
+    file_tree = ctx_ui.file_tree
+    items = [(file_tree.set(k, column), k) for k in file_tree.get_children("")]
+    if column == "size":
+        items.sort(key=lambda t: float(t[0]), reverse=reverse)
+    else:
+        items.sort(key=lambda t: t[0].lower(), reverse=reverse)
+    for index, (val, k) in enumerate(items):
+        file_tree.move(k, '', index)
+
+def save_snapshot_sort():
+    """Stores the current sort order in the directory snapshot (in the background)."""
+    if current_snapshot is None:
+        return
+    current_snapshot["sort"] = {"column": file_tree_sort_column, "reverse": file_tree_sort_reverse}
+    threading.Thread(target=snapshot_ops.save, args=(current_snapshot,), daemon=True).start()
 
 def handle_drop(event):
     """
@@ -60,9 +303,12 @@ def handle_drop(event):
     if file_path.startswith('"') and file_path.endswith('"'):
         file_path = file_path[1:-1]
     
-    # Check if it's an image file (simple check, could be expanded)
-    image_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.gif']
-    if any(file_path.lower().endswith(ext) for ext in image_extensions):
+    # Directories and archives become the browsed root
+    if os.path.isdir(file_path) or source_ops.is_archive_name(file_path):
+        root = file_path if os.path.isdir(file_path) else os.path.dirname(file_path)
+        set_roots([root])
+        refresh_file_list()
+    elif source_ops.is_image_name(file_path):
         image_ops.load_image(file_path)
     else:
         set_status("Dropped file is not a supported image format")
@@ -78,42 +324,288 @@ def select_directory():
     if not directory_path:
         return
         
-    settings.current_directory = directory_path
     settings.current_file = ""
-    ctx_ui.directory_entry.delete(0, tk.END)
-    ctx_ui.directory_entry.insert(0, directory_path)
+    set_roots([directory_path])
     
     # Update the file list
     refresh_file_list()
 
-def refresh_file_list():
-    """Refreshes the file list based on the current directory."""
+def add_root():
+    """Opens a file dialog to add another directory to the browsed roots."""
+    directory_path = filedialog.askdirectory(title="Add Directory",
+                                             initialdir=settings.current_directory or os.getcwd())
+    if not directory_path:
+        return
+
+    roots = source_ops.split_roots(ctx_ui.directory_entry.get())
+    if directory_path not in roots:
+        roots.append(directory_path)
+    set_roots(roots)
+    refresh_file_list()
+
+def set_roots(roots):
+    """Sets the browsed roots and mirrors them in the directory entry."""
+    settings.current_roots = list(roots)
+    settings.current_directory = roots[0] if roots else ""
+    ctx_ui.directory_entry.delete(0, tk.END)
+    ctx_ui.directory_entry.insert(0, source_ops.join_roots(roots))
+
+def refresh_file_list(on_done=None):
+    """
+    Refreshes the file list based on the roots in the directory entry.
+    Subdirectories are scanned when "Include subdirectories" is checked,
+    and images inside zip archives are listed as archive members.
+    The list is rendered immediately from the stored directory snapshot, if any,
+    and reconciled with a scan running in a background thread;
+    on_done is called on the UI thread once the list is first populated.
+    """
+    global scan_generation, current_snapshot, file_tree_sort_column, file_tree_sort_reverse
+    global populating, pending_reconcile
     file_tree = ctx_ui.file_tree
     file_tree.delete(*file_tree.get_children())
-    if not settings.current_directory or not os.path.exists(settings.current_directory):
+    listed_entries.clear()
+    populating = False
+    pending_reconcile = None
+    roots = [root for root in source_ops.split_roots(ctx_ui.directory_entry.get()) if os.path.isdir(root)]
+    settings.current_roots = roots
+    current_snapshot = None
+    if not roots:
+        if on_done:
+            on_done()
         return
-    image_extensions = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.gif')
+    settings.current_directory = roots[0]
+    update_index()
+    recursive = ctx_ui.recursive_scan_var.get()
+
+    scan_generation += 1
+    my_generation = scan_generation
+
+    snapshot = snapshot_ops.load(roots, recursive)
+    if snapshot is not None:
+        current_snapshot = snapshot
+        file_tree_sort_column = snapshot["sort"]["column"]
+        file_tree_sort_reverse = snapshot["sort"]["reverse"]
+        populate_file_list(my_generation, roots, snapshot_ops.entries(snapshot), on_done)
+        on_done = None
+    else:
+        set_status(f"Scanning {source_ops.join_roots(roots)}...")
+
+    def scan_task():
+        try:
+            new_snapshot, changed = snapshot_ops.scan(roots, recursive, snapshot)
+            if changed:
+                new_snapshot["sort"] = {"column": file_tree_sort_column, "reverse": file_tree_sort_reverse}
+                snapshot_ops.save(new_snapshot)
+            entries = list(snapshot_ops.entries(new_snapshot))
+        except Exception as e:
+            ctx_ui.window.after(0, set_status, f"Error reading directory: {e}")
+            return
+        ctx_ui.window.after(0, reconcile_file_list, my_generation, roots, new_snapshot, entries, changed, on_done)
+
+    threading.Thread(target=scan_task, daemon=True).start()
+
+def sorted_entries(entries, multi_root):
+    """Returns (path, name, size) tuples ordered by the current sort column."""
+    rows = [(path, source_ops.display_name(path, root, multi_root), size) for path, root, size in entries]
+    if file_tree_sort_column == "size":
+        rows.sort(key=lambda row: row[2], reverse=file_tree_sort_reverse)
+    else:
+        rows.sort(key=lambda row: row[1].lower(), reverse=file_tree_sort_reverse)
+    return rows
+
+def populate_file_list(generation, roots, entries, on_done=None):
+    """
+    Fills the file tree with the result of a directory scan or snapshot.
+    Rows are inserted in batches of populate_batch_size from after() callbacks,
+    so that the window stays responsive while large lists are rendered.
+    """
+    global populating
+    if generation != scan_generation:
+        return  # A newer scan was started
+    for file_path, root, size in entries:
+        listed_entries.setdefault(file_path, (root, size))  # First root wins for overlapping roots
+    rows = sorted_entries([(path, root, size) for path, (root, size) in listed_entries.items()], len(roots) > 1)
+    populating = True
+    insert_rows(generation, roots, rows, 0, on_done)
+
+def insert_rows(generation, roots, rows, start, on_done):
+    """Inserts one batch of rows into the file tree and schedules the next one."""
+    global populating, pending_reconcile
+    if generation != scan_generation:
+        return  # A newer scan was started
+    file_tree = ctx_ui.file_tree
     try:
-        files = [f for f in os.listdir(settings.current_directory)
-                if os.path.isfile(os.path.join(settings.current_directory, f))
-                and f.lower().endswith(image_extensions)]
-        files.sort()
-        for file in files:
-            file_path = os.path.join(settings.current_directory, file)
-            size_kib = os.path.getsize(file_path) / 1024
-            file_tree.insert('', 'end', values=(file, f"{size_kib:.1f}"))
-        # Select current file if present
-        if settings.current_file and settings.current_file in files:
-            for iid in file_tree.get_children():
-                if file_tree.item(iid, "values")[0] == settings.current_file:
-                    file_tree.selection_set(iid)
-                    file_tree.see(iid)
-                    file_path = os.path.join(settings.current_directory, settings.current_file)
-                    image_ops.load_image(file_path)
-                    break
-        set_status(f"Found {len(files)} image files in {settings.current_directory}")
+        for file_path, name, size in rows[start:start + populate_batch_size]:
+            file_tree.insert('', 'end', iid=file_path, values=(name, f"{size / 1024:.1f}"))
+            # Select current file as soon as it is listed, the selection event loads it
+            if file_path == settings.current_file:
+                file_tree.selection_set(file_path)
+                file_tree.see(file_path)
+        start += populate_batch_size
+        if start < len(rows):
+            set_status(f"Listing {start}/{len(rows)} image files in {source_ops.join_roots(roots)}...")
+            ctx_ui.window.after(0, insert_rows, generation, roots, rows, start, on_done)
+            return
+        set_status(f"Found {len(rows)} image files in {source_ops.join_roots(roots)}")
     except Exception as e:
         set_status(f"Error reading directory: {e}")
+    populating = False
+    if on_done:
+        on_done()
+    if pending_reconcile is not None:
+        args, pending_reconcile = pending_reconcile, None
+        reconcile_file_list(*args)
+
+def reconcile_file_list(generation, roots, snapshot, entries, changed, on_done=None):
+    """
+    Brings the file tree in line with a fresh scan.
+    If the tree was rendered from a snapshot, only the differences are applied.
+    """
+    global current_snapshot, pending_reconcile
+    if generation != scan_generation:
+        return  # A newer scan was started
+    if populating:
+        # Applied once the snapshot rows are all inserted
+        pending_reconcile = (generation, roots, snapshot, entries, changed, on_done)
+        return
+    current_snapshot = snapshot
+    if on_done is not None:
+        # Nothing was rendered from a snapshot yet
+        populate_file_list(generation, roots, entries, on_done)
+        return
+    if not changed:
+        return
+
+    file_tree = ctx_ui.file_tree
+    new_entries = {}
+    for file_path, root, size in entries:
+        new_entries.setdefault(file_path, (root, size))
+    added, removed, resized = snapshot_ops.diff(listed_entries, new_entries)
+    multi_root = len(roots) > 1
+    for file_path in removed:
+        if file_tree.exists(file_path):
+            file_tree.delete(file_path)
+        del listed_entries[file_path]
+    for file_path in resized:
+        size = new_entries[file_path][1]
+        file_tree.set(file_path, "size", f"{size / 1024:.1f}")
+        listed_entries[file_path] = new_entries[file_path]
+    for file_path, name, size in sorted_entries([(path, new_entries[path][0], new_entries[path][1]) for path in added], multi_root):
+        file_tree.insert('', 'end', iid=file_path, values=(name, f"{size / 1024:.1f}"))
+        listed_entries[file_path] = new_entries[file_path]
+    if added:
+        apply_file_tree_sort(file_tree_sort_column, file_tree_sort_reverse)
+        if settings.current_file in added and not file_tree.selection():
+            file_tree.selection_set(settings.current_file)
+            file_tree.see(settings.current_file)
+    if added or removed or resized:
+        set_status(f"Found {len(listed_entries)} image files in {source_ops.join_roots(roots)} "
+                   f"({len(added)} added, {len(removed)} removed)")
+
+def sweep_region():
+    """
+    OCRs the current selection region in every listed file and writes the results to one CSV file.
+    With "OCR named regions" checked, every named region gets its own column instead.
+    Runs in the background and defers to interactive OCR between files.
+    """
+    region = list(settings.selection_coords)
+    if ctx_ui.named_regions_var.get() and region_ops.named_regions():
+        region = [dict(r) for r in region_ops.named_regions()]
+    elif region == [0, 0, 0, 0] or region[2] <= region[0] or region[3] <= region[1]:
+        set_status("Select a region first.")
+        return
+    paths = list(ctx_ui.file_tree.get_children())
+    if not paths:
+        set_status("No files to sweep.")
+        return
+    output_path = filedialog.asksaveasfilename(title="Save Sweep Results", defaultextension=".csv",
+                                               filetypes=[("CSV files", "*.csv")],
+                                               initialdir=settings.current_directory)
+    if not output_path:
+        return
+
+    def progress(done, total, elapsed):
+        ctx_ui.window.after(0, set_status, f"Sweep: {done}/{total} files ({done / elapsed if elapsed else 0:.1f} files/s)")
+
+    def pause():
+        scheduler_ops.get_scheduler().wait_for_turn(scheduler_ops.BACKGROUND)
+
+    def sweep_task():
+        try:
+            done = sweep_ops.sweep(paths, region, output_path, progress=progress, pause=pause)
+            ctx_ui.window.after(0, set_status, f"Sweep finished: {done} files written to {output_path}")
+        except Exception as e:
+            ctx_ui.window.after(0, set_status, f"Error during sweep: {e}")
+
+    set_status(f"Sweep: 0/{len(paths)} files")
+    threading.Thread(target=sweep_task, daemon=True).start()
+
+def export_results():
+    """
+    OCRs every listed file (or the selection region of each) and writes the text,
+    word boxes and confidences to an export file, record by record. With named
+    regions shown, every named region of each file is exported as its own record.
+    Files are OCR'd as background scheduler jobs, after any interactive OCR.
+    """
+    paths = list(ctx_ui.file_tree.get_children())
+    if not paths:
+        set_status("No files to export.")
+        return
+    region = list(settings.selection_coords)
+    width, height = image_ops.original_image.size if image_ops.original_image is not None else (0, 0)
+    if region == [0, 0, 0, 0] or region == [0, 0, width, height]:
+        region = None
+    regions = region_ops.named_regions() if ctx_ui.named_regions_var.get() else None
+    output_path = filedialog.asksaveasfilename(title="Export OCR Results", defaultextension=".jsonl",
+                                               filetypes=[("JSON lines", "*.jsonl"), ("hOCR", "*.hocr"),
+                                                          ("ALTO XML", "*.xml"), ("Word table", "*.tsv"),
+                                                          ("Parquet", "*.parquet")],
+                                               initialdir=settings.current_directory)
+    if not output_path:
+        return
+
+    total = len(paths) * len(regions) if regions else len(paths)
+
+    def progress(count):
+        ctx_ui.window.after(0, set_status, f"Export: {count}/{total} records")
+
+    def export_task():
+        try:
+            records = export_ops.iter_file_records(paths, region, regions)
+            count = export_ops.export(records, output_path, progress=progress)
+            ctx_ui.window.after(0, set_status, f"Export finished: {count} records written to {export_ops.destination(output_path, count=count)}")
+        except Exception as e:
+            ctx_ui.window.after(0, set_status, f"Error during export: {e}")
+
+    set_status(f"Export: 0/{total} records")
+    threading.Thread(target=export_task, daemon=True).start()
+
+def autotune_directory():
+    """
+    Benchmarks OCR configurations on sample images of the current directory
+    and stores the fastest one that reaches the confidence threshold.
+    Runs in the background and defers to interactive OCR between measurements.
+    """
+    directory = settings.current_directory
+    if not directory or not os.path.isdir(directory):
+        set_status("Select a directory first.")
+        return
+
+    def progress(message):
+        ctx_ui.window.after(0, set_status, f"Auto-tune: {message}")
+
+    def pause():
+        scheduler_ops.get_scheduler().wait_for_turn(scheduler_ops.BACKGROUND)
+
+    def autotune_task():
+        try:
+            config = tune_ops.autotune(directory, progress=progress, pause=pause)
+            ctx_ui.window.after(0, set_status, f"Auto-tune finished for {directory}: {tune_ops.describe(config)}")
+        except Exception as e:
+            ctx_ui.window.after(0, set_status, f"Error during auto-tune: {e}")
+
+    set_status(f"Auto-tune: sampling {directory}...")
+    threading.Thread(target=autotune_task, daemon=True).start()
 
 def set_status(message):
     """
@@ -123,6 +615,17 @@ def set_status(message):
     status_message = message
     ctx_ui.status_label.config(text=status_message)
 
+def update_activity_status():
+    """Shows the OCR queue state and memory usage in the status bar and schedules the next update."""
+    text = f"{scheduler_ops.format_stats(scheduler_ops.stats())} | {memory_ops.format_usage()}"
+    ctx_ui.activity_label.config(text=text)
+    ctx_ui.window.after(activity_status_interval, update_activity_status)
+
+def show_memory_report():
+    """Shows the memory breakdown and, if tracing is enabled, the top allocation sites."""
+    report = f"{memory_ops.describe()}\n\n{memory_ops.snapshot_report()}"
+    messagebox.showinfo("Memory Usage", report)
+
 def clear_error():
     """
     Clears the error message.
@@ -206,3 +709,28 @@ def set_initial_sash_positions():
 def on_closing():
     settings.save(ctx_ui)
     ctx_ui.window.destroy()
+
+def register_drop_target():
+    """
+    Enables drag and drop of files onto the image canvas.
+    tkinterdnd2 is imported here, after the window is shown, to keep startup fast.
+    """
+    try:
+        from tkinterdnd2 import DND_FILES, TkinterDnD
+        ctx_ui.window.TkdndVersion = TkinterDnD._require(ctx_ui.window)
+        ctx_ui.image_canvas.drop_target_register(DND_FILES)
+        ctx_ui.image_canvas.dnd_bind("<<Drop>>", handle_drop)
+    except Exception as e:
+        print(f"Drag and drop unavailable: {e}")
+
+def restore_session(on_done=None):
+    """
+    Restores the last directory, file and region once the window is visible.
+    The directory is scanned in the background and the last file is loaded
+    when it shows up in the list.
+    """
+    register_drop_target()
+    if settings.current_directory and os.path.exists(settings.current_directory):
+        refresh_file_list(on_done=on_done)
+    elif on_done:
+        on_done()
@@ -1,13 +1,16 @@
+import time
 import tkinter as tk
 from tkinter import scrolledtext
 from tkinter import ttk  # Add ttk for Treeview
-from tkinterdnd2 import DND_FILES, TkinterDnD
 
 import ctx_ui
 import settings
 import ui_ops
 import text_ops
 import image_ops
+import memory_ops
+import overlay_ops
+import source_ops
 
 def set_interaction_mode(mode):
     """Set the interaction mode and update the context menu."""
@@ -34,14 +37,16 @@ def show_context_menu(event):
         "area_selection": "Area selection",
         "drag": "Drag",
         "zoom_in": "Zoom in",
-        "zoom_out": "Zoom out"
+        "zoom_out": "Zoom out",
+        "word_select": "Select words"
     }
     
     mode_index = {
         "area_selection": 0,
         "drag": 1,
         "zoom_in": 2,
-        "zoom_out": 3
+        "zoom_out": 3,
+        "word_select": 4
     }
     
     # Update each menu item with or without checkmark
@@ -92,16 +97,32 @@ def create_context_menu():
         label="  Zoom out",
         command=lambda: set_interaction_mode("zoom_out")
     )
+    ctx_ui.context_menu.add_command(
+        label="  Select words",
+        command=lambda: set_interaction_mode("word_select")
+    )
+
+def setup(start_time=None, exit_after_restore=False):
+    """
+    Builds the main window and runs the application.
+
+    Args:
+        start_time (float): time.time() at process start, used for startup timings
+        exit_after_restore (bool): If True, exits once the last session is restored (startup benchmark)
+    """
+    if start_time is None:
+        start_time = time.time()
 
-def setup():
     ctx_ui.refresh_file_list = ui_ops.refresh_file_list
 
-    # Create the main window
-    ctx_ui.window = TkinterDnD.Tk()
+    # Create the main window (drag and drop support is added once it is shown)
+    ctx_ui.window = tk.Tk()
     ctx_ui.window.title("Tess-a-shot")
 
     # Load settings before configuring the UI
     settings.load(settings.settings)
+    source_ops.set_pixel_limit(settings.settings.get("max_image_megapixels", 1000))
+    memory_ops.start_tracing()
     settings.current_directory = settings.settings["last_directory"]
 
     # Create main frame to organize the layout
@@ -151,6 +172,10 @@ def setup():
     button_refresh = tk.Button(controls_frame, text="Refresh", command=ui_ops.refresh_file_list)
     button_refresh.pack(side=tk.LEFT, padx=5)
 
+    # Button to add another root directory to the list
+    button_add_root = tk.Button(controls_frame, text="Add Root...", command=ui_ops.add_root)
+    button_add_root.pack(side=tk.LEFT, padx=5)
+
     # Left Frame Components (File List)
     file_list_label = tk.Label(ctx_ui.left_frame, text="Image Files:")
     file_list_label.pack(pady=(0, 5), anchor=tk.W)
@@ -160,7 +185,7 @@ def setup():
     file_list_frame.pack(fill=tk.BOTH, expand=True)
 
     columns = ("name", "size")
-    ctx_ui.file_tree = file_tree = ttk.Treeview(file_list_frame, columns=columns, show="headings", selectmode="browse")
+    ctx_ui.file_tree = file_tree = ttk.Treeview(file_list_frame, columns=columns, show="headings", selectmode="extended")
     file_tree.heading("name", text="Name", command=lambda: ui_ops.sort_file_tree("name"))
     file_tree.heading("size", text="Size (kiB)", command=lambda: ui_ops.sort_file_tree("size"))
     file_tree.column("name", width=settings.settings.get("file_list_columns", {}).get("name", 200), anchor=tk.W)
@@ -174,6 +199,17 @@ def setup():
     # Bind file selection event
     file_tree.bind('<<TreeviewSelect>>', ui_ops.on_file_select)
 
+    # Files being deleted, moved or trashed are greyed out until they leave the list
+    file_tree.tag_configure("busy", foreground="gray")
+
+    # Bulk operations on the selected files
+    ctx_ui.file_menu = tk.Menu(ctx_ui.window, tearoff=0)
+    ctx_ui.file_menu.add_command(label="Delete", command=ui_ops.delete_selected)
+    ctx_ui.file_menu.add_command(label="Move to folder...", command=ui_ops.move_selected)
+    ctx_ui.file_menu.add_command(label="Send to trash", command=ui_ops.trash_selected)
+    file_tree.bind("<Button-3>", ui_ops.show_file_menu)
+    file_tree.bind("<Delete>", ui_ops.delete_selected)
+
     # Middle Frame - Image Preview Components
     image_frame_label = tk.Label(ctx_ui.image_preview_frame, text="Image Preview:")
     image_frame_label.pack(pady=(0, 5), anchor=tk.W)
@@ -181,6 +217,9 @@ def setup():
     ctx_ui.image_canvas = tk.Canvas(ctx_ui.image_preview_frame, bg="lightgray")
     ctx_ui.image_canvas.pack(fill=tk.BOTH, expand=True)
 
+    # Frame slider, shown below the canvas for multi-frame GIF and TIFF files
+    ctx_ui.frame_slider = tk.Scale(ctx_ui.image_preview_frame, orient=tk.HORIZONTAL, label="Frame", from_=1, to=1, command=image_ops.on_frame_slider)
+
     # Set default interaction mode
     ctx_ui.interaction_mode = "area_selection"
 
@@ -192,10 +231,6 @@ def setup():
     # Bind right-click to show context menu
     ctx_ui.image_canvas.bind("<Button-3>", show_context_menu)
 
-    # Make image_canvas a drop target
-    ctx_ui.image_canvas.drop_target_register(DND_FILES)
-    ctx_ui.image_canvas.dnd_bind("<<Drop>>", ui_ops.handle_drop)
-
     # Right Frame - Text Output Components
     text_output_controls = tk.Frame(ctx_ui.text_output_frame)
     text_output_controls.pack(fill=tk.X, pady=(0, 5))
@@ -207,7 +242,7 @@ def setup():
     button_copy = tk.Button(text_output_controls, text="Copy Text", command=text_ops.copy_to_clipboard)
     button_copy.pack(side=tk.RIGHT, padx=5)
 
-    button_delete = tk.Button(text_output_controls, text="Delete Image File", command=image_ops.delete_image, bg="#ffcccc")
+    button_delete = tk.Button(text_output_controls, text="Delete Selected Files", command=ui_ops.delete_selected, bg="#ffcccc")
     button_delete.pack(side=tk.RIGHT, padx=5)
 
     # Create notebook (tabbed interface) for extracted text and options
@@ -247,6 +282,73 @@ def setup():
     remember_region_checkbox = tk.Checkbutton(options_tab, text="Remember region", variable=ctx_ui.remember_region_var)
     remember_region_checkbox.pack(anchor=tk.W, padx=10, pady=5)
 
+    # "Include subdirectories" checkbox
+    ctx_ui.recursive_scan_var = tk.BooleanVar()
+    recursive_scan_checkbox = tk.Checkbutton(options_tab, text="Include subdirectories", variable=ctx_ui.recursive_scan_var, command=ui_ops.refresh_file_list)
+    recursive_scan_checkbox.pack(anchor=tk.W, padx=10, pady=5)
+
+    # "Show word boxes" checkbox
+    ctx_ui.show_word_boxes_var = tk.BooleanVar()
+    show_word_boxes_checkbox = tk.Checkbutton(options_tab, text="Show word boxes", variable=ctx_ui.show_word_boxes_var, command=overlay_ops.on_toggle)
+    show_word_boxes_checkbox.pack(anchor=tk.W, padx=10, pady=5)
+
+    # "Change-aware OCR" checkbox
+    ctx_ui.change_aware_var = tk.BooleanVar()
+    change_aware_checkbox = tk.Checkbutton(options_tab, text="Change-aware OCR (re-read only what changed)", variable=ctx_ui.change_aware_var, command=ui_ops.toggle_change_aware)
+    change_aware_checkbox.pack(anchor=tk.W, padx=10, pady=5)
+
+    # "Detect text blocks" and "Show text blocks" checkboxes
+    ctx_ui.detect_text_blocks_var = tk.BooleanVar()
+    detect_text_blocks_checkbox = tk.Checkbutton(options_tab, text="Detect text blocks (OCR only text areas)", variable=ctx_ui.detect_text_blocks_var, command=ui_ops.toggle_detect_text_blocks)
+    detect_text_blocks_checkbox.pack(anchor=tk.W, padx=10, pady=5)
+    ctx_ui.show_text_blocks_var = tk.BooleanVar()
+    show_text_blocks_checkbox = tk.Checkbutton(options_tab, text="Show text blocks", variable=ctx_ui.show_text_blocks_var, command=overlay_ops.draw_text_blocks)
+    show_text_blocks_checkbox.pack(anchor=tk.W, padx=10, pady=5)
+
+    # "Live OCR while selecting" checkbox
+    ctx_ui.live_ocr_var = tk.BooleanVar()
+    live_ocr_checkbox = tk.Checkbutton(options_tab, text="Live OCR preview while selecting", variable=ctx_ui.live_ocr_var)
+    live_ocr_checkbox.pack(anchor=tk.W, padx=10, pady=5)
+
+    # "Two-pass OCR" checkbox
+    ctx_ui.two_pass_var = tk.BooleanVar()
+    two_pass_checkbox = tk.Checkbutton(options_tab, text="Two-pass OCR (re-read low confidence lines)", variable=ctx_ui.two_pass_var, command=ui_ops.toggle_two_pass)
+    two_pass_checkbox.pack(anchor=tk.W, padx=10, pady=5)
+
+    # Named regions, all OCR'd at once and labelled in the output
+    ctx_ui.named_regions_var = tk.BooleanVar()
+    named_regions_checkbox = tk.Checkbutton(options_tab, text="OCR named regions (instead of the selection)", variable=ctx_ui.named_regions_var, command=ui_ops.toggle_named_regions)
+    named_regions_checkbox.pack(anchor=tk.W, padx=10, pady=5)
+    named_regions_frame = tk.Frame(options_tab)
+    named_regions_frame.pack(anchor=tk.W, padx=10, pady=5)
+    button_add_region = tk.Button(named_regions_frame, text="Add selection as named region...", command=ui_ops.add_named_region)
+    button_add_region.pack(side=tk.LEFT)
+    button_clear_regions = tk.Button(named_regions_frame, text="Clear named regions", command=ui_ops.clear_named_regions)
+    button_clear_regions.pack(side=tk.LEFT, padx=(5, 0))
+
+    # Idle-time indexing of the current directory and search of the index
+    ctx_ui.index_var = tk.BooleanVar()
+    index_checkbox = tk.Checkbutton(options_tab, text="Index this directory when idle", variable=ctx_ui.index_var, command=ui_ops.toggle_index)
+    index_checkbox.pack(anchor=tk.W, padx=10, pady=5)
+    button_search = tk.Button(options_tab, text="Search index...", command=ui_ops.search_index)
+    button_search.pack(anchor=tk.W, padx=10, pady=5)
+
+    # Button to OCR the selected region in every listed file
+    button_sweep = tk.Button(options_tab, text="Sweep region over all files...", command=ui_ops.sweep_region)
+    button_sweep.pack(anchor=tk.W, padx=10, pady=5)
+
+    # Button to export the text and word boxes of every listed file
+    button_export = tk.Button(options_tab, text="Export results of all files...", command=ui_ops.export_results)
+    button_export.pack(anchor=tk.W, padx=10, pady=5)
+
+    # Button to find the fastest OCR configuration for the current directory
+    button_autotune = tk.Button(options_tab, text="Auto-tune OCR for this directory", command=ui_ops.autotune_directory)
+    button_autotune.pack(anchor=tk.W, padx=10, pady=5)
+
+    # Button to show the memory breakdown
+    button_memory = tk.Button(options_tab, text="Memory usage...", command=ui_ops.show_memory_report)
+    button_memory.pack(anchor=tk.W, padx=10, pady=5)
+
     # Bind the text selection event to the text_output widget
     ctx_ui.text_output.bind("<<Selection>>", text_ops.on_text_selection)
     
@@ -272,20 +374,57 @@ def setup():
     # Bind the tab changed event
     notebook.bind("<<NotebookTabChanged>>", on_tab_changed)
 
-    # Status bar at the bottom
-    ctx_ui.status_label = status_label = tk.Label(ctx_ui.window, text="No image loaded", bd=1, relief=tk.SUNKEN, anchor=tk.W)
-    status_label.pack(side=tk.BOTTOM, fill=tk.X)
+    # Status bar at the bottom, with the OCR queue state (running/queued per priority class)
+    # and the memory usage on the right
+    status_frame = tk.Frame(ctx_ui.window)
+    status_frame.pack(side=tk.BOTTOM, fill=tk.X)
+
+    ctx_ui.activity_label = activity_label = tk.Label(status_frame, text="", bd=1, relief=tk.SUNKEN, anchor=tk.E)
+    activity_label.pack(side=tk.RIGHT)
+
+    ctx_ui.status_label = status_label = tk.Label(status_frame, text="No image loaded", bd=1, relief=tk.SUNKEN, anchor=tk.W)
+    status_label.pack(side=tk.LEFT, fill=tk.X, expand=True)
 
     # Bind the resize event to the window
     ctx_ui.window.bind("<Configure>", ui_ops.on_resize)
 
     ctx_ui.window.protocol("WM_DELETE_WINDOW", ui_ops.on_closing)
 
+    # Any user input pauses the background indexer
+    for sequence in ("<KeyPress>", "<ButtonPress>", "<Motion>", "<MouseWheel>"):
+        ctx_ui.window.bind_all(sequence, ui_ops.note_activity, add="+")
+
     # Apply saved settings
     settings.apply(ctx_ui)
 
     # Schedule the sash position setting after the window is drawn
     ctx_ui.set_sash_job = ctx_ui.window.after(100, ui_ops.set_initial_sash_positions)
 
+    # Restore the last session only once the window is on screen
+    def on_session_restored():
+        def report():
+            elapsed = (time.time() - start_time) * 1000
+            text_ops.log(f"Startup: session restored after {elapsed:.2f}ms ({len(ctx_ui.file_tree.get_children())} files)")
+            if exit_after_restore:
+                ctx_ui.window.destroy()
+        # The last file is loaded after the selection delay of ui_ops.on_file_select,
+        # so the report waits until it is displayed
+        if (settings.current_file and ctx_ui.file_tree.exists(settings.current_file)
+                and image_ops.loaded_image_path != settings.current_file):
+            image_ops.load_callbacks.append(report)
+        else:
+            ctx_ui.window.after_idle(report)
+
+    def on_map(event):
+        if event.widget != ctx_ui.window:
+            return
+        ctx_ui.window.unbind("<Map>")
+        elapsed = (time.time() - start_time) * 1000
+        text_ops.log(f"Startup: window shown after {elapsed:.2f}ms")
+        ctx_ui.window.after_idle(ui_ops.restore_session, on_session_restored)
+        ctx_ui.window.after(ui_ops.activity_status_interval, ui_ops.update_activity_status)
+
+    ctx_ui.window.bind("<Map>", on_map)
+
     # Run the application
     ctx_ui.window.mainloop()